@@ -0,0 +1,11 @@
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+pytest_plugins = ["taxi_tb.plugin"]
@@ -13,8 +13,8 @@ import itertools
 import logging
 import os
 import random
+import sys
 
-import cocotb_test.simulator
 import pytest
 
 import cocotb
@@ -24,6 +24,18 @@ from cocotb.regression import TestFactory
 
 from cocotbext.axi import ApbBus, ApbMaster
 
+try:
+    import taxi_tb.filelist
+    import taxi_tb.sim
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.filelist
+        import taxi_tb.sim
+    finally:
+        del sys.path[0]
+
 
 class TB(object):
     def __init__(self, dut):
@@ -210,19 +222,6 @@ lib_dir = os.path.abspath(os.path.join(tests_dir, '..', '..', 'lib'))
 taxi_src_dir = os.path.abspath(os.path.join(lib_dir, 'taxi', 'src'))
 
 
-def process_f_files(files):
-    lst = {}
-    for f in files:
-        if f[-2:].lower() == '.f':
-            with open(f, 'r') as fp:
-                l = fp.read().split()
-            for f in process_f_files([os.path.join(os.path.dirname(f), x) for x in l]):
-                lst[os.path.basename(f)] = f
-        else:
-            lst[os.path.basename(f)] = f
-    return list(lst.values())
-
-
 @pytest.mark.parametrize("data_w", [8, 16, 32])
 def test_taxi_apb_dp_ram(request, data_w):
     dut = "taxi_apb_dp_ram"
@@ -235,7 +234,7 @@ def test_taxi_apb_dp_ram(request, data_w):
         os.path.join(rtl_dir, "taxi_apb_if.sv"),
     ]
 
-    verilog_sources = process_f_files(verilog_sources)
+    verilog_sources = taxi_tb.filelist.process_f_files(verilog_sources)
 
     parameters = {}
 
@@ -249,7 +248,7 @@ def test_taxi_apb_dp_ram(request, data_w):
     sim_build = os.path.join(tests_dir, "sim_build",
         request.node.name.replace('[', '-').replace(']', ''))
 
-    cocotb_test.simulator.run(
+    taxi_tb.sim.run(
         simulator="verilator",
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
@@ -13,8 +13,8 @@ import itertools
 import logging
 import os
 import random
+import sys
 
-import cocotb_test.simulator
 import pytest
 
 import cocotb
@@ -24,6 +24,18 @@ from cocotb.regression import TestFactory
 
 from cocotbext.axi import AxiBus, AxiMaster, AxiRam
 
+try:
+    import taxi_tb.filelist
+    import taxi_tb.sim
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.filelist
+        import taxi_tb.sim
+    finally:
+        del sys.path[0]
+
 
 class TB(object):
     def __init__(self, dut):
@@ -197,19 +209,6 @@ lib_dir = os.path.abspath(os.path.join(tests_dir, '..', '..', 'lib'))
 taxi_src_dir = os.path.abspath(os.path.join(lib_dir, 'taxi', 'src'))
 
 
-def process_f_files(files):
-    lst = {}
-    for f in files:
-        if f[-2:].lower() == '.f':
-            with open(f, 'r') as fp:
-                l = fp.read().split()
-            for f in process_f_files([os.path.join(os.path.dirname(f), x) for x in l]):
-                lst[os.path.basename(f)] = f
-        else:
-            lst[os.path.basename(f)] = f
-    return list(lst.values())
-
-
 @pytest.mark.parametrize("m_data_w", [8, 16, 32])
 @pytest.mark.parametrize("s_data_w", [8, 16, 32])
 def test_taxi_axi_adapter(request, s_data_w, m_data_w):
@@ -222,7 +221,7 @@ def test_taxi_axi_adapter(request, s_data_w, m_data_w):
         os.path.join(rtl_dir, f"{dut}.f"),
     ]
 
-    verilog_sources = process_f_files(verilog_sources)
+    verilog_sources = taxi_tb.filelist.process_f_files(verilog_sources)
 
     parameters = {}
 
@@ -251,7 +250,7 @@ def test_taxi_axi_adapter(request, s_data_w, m_data_w):
     sim_build = os.path.join(tests_dir, "sim_build",
         request.node.name.replace('[', '-').replace(']', ''))
 
-    cocotb_test.simulator.run(
+    taxi_tb.sim.run(
         simulator="verilator",
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
@@ -14,7 +14,6 @@ import logging
 import os
 import sys
 
-import cocotb_test.simulator
 import pytest
 
 import cocotb
@@ -35,6 +34,20 @@ except ImportError:
     finally:
         del sys.path[0]
 
+try:
+    import taxi_tb.filelist
+    import taxi_tb.shard
+    import taxi_tb.sim
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.filelist
+        import taxi_tb.shard
+        import taxi_tb.sim
+    finally:
+        del sys.path[0]
+
 DescBus, DescTransaction, DescSource, DescSink, DescMonitor = define_stream("Desc",
     signals=["req_src_addr", "req_src_sel", "req_src_asid", "req_dst_addr", "req_dst_sel", "req_dst_asid", "req_len", "req_tag", "req_valid", "req_ready"],
     optional_signals=["req_imm", "req_imm_en", "req_id", "req_dest", "req_user"]
@@ -98,9 +111,6 @@ async def run_test_write(dut, idle_inserter=None, backpressure_inserter=None):
     tag_count = 2**len(tb.write_desc_source.bus.req_tag)
 
     axi_offsets = list(range(axi_byte_lanes+1))+list(range(4096-axi_byte_lanes, 4096))
-    if os.getenv("OFFSET_GROUP") is not None:
-        group = int(os.getenv("OFFSET_GROUP"))
-        axi_offsets = axi_offsets[group::8]
 
     cur_tag = 1
 
@@ -111,35 +121,36 @@ async def run_test_write(dut, idle_inserter=None, backpressure_inserter=None):
 
     tb.dut.enable.value = 1
 
-    for length in list(range(0, ram_byte_lanes+3))+list(range(128-4, 128+4))+[1024]:
-        for axi_offset in axi_offsets:
-            for ram_offset in range(ram_byte_lanes+1):
-                tb.log.info("length %d, axi_offset %d, ram_offset %d", length, axi_offset, ram_offset)
-                axi_addr = axi_offset+0x1000
-                ram_addr = ram_offset+0x1000
-                test_data = bytearray([x % 256 for x in range(length)])
+    lengths = list(range(0, ram_byte_lanes+3))+list(range(128-4, 128+4))+[1024]
+
+    for length, axi_offset in taxi_tb.shard.items(itertools.product(lengths, axi_offsets)):
+        for ram_offset in range(ram_byte_lanes+1):
+            tb.log.info("length %d, axi_offset %d, ram_offset %d", length, axi_offset, ram_offset)
+            axi_addr = axi_offset+0x1000
+            ram_addr = ram_offset+0x1000
+            test_data = bytearray([x % 256 for x in range(length)])
 
-                tb.dma_ram.write(ram_addr & 0xffff80, b'\x55'*(len(test_data)+256))
-                tb.axi_ram.write(axi_addr-128, b'\xaa'*(len(test_data)+256))
-                tb.dma_ram.write(ram_addr, test_data)
+            tb.dma_ram.write(ram_addr & 0xffff80, b'\x55'*(len(test_data)+256))
+            tb.axi_ram.write(axi_addr-128, b'\xaa'*(len(test_data)+256))
+            tb.dma_ram.write(ram_addr, test_data)
 
-                tb.log.debug("%s", tb.dma_ram.hexdump_str((ram_addr & ~0xf)-16, (((ram_addr & 0xf)+length-1) & ~0xf)+48, prefix="RAM "))
+            tb.log.debug("%s", tb.dma_ram.hexdump_str((ram_addr & ~0xf)-16, (((ram_addr & 0xf)+length-1) & ~0xf)+48, prefix="RAM "))
 
-                desc = DescTransaction(req_dst_addr=axi_addr, req_src_addr=ram_addr, req_src_sel=0, req_len=len(test_data), req_tag=cur_tag)
-                await tb.write_desc_source.send(desc)
+            desc = DescTransaction(req_dst_addr=axi_addr, req_src_addr=ram_addr, req_src_sel=0, req_len=len(test_data), req_tag=cur_tag)
+            await tb.write_desc_source.send(desc)
 
-                status = await tb.write_desc_status_sink.recv()
+            status = await tb.write_desc_status_sink.recv()
 
-                tb.log.info("status: %s", status)
+            tb.log.info("status: %s", status)
 
-                assert int(status.sts_tag) == cur_tag
-                assert int(status.sts_error) == 0
+            assert int(status.sts_tag) == cur_tag
+            assert int(status.sts_error) == 0
 
-                tb.log.debug("%s", tb.axi_ram.hexdump_str((axi_addr & ~0xf)-16, (((axi_addr & 0xf)+length-1) & ~0xf)+48, prefix="AXI "))
+            tb.log.debug("%s", tb.axi_ram.hexdump_str((axi_addr & ~0xf)-16, (((axi_addr & 0xf)+length-1) & ~0xf)+48, prefix="AXI "))
 
-                assert tb.axi_ram.read(axi_addr-1, len(test_data)+2) == b'\xaa'+test_data+b'\xaa'
+            assert tb.axi_ram.read(axi_addr-1, len(test_data)+2) == b'\xaa'+test_data+b'\xaa'
 
-                cur_tag = (cur_tag + 1) % tag_count
+            cur_tag = (cur_tag + 1) % tag_count
 
     await RisingEdge(dut.clk)
     await RisingEdge(dut.clk)
@@ -153,9 +164,6 @@ async def run_test_write_imm(dut, idle_inserter=None, backpressure_inserter=None
     tag_count = 2**len(tb.write_desc_source.bus.req_tag)
 
     axi_offsets = list(range(axi_byte_lanes+1))+list(range(4096-axi_byte_lanes, 4096))
-    if os.getenv("OFFSET_GROUP") is not None:
-        group = int(os.getenv("OFFSET_GROUP"))
-        axi_offsets = axi_offsets[group::8]
 
     cur_tag = 1
 
@@ -166,32 +174,33 @@ async def run_test_write_imm(dut, idle_inserter=None, backpressure_inserter=None
 
     tb.dut.enable.value = 1
 
-    for length in list(range(1, len(dut.wr_desc.req_imm) // 8)):
-        for axi_offset in axi_offsets:
-            tb.log.info("length %d, axi_offset %d", length, axi_offset)
-            axi_addr = axi_offset+0x1000
-            test_data = bytearray([x % 256 for x in range(length)])
-            imm = int.from_bytes(test_data, 'little')
+    lengths = list(range(1, len(dut.wr_desc.req_imm) // 8))
 
-            tb.axi_ram.write(axi_addr-128, b'\xaa'*(len(test_data)+256))
+    for length, axi_offset in taxi_tb.shard.items(itertools.product(lengths, axi_offsets)):
+        tb.log.info("length %d, axi_offset %d", length, axi_offset)
+        axi_addr = axi_offset+0x1000
+        test_data = bytearray([x % 256 for x in range(length)])
+        imm = int.from_bytes(test_data, 'little')
 
-            tb.log.debug("Immediate: 0x%x", imm)
+        tb.axi_ram.write(axi_addr-128, b'\xaa'*(len(test_data)+256))
 
-            desc = DescTransaction(req_dst_addr=axi_addr, req_src_addr=0, req_src_sel=0, req_imm=imm, req_imm_en=1, req_len=len(test_data), req_tag=cur_tag)
-            await tb.write_desc_source.send(desc)
+        tb.log.debug("Immediate: 0x%x", imm)
 
-            status = await tb.write_desc_status_sink.recv()
+        desc = DescTransaction(req_dst_addr=axi_addr, req_src_addr=0, req_src_sel=0, req_imm=imm, req_imm_en=1, req_len=len(test_data), req_tag=cur_tag)
+        await tb.write_desc_source.send(desc)
 
-            tb.log.info("status: %s", status)
+        status = await tb.write_desc_status_sink.recv()
 
-            assert int(status.sts_tag) == cur_tag
-            assert int(status.sts_error) == 0
+        tb.log.info("status: %s", status)
 
-            tb.log.debug("%s", tb.axi_ram.hexdump_str((axi_addr & ~0xf)-16, (((axi_addr & 0xf)+length-1) & ~0xf)+48, prefix="AXI "))
+        assert int(status.sts_tag) == cur_tag
+        assert int(status.sts_error) == 0
 
-            assert tb.axi_ram.read(axi_addr-1, len(test_data)+2) == b'\xaa'+test_data+b'\xaa'
+        tb.log.debug("%s", tb.axi_ram.hexdump_str((axi_addr & ~0xf)-16, (((axi_addr & 0xf)+length-1) & ~0xf)+48, prefix="AXI "))
 
-            cur_tag = (cur_tag + 1) % tag_count
+        assert tb.axi_ram.read(axi_addr-1, len(test_data)+2) == b'\xaa'+test_data+b'\xaa'
+
+        cur_tag = (cur_tag + 1) % tag_count
 
     await RisingEdge(dut.clk)
     await RisingEdge(dut.clk)
@@ -219,22 +228,9 @@ lib_dir = os.path.abspath(os.path.join(tests_dir, '..', '..', 'lib'))
 taxi_src_dir = os.path.abspath(os.path.join(lib_dir, 'taxi', 'src'))
 
 
-def process_f_files(files):
-    lst = {}
-    for f in files:
-        if f[-2:].lower() == '.f':
-            with open(f, 'r') as fp:
-                l = fp.read().split()
-            for f in process_f_files([os.path.join(os.path.dirname(f), x) for x in l]):
-                lst[os.path.basename(f)] = f
-        else:
-            lst[os.path.basename(f)] = f
-    return list(lst.values())
-
-
-@pytest.mark.parametrize("offset_group", list(range(8)))
+@pytest.mark.shards(8)
 @pytest.mark.parametrize("axi_data_w", [64, 128])
-def test_taxi_dma_if_axi_wr(request, axi_data_w, offset_group):
+def test_taxi_dma_if_axi_wr(request, axi_data_w, shard):
     dut = "taxi_dma_if_axi_wr"
     module = os.path.splitext(os.path.basename(__file__))[0]
     toplevel = module
@@ -247,7 +243,7 @@ def test_taxi_dma_if_axi_wr(request, axi_data_w, offset_group):
         os.path.join(taxi_src_dir, "axi", "rtl", "taxi_axi_if.sv"),
     ]
 
-    verilog_sources = process_f_files(verilog_sources)
+    verilog_sources = taxi_tb.filelist.process_f_files(verilog_sources)
 
     parameters = {}
 
@@ -268,12 +264,12 @@ def test_taxi_dma_if_axi_wr(request, axi_data_w, offset_group):
 
     extra_env = {f'PARAM_{k}': str(v) for k, v in parameters.items()}
 
-    extra_env['OFFSET_GROUP'] = str(offset_group)
+    extra_env.update(shard.env())
 
     sim_build = os.path.join(tests_dir, "sim_build",
         request.node.name.replace('[', '-').replace(']', ''))
 
-    cocotb_test.simulator.run(
+    taxi_tb.sim.run(
         simulator="verilator",
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
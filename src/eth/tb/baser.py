@@ -9,12 +9,16 @@ Authors:
 
 """
 
+import atexit
 import logging
+import queue
+import struct
+import threading
 
 import cocotb
 from cocotb.queue import Queue, QueueFull
 from cocotb.triggers import RisingEdge, Timer, First, Event
-from cocotb.utils import get_sim_time
+from cocotb.utils import get_sim_time, get_time_from_sim_steps
 
 from cocotbext.eth.constants import (EthPre, XgmiiCtrl, BaseRCtrl, BaseRO,
     BaseRSync, BaseRBlockType, xgmii_ctrl_to_baser_mapping,
@@ -22,6 +26,394 @@ from cocotbext.eth.constants import (EthPre, XgmiiCtrl, BaseRCtrl, BaseRO,
 from cocotbext.eth import XgmiiFrame
 
 
+# bit reversal for reversed bit order serdes interfaces, a byte at a time
+
+_bit_reverse_table = bytes(int(f"{k:08b}"[::-1], 2) for k in range(256))
+_hdr_reverse_table = (0, 2, 1, 3)
+
+
+def reverse_bits(data, width):
+    # width must be a multiple of 8
+    n = width // 8
+    return int.from_bytes(data.to_bytes(n, 'little').translate(_bit_reverse_table), 'big')
+
+
+def reverse_hdr(hdr):
+    return _hdr_reverse_table[hdr]
+
+
+def reverse_bits_bitwise(data, width):
+    return sum(1 << (width-1-i) for i in range(width) if (data >> i) & 1)
+
+
+# 64b/66b self-synchronizing scrambler, x^58 + x^39 + 1
+#
+# The scrambler state is the last 58 bits on the line, oldest in bit 0.
+# scramble() and descramble() process a 64-bit block at a time; the
+# _bitwise versions are the bit-serial reference implementation.
+
+def _reverse_state(state):
+    return int(f"{state & 0x3ffffffffffffff:058b}"[::-1], 2)
+
+
+def scramble(data, state):
+    t = data ^ (state >> 19) ^ state
+    data = (t ^ (t << 39) ^ (t << 58)) & 0xffffffffffffffff
+    return data, data >> 6
+
+
+def descramble(data, state):
+    t = state | (data << 58)
+    return (data ^ (t >> 19) ^ t) & 0xffffffffffffffff, data >> 6
+
+
+def scramble_bitwise(data, state):
+    scrambler_state = _reverse_state(state)
+    b = 0
+    for i in range(64):
+        if bool(scrambler_state & (1 << 38)) ^ bool(scrambler_state & (1 << 57)) ^ bool(data & (1 << i)):
+            scrambler_state = ((scrambler_state & 0x1ffffffffffffff) << 1) | 1
+            b = b | (1 << i)
+        else:
+            scrambler_state = (scrambler_state & 0x1ffffffffffffff) << 1
+    return b, _reverse_state(scrambler_state)
+
+
+def descramble_bitwise(data, state):
+    scrambler_state = _reverse_state(state)
+    b = 0
+    for i in range(64):
+        if bool(scrambler_state & (1 << 38)) ^ bool(scrambler_state & (1 << 57)) ^ bool(data & (1 << i)):
+            b = b | (1 << i)
+        scrambler_state = (scrambler_state & 0x1ffffffffffffff) << 1 | bool(data & (1 << i))
+    return b, _reverse_state(scrambler_state)
+
+
+# PRBS31 test pattern, x^31 + x^28 + 1
+#
+# The state is the last 31 bits of the pattern, oldest in bit 0, matching
+# the PRBS31 registers in the PHY.  Each cycle carries n = width+2 bits,
+# {data, hdr} with the header first on the line, and the pattern is sent
+# inverted.  prbs31_check() returns the error bits, where each bit error on
+# the line shows up as three error bits.
+
+def prbs31(state, n=66):
+    t = state ^ (state >> 3)
+    data = (t ^ (t << 28) ^ (t << 31) ^ (t << 56) ^ (t << 62)) & ((1 << n)-1)
+    return data, ((state | data << 31) >> n) & 0x7fffffff
+
+
+def prbs31_check(data, state, n=66):
+    t = state | (data << 31)
+    return (data ^ (t >> 3) ^ t) & ((1 << n)-1), (t >> n) & 0x7fffffff
+
+
+# 64b/66b encoder, XGMII to BASE-R blocks
+
+def encode_block(dl, cl):
+    # dl: 8 XGMII data bytes, cl: 8 control flags
+    if not any(cl):
+        # data
+        return BaseRSync.DATA, int.from_bytes(dl, 'little')
+
+    # remap control characters
+    ctrl = sum(xgmii_ctrl_to_baser_mapping.get(d, BaseRCtrl.ERROR) << i*7 for i, d in enumerate(dl))
+
+    if cl[0] and dl[0] == XgmiiCtrl.START and not any(cl[1:]):
+        # start in lane 0
+        data = BaseRBlockType.START_0
+        for i in range(1, 8):
+            data |= dl[i] << i*8
+    elif cl[4] and dl[4] == XgmiiCtrl.START and not any(cl[5:]):
+        # start in lane 4
+        if cl[0] and (dl[0] == XgmiiCtrl.SEQ_OS or dl[0] == XgmiiCtrl.SIG_OS) and not any(cl[1:4]):
+            # ordered set in lane 0
+            data = BaseRBlockType.OS_START
+            for i in range(1, 4):
+                data |= dl[i] << i*8
+            if dl[0] == XgmiiCtrl.SIG_OS:
+                # signal ordered set
+                data |= BaseRO.SIG_OS << 32
+        else:
+            # other control
+            data = BaseRBlockType.START_4 | (ctrl & 0xfffffff) << 8
+
+        for i in range(5, 8):
+            data |= dl[i] << i*8
+    elif cl[0] and (dl[0] == XgmiiCtrl.SEQ_OS or dl[0] == XgmiiCtrl.SIG_OS) and not any(cl[1:4]):
+        # ordered set in lane 0
+        if cl[4] and (dl[4] == XgmiiCtrl.SEQ_OS or dl[4] == XgmiiCtrl.SIG_OS) and not any(cl[5:8]):
+            # ordered set in lane 4
+            data = BaseRBlockType.OS_04
+            for i in range(5, 8):
+                data |= dl[i] << i*8
+            if dl[4] == XgmiiCtrl.SIG_OS:
+                # signal ordered set
+                data |= BaseRO.SIG_OS << 36
+        else:
+            data = BaseRBlockType.OS_0 | (ctrl & 0xfffffff) << 40
+        for i in range(1, 4):
+            data |= dl[i] << i*8
+        if dl[0] == XgmiiCtrl.SIG_OS:
+            # signal ordered set
+            data |= BaseRO.SIG_OS << 32
+    elif cl[4] and (dl[4] == XgmiiCtrl.SEQ_OS or dl[4] == XgmiiCtrl.SIG_OS) and not any(cl[5:8]):
+        # ordered set in lane 4
+        data = BaseRBlockType.OS_4 | (ctrl & 0xfffffff) << 8
+        for i in range(5, 8):
+            data |= dl[i] << i*8
+        if dl[4] == XgmiiCtrl.SIG_OS:
+            # signal ordered set
+            data |= BaseRO.SIG_OS << 36
+    elif cl[0] and dl[0] == XgmiiCtrl.TERM:
+        # terminate in lane 0
+        data = BaseRBlockType.TERM_0 | (ctrl & 0xffffffffffff80) << 8
+    elif cl[1] and dl[1] == XgmiiCtrl.TERM and not cl[0]:
+        # terminate in lane 1
+        data = BaseRBlockType.TERM_1 | (ctrl & 0xffffffffffc000) << 8 | dl[0] << 8
+    elif cl[2] and dl[2] == XgmiiCtrl.TERM and not any(cl[0:2]):
+        # terminate in lane 2
+        data = BaseRBlockType.TERM_2 | (ctrl & 0xffffffffe00000) << 8
+        for i in range(2):
+            data |= dl[i] << ((i+1)*8)
+    elif cl[3] and dl[3] == XgmiiCtrl.TERM and not any(cl[0:3]):
+        # terminate in lane 3
+        data = BaseRBlockType.TERM_3 | (ctrl & 0xfffffff0000000) << 8
+        for i in range(3):
+            data |= dl[i] << ((i+1)*8)
+    elif cl[4] and dl[4] == XgmiiCtrl.TERM and not any(cl[0:4]):
+        # terminate in lane 4
+        data = BaseRBlockType.TERM_4 | (ctrl & 0xfffff800000000) << 8
+        for i in range(4):
+            data |= dl[i] << ((i+1)*8)
+    elif cl[5] and dl[5] == XgmiiCtrl.TERM and not any(cl[0:5]):
+        # terminate in lane 5
+        data = BaseRBlockType.TERM_5 | (ctrl & 0xfffc0000000000) << 8
+        for i in range(5):
+            data |= dl[i] << ((i+1)*8)
+    elif cl[6] and dl[6] == XgmiiCtrl.TERM and not any(cl[0:6]):
+        # terminate in lane 6
+        data = BaseRBlockType.TERM_6 | (ctrl & 0xfe000000000000) << 8
+        for i in range(6):
+            data |= dl[i] << ((i+1)*8)
+    elif cl[7] and dl[7] == XgmiiCtrl.TERM and not any(cl[0:7]):
+        # terminate in lane 7
+        data = BaseRBlockType.TERM_7
+        for i in range(7):
+            data |= dl[i] << ((i+1)*8)
+    else:
+        # all control
+        data = BaseRBlockType.CTRL | ctrl << 8
+
+    return BaseRSync.CTRL, data
+
+
+class CompactXgmiiFrame:
+    # XGMII frame on the BASE-R path: data bytes plus a bitmask of control
+    # flags (bit k set when byte k is a control character).  When encoding,
+    # the first preamble byte goes out as /S/, /T/ follows the data, and an
+    # offset start places the frame after implied idles, so the data can be
+    # the sender's buffer as-is.  Converted to XgmiiFrame on demand.
+
+    __slots__ = ('data', 'ctrl', 'start_lane', 'sim_time_start', 'sim_time_sfd', 'sim_time_end')
+
+    def __init__(self, data=None, ctrl=0, start_lane=0):
+        self.data = bytearray() if data is None else data
+        self.ctrl = ctrl
+        self.start_lane = start_lane
+        self.sim_time_start = None
+        self.sim_time_sfd = None
+        self.sim_time_end = None
+
+    @classmethod
+    def from_frame(cls, frame, start_lane=0):
+        n = len(frame.data)
+        ctrl = 0
+        if frame.ctrl:
+            for k, c in enumerate(frame.ctrl[:n] + [frame.ctrl[-1]]*(n-len(frame.ctrl))):
+                if c:
+                    ctrl |= 1 << k
+        return cls(frame.data, ctrl, start_lane)
+
+    def to_frame(self):
+        frame = XgmiiFrame(self.data)
+        if self.ctrl:
+            frame.ctrl = [(self.ctrl >> k) & 1 for k in range(len(self.data))]
+        frame.sim_time_start = self.sim_time_start
+        frame.sim_time_sfd = self.sim_time_sfd
+        frame.sim_time_end = self.sim_time_end
+        frame.start_lane = self.start_lane
+        return frame
+
+    def get_payload(self, strip_fcs=True):
+        start = self.data.find(EthPre.SFD)+1
+        if not start:
+            # no SFD (corrupted start or errored frame), skip the start byte
+            start = 1
+        if strip_fcs:
+            return self.data[start:-4]
+        else:
+            return self.data[start:]
+
+    def encode(self):
+        # encode the whole frame, padding the last block with idles
+        n = len(self.data)
+        s = self.start_lane
+        cnt = (s + n + 8) // 8
+
+        # control flags per block; lanes before the start and from /T/
+        # onwards are control
+        ctrl = (self.ctrl | 1) << s | ((1 << s)-1) | ((1 << cnt*8)-1) ^ ((1 << s+n)-1)
+        ctrl = ctrl.to_bytes(cnt, 'little')
+
+        blocks = []
+        with memoryview(self.data) as mv:
+            k = 0
+            while k < cnt:
+                cl = ctrl[k]
+                p = k*8 - s
+                if not cl:
+                    # run of data blocks, unpacked in one go
+                    run = cnt - k - len(ctrl[k:].lstrip(b'\x00'))
+                    blocks.extend((BaseRSync.DATA, d) for d in struct.unpack_from(f'<{run}Q', mv, p))
+                    k += run
+                    continue
+
+                k += 1
+                dl = bytearray()
+                for i in range(p, p+8):
+                    if i < 0 or i > n:
+                        dl.append(XgmiiCtrl.IDLE)
+                    elif i == 0:
+                        dl.append(XgmiiCtrl.START)
+                    elif i == n:
+                        dl.append(XgmiiCtrl.TERM)
+                    else:
+                        dl.append(mv[i])
+                blocks.append(encode_block(dl, [(cl >> i) & 1 for i in range(8)]))
+
+        return blocks
+
+    def __len__(self):
+        return len(self.data)
+
+    def __repr__(self):
+        return repr(self.to_frame())
+
+
+# pcap capture files, nanosecond timestamps, Ethernet link type; frames are
+# stored from the destination MAC through the FCS
+
+_pcap_hdr = struct.Struct('<IHHiIII')
+_pcap_rec_hdr = struct.Struct('<IIII')
+
+
+class PcapWriter:
+
+    def __init__(self, fn, max_pending=4096, policy="block", snaplen=65535):
+        # policy applies when max_pending frames are waiting to be written:
+        # "block" stalls the simulation until the writer catches up, "drop"
+        # discards the frame
+        assert policy in ("block", "drop")
+
+        self.fn = fn
+        self.policy = policy
+        self.snaplen = snaplen
+
+        self.frames = 0
+        self.dropped = 0
+
+        self._queue = queue.Queue(max_pending)
+        self._file = open(fn, 'wb')
+        self._file.write(_pcap_hdr.pack(0xa1b23c4d, 2, 4, 0, 0, snaplen, 1))
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, data, ts_ns):
+        item = (ts_ns, bytes(data))
+        if self.policy == "drop":
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        else:
+            self._queue.put(item)
+        self.frames += 1
+        return True
+
+    def write_frame(self, frame):
+        t = frame.sim_time_sfd if frame.sim_time_sfd is not None else frame.sim_time_start
+        return self.write(frame.get_payload(strip_fcs=False), round(get_time_from_sim_steps(t or 0, 'ns')))
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join()
+        self._thread = None
+        self._file.close()
+        atexit.unregister(self.close)
+
+    def _run(self):
+        done = False
+        while not done:
+            # write out everything that is pending in one go
+            items = [self._queue.get()]
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            buf = []
+            for item in items:
+                if item is None:
+                    done = True
+                    break
+                ts, data = item
+                buf.append(_pcap_rec_hdr.pack(ts // 1000000000, ts % 1000000000,
+                    min(len(data), self.snaplen), len(data)))
+                buf.append(data[:self.snaplen])
+            self._file.write(b''.join(buf))
+        self._file.flush()
+
+
+def read_pcap(fn):
+    # returns a list of (timestamp in ns, frame data)
+    with open(fn, 'rb') as f:
+        buf = f.read()
+
+    magic = struct.unpack_from('<I', buf)[0]
+    if magic in (0xa1b2c3d4, 0xa1b23c4d):
+        e = '<'
+    else:
+        e = '>'
+        magic = struct.unpack_from('>I', buf)[0]
+
+    if magic == 0xa1b23c4d:
+        scale = 1
+    elif magic == 0xa1b2c3d4:
+        scale = 1000
+    else:
+        raise ValueError(f"Not a pcap file: {fn}")
+
+    rec_hdr = struct.Struct(e+'IIII')
+    mv = memoryview(buf)
+    offset = _pcap_hdr.size
+    frames = []
+
+    while offset + rec_hdr.size <= len(buf):
+        ts_sec, ts_frac, incl_len, orig_len = rec_hdr.unpack_from(buf, offset)
+        offset += rec_hdr.size
+        frames.append((ts_sec*1000000000 + ts_frac*scale, bytes(mv[offset:offset+incl_len])))
+        offset += incl_len
+
+    return frames
+
+
 class BaseRSerdesSource():
 
     def __init__(self, data, hdr, clock, enable=None, slip=None, data_valid=None, hdr_valid=None,
@@ -56,6 +448,15 @@ class BaseRSerdesSource():
         self.ifg = 12
         self.force_offset_start = False
 
+        # use the bit-serial reference scrambler
+        self.bitwise_scrambler = False
+
+        # PRBS31 test pattern in place of the encoded data; bits set in
+        # prbs31_error_inject are flipped in the next {data, hdr} word
+        self.prbs31_enable = False
+        self.prbs31_state = 0x7fffffff
+        self.prbs31_error_inject = 0
+
         self.bit_offset = 0
 
         self.gbx_seq = 0
@@ -65,6 +466,15 @@ class BaseRSerdesSource():
         self.gbx_out_bits = 66
         self.gbx_bit_cnt = 0
 
+        # gearbox schedule, replayed by index; rebuilt from the current
+        # sequence state on configuration changes
+        self.gbx_schedule = None
+        self.gbx_schedule_clk_period = None
+        self.gbx_index = 0
+
+        # use the per-cycle reference gearbox computation
+        self.gbx_reference = False
+
         self.queue_occupancy_bytes = 0
         self.queue_occupancy_frames = 0
 
@@ -100,11 +510,15 @@ class BaseRSerdesSource():
         if self.gbx_sync is not None:
             self.gbx_sync.setimmediatevalue(0)
 
+        self._cycle = self._step_cycle()
+        next(self._cycle)
         self._run_cr = cocotb.start_soon(self._run())
 
     def set_gbx_cfg(self, seq_len=None, seq_stall=None):
         self.log.info("Set gearbox configuration")
 
+        self.gbx_schedule = None
+
         if seq_len is None:
             self.log.info("Gearbox disabled")
             self.gbx_bit_cnt = 0
@@ -113,6 +527,7 @@ class BaseRSerdesSource():
             self.gbx_in_bits = 66
             self.gbx_out_bits = 66
             self.gbx_seq = 0
+            return
 
         seq_stall = sorted(list(set(seq_stall)))
 
@@ -146,6 +561,34 @@ class BaseRSerdesSource():
                 continue
             self.gbx_bit_cnt = max(self.gbx_bit_cnt - out_bits, 0)
 
+    def get_gbx_cfg(self):
+        if not self.gbx_seq_len:
+            return None
+        return (self.gbx_seq_len, sorted(self.gbx_seq_stall))
+
+    def _build_gbx_schedule(self, clk_period):
+        # step the gearbox from the current state until the (seq, bit count)
+        # state repeats; entries are (seq, stall, bit count, delay, next index)
+        sched = []
+        states = {}
+        seq = self.gbx_seq
+        bit_cnt = self.gbx_bit_cnt
+
+        while (seq, bit_cnt) not in states:
+            states[(seq, bit_cnt)] = len(sched)
+            seq = (seq + 1) % self.gbx_seq_len
+            bit_cnt += self.gbx_in_bits
+            stall = seq in self.gbx_seq_stall
+            if not stall:
+                bit_cnt = max(bit_cnt - self.gbx_out_bits, 0)
+            sched.append((seq, stall, bit_cnt, (bit_cnt * clk_period) // self.gbx_in_bits, len(sched)+1))
+
+        sched[-1] = sched[-1][:4] + (states[(seq, bit_cnt)],)
+
+        self.gbx_schedule = sched
+        self.gbx_schedule_clk_period = clk_period
+        self.gbx_index = 0
+
     async def send(self, frame):
         while self.full():
             self.dequeue_event.clear()
@@ -196,12 +639,23 @@ class BaseRSerdesSource():
         await self.idle_event.wait()
 
     async def _run(self):
+        step = self._cycle.__next__
+        while True:
+            await RisingEdge(self.clock)
+            step()
+
+    def _step_cycle(self):
+        # per-cycle processing, advanced once per clock edge
         frame = None
-        frame_offset = 0
+        blocks = []
+        block_index = 0
+        sfd_block = -1
+        end_lane = 0
         ifg_cnt = 0
         deficit_idle_cnt = 0
         scrambler_state = 0
         last_d = 0
+        idle_run = False
         self.active = False
 
         clk_period = 0
@@ -212,7 +666,7 @@ class BaseRSerdesSource():
         hdr = 0
 
         while True:
-            await RisingEdge(self.clock)
+            yield
 
             if not clk_period:
                 if last_clk:
@@ -225,7 +679,29 @@ class BaseRSerdesSource():
                 continue
 
             # gearbox sequence
-            if self.gbx_seq_len:
+            if self.gbx_seq_len and not self.gbx_reference:
+                if self.gbx_schedule is None or self.gbx_schedule_clk_period != clk_period:
+                    self._build_gbx_schedule(clk_period)
+
+                seq, stall, self.gbx_bit_cnt, gbx_delay, self.gbx_index = self.gbx_schedule[self.gbx_index]
+                self.gbx_seq = seq
+
+                # sync pulse at the start of the sequence
+                if self.gbx_sync is not None and seq < 2:
+                    self.gbx_sync.value = (seq == 0)
+
+                # stall cycle
+                if stall:
+                    idle_run = False
+                    self.data.value = 0
+                    if self.data_valid is not None:
+                        self.data_valid.value = 0
+                    self.hdr.value = 0
+                    if self.hdr_valid is not None:
+                        self.hdr_valid.value = 0
+                    continue
+            elif self.gbx_seq_len:
+                self.gbx_schedule = None
                 self.gbx_seq = (self.gbx_seq + 1) % self.gbx_seq_len
 
                 if self.gbx_sync is not None:
@@ -235,6 +711,7 @@ class BaseRSerdesSource():
 
                 # stall cycle
                 if self.gbx_seq in self.gbx_seq_stall:
+                    idle_run = False
                     self.data.value = 0
                     if self.data_valid is not None:
                         self.data_valid.value = 0
@@ -253,6 +730,30 @@ class BaseRSerdesSource():
                 if self.gbx_sync is not None:
                     self.gbx_sync.value = 0
 
+            if self.prbs31_enable:
+                # PRBS31 test pattern, bypasses the encoder and scrambler
+                idle_run = False
+                d, self.prbs31_state = prbs31(self.prbs31_state, self.width+2)
+                d = ~d ^ self.prbs31_error_inject
+                self.prbs31_error_inject = 0
+                data_out = (d >> 2) & self.data_mask
+                hdr_out = d & 3
+                self.pack_seq = 0
+
+                if self.reverse:
+                    # bit reverse
+                    data_out = reverse_bits(data_out, self.width)
+                    hdr_out = reverse_hdr(hdr_out)
+
+                self.data.value = data_out
+                if self.data_valid is not None:
+                    self.data_valid.value = 1
+                self.hdr.value = hdr_out
+                if self.hdr_valid is not None:
+                    self.hdr_valid.value = 1
+
+                continue
+
             if self.pack_seq:
                 # output data
                 data_out = data >> (self.width*(self.pack_cnt-self.pack_seq))
@@ -260,7 +761,7 @@ class BaseRSerdesSource():
 
                 if self.reverse:
                     # bit reverse
-                    data_out = sum(1 << (self.width-1-i) for i in range(self.width) if (data_out >> i) & 1)
+                    data_out = reverse_bits(data_out & self.data_mask, self.width)
 
                 self.data.value = data_out & self.data_mask
                 if self.data_valid is not None:
@@ -271,6 +772,44 @@ class BaseRSerdesSource():
 
                 continue
 
+            if (frame is None and not ifg_cnt and not deficit_idle_cnt and self.queue.empty()
+                    and not self.bit_offset and (self.slip is None or not self.slip.value)):
+                # idle with nothing queued; after the first cycle, only the
+                # scrambled data changes from cycle to cycle
+                if self.active or not self.idle_event.is_set():
+                    self.active = False
+                    self.idle_event.set()
+
+                data = BaseRBlockType.CTRL
+                hdr = BaseRSync.CTRL
+
+                if self.scramble:
+                    # 64b/66b scrambler
+                    if self.bitwise_scrambler:
+                        data, scrambler_state = scramble_bitwise(data, scrambler_state)
+                    else:
+                        data, scrambler_state = scramble(data, scrambler_state)
+
+                self.pack_seq = self.pack_cnt-1
+
+                if self.reverse:
+                    # bit reverse
+                    self.data.value = reverse_bits(data & self.data_mask, self.width)
+                else:
+                    self.data.value = data & self.data_mask
+
+                if not idle_run:
+                    if self.data_valid is not None:
+                        self.data_valid.value = 1
+                    self.hdr.value = reverse_hdr(hdr) if self.reverse else hdr
+                    if self.hdr_valid is not None:
+                        self.hdr_valid.value = 1
+                    idle_run = self.pack_cnt == 1
+
+                continue
+
+            idle_run = False
+
             if ifg_cnt + deficit_idle_cnt > 8-1 or (not self.enable_dic and ifg_cnt > 4):
                 # in IFG
                 ifg_cnt = ifg_cnt - 8
@@ -292,14 +831,7 @@ class BaseRSerdesSource():
                     frame.sim_time_sfd = None
                     frame.sim_time_end = None
                     self.log.info("TX frame: %s", frame)
-                    frame.normalize()
                     frame.start_lane = 0
-                    assert frame.data[0] == EthPre.PRE
-                    assert frame.ctrl[0] == 0
-                    frame.data[0] = XgmiiCtrl.START
-                    frame.ctrl[0] = 1
-                    frame.data.append(XgmiiCtrl.TERM)
-                    frame.ctrl.append(1)
 
                     # offset start
                     if self.enable_dic:
@@ -310,137 +842,40 @@ class BaseRSerdesSource():
                     if ifg_cnt > min_ifg or self.force_offset_start:
                         ifg_cnt = ifg_cnt-4
                         frame.start_lane = 4
-                        frame.data = bytearray([XgmiiCtrl.IDLE]*4)+frame.data
-                        frame.ctrl = [1]*4+frame.ctrl
 
                     if self.enable_dic:
                         deficit_idle_cnt = max(deficit_idle_cnt+ifg_cnt, 0)
                     ifg_cnt = 0
                     self.active = True
-                    frame_offset = 0
+
+                    # encode the whole frame up front, the remaining cycles
+                    # only have to step through the blocks
+                    cf = CompactXgmiiFrame.from_frame(frame, frame.start_lane)
+                    assert cf.data[0] == EthPre.PRE
+                    assert not cf.ctrl & 1
+                    blocks = cf.encode()
+                    block_index = 0
+                    sfd_block = frame.data.find(EthPre.SFD)
+                    if sfd_block >= 0:
+                        sfd_block = (frame.start_lane + sfd_block) // 8
+                    end_lane = (frame.start_lane + len(frame.data)) % 8
                 else:
                     # clear counters
                     deficit_idle_cnt = 0
                     ifg_cnt = 0
 
             if frame is not None:
-                dl = bytearray()
-                cl = []
-
-                for k in range(8):
-                    if frame is not None:
-                        d = frame.data[frame_offset]
-                        if frame.sim_time_sfd is None and d == EthPre.SFD:
-                            frame.sim_time_sfd = get_sim_time() - gbx_delay
-                        dl.append(d)
-                        cl.append(frame.ctrl[frame_offset])
-                        frame_offset += 1
-
-                        if frame_offset >= len(frame.data):
-                            ifg_cnt = max(self.ifg - (8-k), 0)
-                            frame.sim_time_end = get_sim_time() - gbx_delay
-                            frame.handle_tx_complete()
-                            frame = None
-                            self.current_frame = None
-                    else:
-                        dl.append(XgmiiCtrl.IDLE)
-                        cl.append(1)
-
-                # remap control characters
-                ctrl = sum(xgmii_ctrl_to_baser_mapping.get(d, BaseRCtrl.ERROR) << i*7 for i, d in enumerate(dl))
-
-                if not any(cl):
-                    # data
-                    hdr = BaseRSync.DATA
-                    data = int.from_bytes(dl, 'little')
-                else:
-                    # control
-                    hdr = BaseRSync.CTRL
-                    if cl[0] and dl[0] == XgmiiCtrl.START and not any(cl[1:]):
-                        # start in lane 0
-                        data = BaseRBlockType.START_0
-                        for i in range(1, 8):
-                            data |= dl[i] << i*8
-                    elif cl[4] and dl[4] == XgmiiCtrl.START and not any(cl[5:]):
-                        # start in lane 4
-                        if cl[0] and (dl[0] == XgmiiCtrl.SEQ_OS or dl[0] == XgmiiCtrl.SIG_OS) and not any(cl[1:4]):
-                            # ordered set in lane 0
-                            data = BaseRBlockType.OS_START
-                            for i in range(1, 4):
-                                data |= dl[i] << i*8
-                            if dl[0] == XgmiiCtrl.SIG_OS:
-                                # signal ordered set
-                                data |= BaseRO.SIG_OS << 32
-                        else:
-                            # other control
-                            data = BaseRBlockType.START_4 | (ctrl & 0xfffffff) << 8
-
-                        for i in range(5, 8):
-                            data |= dl[i] << i*8
-                    elif cl[0] and (dl[0] == XgmiiCtrl.SEQ_OS or dl[0] == XgmiiCtrl.SIG_OS) and not any(cl[1:4]):
-                        # ordered set in lane 0
-                        if cl[4] and (dl[4] == XgmiiCtrl.SEQ_OS or dl[4] == XgmiiCtrl.SIG_OS) and not any(cl[5:8]):
-                            # ordered set in lane 4
-                            data = BaseRBlockType.OS_04
-                            for i in range(5, 8):
-                                data |= dl[i] << i*8
-                            if dl[4] == XgmiiCtrl.SIG_OS:
-                                # signal ordered set
-                                data |= BaseRO.SIG_OS << 36
-                        else:
-                            data = BaseRBlockType.OS_0 | (ctrl & 0xfffffff) << 40
-                        for i in range(1, 4):
-                            data |= dl[i] << i*8
-                        if dl[0] == XgmiiCtrl.SIG_OS:
-                            # signal ordered set
-                            data |= BaseRO.SIG_OS << 32
-                    elif cl[4] and (dl[4] == XgmiiCtrl.SEQ_OS or dl[4] == XgmiiCtrl.SIG_OS) and not any(cl[5:8]):
-                        # ordered set in lane 4
-                        data = BaseRBlockType.OS_4 | (ctrl & 0xfffffff) << 8
-                        for i in range(5, 8):
-                            data |= dl[i] << i*8
-                        if dl[4] == XgmiiCtrl.SIG_OS:
-                            # signal ordered set
-                            data |= BaseRO.SIG_OS << 36
-                    elif cl[0] and dl[0] == XgmiiCtrl.TERM:
-                        # terminate in lane 0
-                        data = BaseRBlockType.TERM_0 | (ctrl & 0xffffffffffff80) << 8
-                    elif cl[1] and dl[1] == XgmiiCtrl.TERM and not cl[0]:
-                        # terminate in lane 1
-                        data = BaseRBlockType.TERM_1 | (ctrl & 0xffffffffffc000) << 8 | dl[0] << 8
-                    elif cl[2] and dl[2] == XgmiiCtrl.TERM and not any(cl[0:2]):
-                        # terminate in lane 2
-                        data = BaseRBlockType.TERM_2 | (ctrl & 0xffffffffe00000) << 8
-                        for i in range(2):
-                            data |= dl[i] << ((i+1)*8)
-                    elif cl[3] and dl[3] == XgmiiCtrl.TERM and not any(cl[0:3]):
-                        # terminate in lane 3
-                        data = BaseRBlockType.TERM_3 | (ctrl & 0xfffffff0000000) << 8
-                        for i in range(3):
-                            data |= dl[i] << ((i+1)*8)
-                    elif cl[4] and dl[4] == XgmiiCtrl.TERM and not any(cl[0:4]):
-                        # terminate in lane 4
-                        data = BaseRBlockType.TERM_4 | (ctrl & 0xfffff800000000) << 8
-                        for i in range(4):
-                            data |= dl[i] << ((i+1)*8)
-                    elif cl[5] and dl[5] == XgmiiCtrl.TERM and not any(cl[0:5]):
-                        # terminate in lane 5
-                        data = BaseRBlockType.TERM_5 | (ctrl & 0xfffc0000000000) << 8
-                        for i in range(5):
-                            data |= dl[i] << ((i+1)*8)
-                    elif cl[6] and dl[6] == XgmiiCtrl.TERM and not any(cl[0:6]):
-                        # terminate in lane 6
-                        data = BaseRBlockType.TERM_6 | (ctrl & 0xfe000000000000) << 8
-                        for i in range(6):
-                            data |= dl[i] << ((i+1)*8)
-                    elif cl[7] and dl[7] == XgmiiCtrl.TERM and not any(cl[0:7]):
-                        # terminate in lane 7
-                        data = BaseRBlockType.TERM_7
-                        for i in range(7):
-                            data |= dl[i] << ((i+1)*8)
-                    else:
-                        # all control
-                        data = BaseRBlockType.CTRL | ctrl << 8
+                hdr, data = blocks[block_index]
+                if block_index == sfd_block:
+                    frame.sim_time_sfd = get_sim_time() - gbx_delay
+                block_index += 1
+
+                if block_index >= len(blocks):
+                    ifg_cnt = max(self.ifg - (8-end_lane), 0)
+                    frame.sim_time_end = get_sim_time() - gbx_delay
+                    frame.handle_tx_complete()
+                    frame = None
+                    self.current_frame = None
             else:
                 data = BaseRBlockType.CTRL
                 hdr = BaseRSync.CTRL
@@ -449,14 +884,10 @@ class BaseRSerdesSource():
 
             if self.scramble:
                 # 64b/66b scrambler
-                b = 0
-                for i in range(64):
-                    if bool(scrambler_state & (1 << 38)) ^ bool(scrambler_state & (1 << 57)) ^ bool(data & (1 << i)):
-                        scrambler_state = ((scrambler_state & 0x1ffffffffffffff) << 1) | 1
-                        b = b | (1 << i)
-                    else:
-                        scrambler_state = (scrambler_state & 0x1ffffffffffffff) << 1
-                data = b
+                if self.bitwise_scrambler:
+                    data, scrambler_state = scramble_bitwise(data, scrambler_state)
+                else:
+                    data, scrambler_state = scramble(data, scrambler_state)
 
             if self.slip is not None and self.slip.value:
                 self.bit_offset += 1
@@ -480,8 +911,8 @@ class BaseRSerdesSource():
 
             if self.reverse:
                 # bit reverse
-                data_out = sum(1 << (self.width-1-i) for i in range(self.width) if (data_out >> i) & 1)
-                hdr_out = sum(1 << (1-i) for i in range(2) if (hdr_out >> i) & 1)
+                data_out = reverse_bits(data_out & self.data_mask, self.width)
+                hdr_out = reverse_hdr(hdr_out)
 
             self.data.value = data_out & self.data_mask
             if self.data_valid is not None:
@@ -520,6 +951,28 @@ class BaseRSerdesSink:
         self.queue = Queue()
         self.active_event = Event()
 
+        # use the bit-serial reference descrambler
+        self.bitwise_scrambler = False
+
+        # deferred decoding: capture raw blocks on each clock edge and
+        # decode them in bulk when frames are requested or when the
+        # capture buffer fills
+        self.deferred_decode = False
+        self.capture_buffer_size = 4096
+        self.capture_buffer = None
+        self.capture_cnt = 0
+        self.decode_waiting = 0
+
+        self.rx_frame = None
+        self.scrambler_state = 0
+
+        # PRBS31 checker in place of the decoder
+        self.prbs31_enable = False
+        self.prbs31_state = 0x7fffffff
+        self.prbs31_bit_cnt = 0
+        self.prbs31_err_cnt = 0
+        self.prbs31_word_err_cnt = 0
+
         self.gbx_seq = 0
         self.gbx_seq_gen = 0
         self.gbx_seq_len = None
@@ -528,9 +981,27 @@ class BaseRSerdesSink:
         self.gbx_out_bits = 66
         self.gbx_bit_cnt = 0
 
+        # gearbox schedule: request flags indexed by generation sequence, and
+        # steps keyed on (seq, bit count) as gbx_sync can realign seq at any
+        # point; rebuilt on configuration changes
+        self.gbx_gen_schedule = None
+        self.gbx_schedule = None
+        self.gbx_schedule_clk_period = None
+
+        # use the per-cycle reference gearbox computation
+        self.gbx_reference = False
+
         self.queue_occupancy_bytes = 0
         self.queue_occupancy_frames = 0
 
+        # received frames are dropped when the queue is full
+        self.queue_occupancy_limit_bytes = -1
+        self.queue_occupancy_limit_frames = -1
+        self.queue_dropped_frames = 0
+
+        # received frames are also written here, see open_pcap()
+        self.pcap_writer = None
+
         self.width = len(self.data)
         self.byte_size = 8
         self.byte_lanes = self.width // self.byte_size
@@ -555,15 +1026,22 @@ class BaseRSerdesSink:
         if self.gbx_req_stall is not None:
             self.gbx_req_stall.setimmediatevalue(0)
 
+        self._cycle = self._step_cycle()
+        next(self._cycle)
         self._run_cr = cocotb.start_soon(self._run())
 
     def set_gbx_cfg(self, seq_len=None, seq_stall=None):
         self.log.info("Set gearbox configuration")
 
+        self.gbx_schedule = None
+
         if seq_len is None:
             self.log.info("Gearbox disabled")
             self.gbx_seq_len = None
             self.gbx_seq_stall = None
+            self.gbx_in_bits = 66
+            self.gbx_out_bits = 66
+            return
 
         seq_stall = sorted(list(set(seq_stall)))
 
@@ -598,33 +1076,100 @@ class BaseRSerdesSink:
                 continue
             self.gbx_bit_cnt += in_bits
 
+    def get_gbx_cfg(self):
+        if not self.gbx_seq_len:
+            return None
+        return (self.gbx_seq_len, sorted(self.gbx_seq_stall))
+
+    def _gbx_step(self, seq, bit_cnt, clk_period):
+        key = (seq, bit_cnt)
+        bit_cnt = max(bit_cnt - self.gbx_out_bits, 0)
+        stall = seq in self.gbx_seq_stall
+        if not stall:
+            bit_cnt += self.gbx_in_bits
+        step = (stall, bit_cnt, (bit_cnt * clk_period) // self.gbx_out_bits)
+        self.gbx_schedule[key] = step
+        return step
+
+    def _build_gbx_schedule(self, clk_period):
+        # entries are (next gen seq, req sync, req stall)
+        self.gbx_gen_schedule = []
+        for k in range(self.gbx_seq_len):
+            gen = (k + 1) % self.gbx_seq_len
+            self.gbx_gen_schedule.append((gen, gen == 0, gen in self.gbx_seq_stall))
+
+        # fill in the free-running sequence from the current state until it
+        # repeats; entries are (stall, bit count, delay)
+        self.gbx_schedule = {}
+        self.gbx_schedule_clk_period = clk_period
+        seq = self.gbx_seq
+        bit_cnt = self.gbx_bit_cnt
+
+        while True:
+            seq = (seq + 1) % self.gbx_seq_len
+            if (seq, bit_cnt) in self.gbx_schedule:
+                break
+            bit_cnt = self._gbx_step(seq, bit_cnt, clk_period)[1]
+
     def _recv(self, frame, compact=True):
         if self.queue.empty():
             self.active_event.clear()
         self.queue_occupancy_bytes -= len(frame)
         self.queue_occupancy_frames -= 1
+        frame = frame.to_frame()
         if compact:
             frame.compact()
         return frame
 
     async def recv(self, compact=True):
-        frame = await self.queue.get()
+        self._decode_captured()
+        if self.queue.empty():
+            # decode as blocks arrive while waiting
+            self.decode_waiting += 1
+            try:
+                frame = await self.queue.get()
+            finally:
+                self.decode_waiting -= 1
+        else:
+            frame = self.queue.get_nowait()
         return self._recv(frame, compact)
 
     def recv_nowait(self, compact=True):
+        self._decode_captured()
         frame = self.queue.get_nowait()
         return self._recv(frame, compact)
 
     def count(self):
+        self._decode_captured()
         return self.queue.qsize()
 
     def empty(self):
+        self._decode_captured()
         return self.queue.empty()
 
+    def full(self):
+        if self.queue_occupancy_limit_bytes > 0 and self.queue_occupancy_bytes >= self.queue_occupancy_limit_bytes:
+            return True
+        elif self.queue_occupancy_limit_frames > 0 and self.queue_occupancy_frames >= self.queue_occupancy_limit_frames:
+            return True
+        else:
+            return False
+
     def idle(self):
         return not self.active
 
+    def open_pcap(self, fn, max_pending=4096, policy="block"):
+        self.close_pcap()
+        self.pcap_writer = PcapWriter(fn, max_pending, policy)
+
+    def close_pcap(self):
+        self._decode_captured()
+        if self.pcap_writer is not None:
+            self.pcap_writer.close()
+            self.pcap_writer = None
+
     def clear(self):
+        self._decode_captured()
         while not self.queue.empty():
             self.queue.get_nowait()
         self.active_event.clear()
@@ -634,14 +1179,212 @@ class BaseRSerdesSink:
     async def wait(self, timeout=0, timeout_unit=None):
         if not self.empty():
             return
-        if timeout:
-            await First(self.active_event.wait(), Timer(timeout, timeout_unit))
+        self.decode_waiting += 1
+        try:
+            if timeout:
+                await First(self.active_event.wait(), Timer(timeout, timeout_unit))
+            else:
+                await self.active_event.wait()
+        finally:
+            self.decode_waiting -= 1
+
+    def _decode_block(self, hdr, data, t):
+        frame = self.rx_frame
+
+        if self.scramble:
+            # 64b/66b descrambler
+            if self.bitwise_scrambler:
+                data, self.scrambler_state = descramble_bitwise(data, self.scrambler_state)
+            else:
+                data, self.scrambler_state = descramble(data, self.scrambler_state)
+
+        # 10GBASE-R decoding
+
+        db = data.to_bytes(8, 'little')
+
+        if hdr == BaseRSync.DATA and frame is not None:
+            # data in the middle of a frame
+            if frame.sim_time_sfd is None and EthPre.SFD in db:
+                frame.sim_time_sfd = t
+            frame.data += db
+            return
+
+        # remap control characters
+        ctrl = bytearray(baser_ctrl_to_xgmii_mapping.get((data >> i*7+8) & 0x7f, XgmiiCtrl.ERROR) for i in range(8))
+
+        dl = bytearray()
+        cl = []
+        if hdr == BaseRSync.DATA:
+            # data
+            dl = db
+            cl = [0]*8
+        elif hdr == BaseRSync.CTRL:
+            if db[0] == BaseRBlockType.CTRL:
+                # C7 C6 C5 C4 C3 C2 C1 C0 BT
+                dl = ctrl
+                cl = [1]*8
+            elif db[0] == BaseRBlockType.OS_4:
+                # D7 D6 D5 O4 C3 C2 C1 C0 BT
+                dl = ctrl[0:4]
+                cl = [1]*4
+                if (db[4] >> 4) & 0xf == BaseRO.SEQ_OS:
+                    dl.append(XgmiiCtrl.SEQ_OS)
+                elif (db[4] >> 4) & 0xf == BaseRO.SIG_OS:
+                    dl.append(XgmiiCtrl.SIG_OS)
+                else:
+                    dl.append(XgmiiCtrl.ERROR)
+                cl.append(1)
+                dl += db[5:]
+                cl += [0]*3
+            elif db[0] == BaseRBlockType.START_4:
+                # D7 D6 D5    C3 C2 C1 C0 BT
+                dl = ctrl[0:4]
+                cl = [1]*4
+                dl.append(XgmiiCtrl.START)
+                cl.append(1)
+                dl += db[5:]
+                cl += [0]*3
+            elif db[0] == BaseRBlockType.OS_START:
+                # D7 D6 D5    O0 D3 D2 D1 BT
+                if db[4] & 0xf == BaseRO.SEQ_OS:
+                    dl.append(XgmiiCtrl.SEQ_OS)
+                elif db[4] & 0xf == BaseRO.SIG_OS:
+                    dl.append(XgmiiCtrl.SIG_OS)
+                else:
+                    dl.append(XgmiiCtrl.ERROR)
+                cl.append(1)
+                dl += db[1:4]
+                cl += [0]*3
+                dl.append(XgmiiCtrl.START)
+                cl.append(1)
+                dl += db[5:]
+                cl += [0]*3
+            elif db[0] == BaseRBlockType.OS_04:
+                # D7 D6 D5 O4 O0 D3 D2 D1 BT
+                if db[4] & 0xf == BaseRO.SEQ_OS:
+                    dl.append(XgmiiCtrl.SEQ_OS)
+                elif db[4] & 0xf == BaseRO.SIG_OS:
+                    dl.append(XgmiiCtrl.SIG_OS)
+                else:
+                    dl.append(XgmiiCtrl.ERROR)
+                cl.append(1)
+                dl += db[1:4]
+                cl += [0]*3
+                if (db[4] >> 4) & 0xf == BaseRO.SEQ_OS:
+                    dl.append(XgmiiCtrl.SEQ_OS)
+                elif (db[4] >> 4) & 0xf == BaseRO.SIG_OS:
+                    dl.append(XgmiiCtrl.SIG_OS)
+                else:
+                    dl.append(XgmiiCtrl.ERROR)
+                cl.append(1)
+                dl += db[5:]
+                cl += [0]*3
+            elif db[0] == BaseRBlockType.START_0:
+                # D7 D6 D5 D4 D3 D2 D1    BT
+                dl.append(XgmiiCtrl.START)
+                cl.append(1)
+                dl += db[1:]
+                cl += [0]*7
+            elif db[0] == BaseRBlockType.OS_0:
+                # C7 C6 C5 C4 O0 D3 D2 D1 BT
+                if db[4] & 0xf == BaseRO.SEQ_OS:
+                    dl.append(XgmiiCtrl.SEQ_OS)
+                elif db[4] & 0xf == BaseRO.SIG_OS:
+                    dl.append(XgmiiCtrl.SEQ_OS)
+                else:
+                    dl.append(XgmiiCtrl.ERROR)
+                cl.append(1)
+                dl += db[1:4]
+                cl += [0]*3
+                dl += ctrl[4:]
+                cl += [1]*4
+            elif db[0] in {BaseRBlockType.TERM_0, BaseRBlockType.TERM_1,
+                    BaseRBlockType.TERM_2, BaseRBlockType.TERM_3, BaseRBlockType.TERM_4,
+                    BaseRBlockType.TERM_5, BaseRBlockType.TERM_6, BaseRBlockType.TERM_7}:
+                # C7 C6 C5 C4 C3 C2 C1    BT
+                # C7 C6 C5 C4 C3 C2    D0 BT
+                # C7 C6 C5 C4 C3    D1 D0 BT
+                # C7 C6 C5 C4    D2 D1 D0 BT
+                # C7 C6 C5    D3 D2 D1 D0 BT
+                # C7 C6    D4 D3 D2 D1 D0 BT
+                # C7    D5 D4 D3 D2 D1 D0 BT
+                #    D6 D5 D4 D3 D2 D1 D0 BT
+                term_lane = block_type_term_lane_mapping[db[0]]
+                dl += db[1:term_lane+1]
+                cl += [0]*term_lane
+                dl.append(XgmiiCtrl.TERM)
+                cl.append(1)
+                dl += ctrl[term_lane+1:]
+                cl += [1]*(7-term_lane)
+            else:
+                # invalid block type
+                self.log.warning("Invalid block type")
+                dl = [XgmiiCtrl.ERROR]*8
+                cl = [1]*8
         else:
-            await self.active_event.wait()
+            # invalid sync header
+            self.log.warning("Invalid sync header")
+            dl = [XgmiiCtrl.ERROR]*8
+            cl = [1]*8
+
+        for offset in range(8):
+            d_val = dl[offset]
+            c_val = cl[offset]
+
+            if frame is None:
+                if c_val and d_val == XgmiiCtrl.START:
+                    # start
+                    frame = CompactXgmiiFrame(bytearray([EthPre.PRE]), 0, offset)
+                    frame.sim_time_start = t
+            else:
+                if c_val:
+                    # got a control character; terminate frame reception
+                    if d_val != XgmiiCtrl.TERM:
+                        # store control character if it's not a termination
+                        frame.ctrl |= 1 << len(frame.data)
+                        frame.data.append(d_val)
+
+                    frame.sim_time_end = t
+                    self.log.info("RX frame: %s", frame)
+
+                    if self.pcap_writer is not None:
+                        self.pcap_writer.write_frame(frame)
+
+                    if self.full():
+                        self.queue_dropped_frames += 1
+                    else:
+                        self.queue_occupancy_bytes += len(frame)
+                        self.queue_occupancy_frames += 1
+
+                        self.queue.put_nowait(frame)
+                        self.active_event.set()
+
+                    frame = None
+                else:
+                    if frame.sim_time_sfd is None and d_val == EthPre.SFD:
+                        frame.sim_time_sfd = t
+
+                    frame.data.append(d_val)
+
+        self.rx_frame = frame
+
+    def _decode_captured(self):
+        buf = self.capture_buffer
+        for k in range(self.capture_cnt):
+            self._decode_block(*buf[k])
+            buf[k] = None
+        self.capture_cnt = 0
 
     async def _run(self):
-        frame = None
-        scrambler_state = 0
+        step = self._cycle.__next__
+        while True:
+            await RisingEdge(self.clock)
+            step()
+
+    def _step_cycle(self):
+        # per-cycle processing, advanced once per clock edge
+        self.rx_frame = None
+        self.scrambler_state = 0
         self.active = False
 
         clk_period = 0
@@ -653,7 +1396,7 @@ class BaseRSerdesSink:
         hdr = 0
 
         while True:
-            await RisingEdge(self.clock)
+            yield
 
             if not clk_period:
                 if last_clk:
@@ -666,7 +1409,42 @@ class BaseRSerdesSink:
                 continue
 
             # gearbox sequence
-            if self.gbx_seq_len:
+            if self.gbx_seq_len and not self.gbx_reference:
+                if self.gbx_schedule is None or self.gbx_schedule_clk_period != clk_period:
+                    self._build_gbx_schedule(clk_period)
+
+                # generation
+                self.gbx_seq_gen, req_sync, req_stall = self.gbx_gen_schedule[self.gbx_seq_gen]
+
+                if self.gbx_req_sync is not None:
+                    self.gbx_req_sync.value = req_sync
+
+                # stall cycle
+                if self.gbx_req_stall is not None:
+                    self.gbx_req_stall.value = req_stall
+
+                # sync
+                seq = self.gbx_seq + 1
+                if seq >= self.gbx_seq_len:
+                    seq = 0
+
+                if self.gbx_sync is not None:
+                    if int(self.gbx_sync.value):
+                        seq = 0
+
+                self.gbx_seq = seq
+
+                step = self.gbx_schedule.get((seq, self.gbx_bit_cnt))
+                if step is None:
+                    step = self._gbx_step(seq, self.gbx_bit_cnt, clk_period)
+
+                stall, self.gbx_bit_cnt, gbx_delay = step
+
+                if stall:
+                    continue
+            elif self.gbx_seq_len:
+                self.gbx_schedule = None
+
                 # generation
                 self.gbx_seq_gen = (self.gbx_seq_gen + 1) % self.gbx_seq_len
 
@@ -715,8 +1493,18 @@ class BaseRSerdesSink:
 
             if self.reverse:
                 # bit reverse
-                data_in = sum(1 << (self.width-1-i) for i in range(self.width) if (data_in >> i) & 1)
-                hdr_in = sum(1 << (1-i) for i in range(2) if (hdr_in >> i) & 1)
+                data_in = reverse_bits(data_in, self.width)
+                hdr_in = reverse_hdr(hdr_in)
+
+            if self.prbs31_enable:
+                # PRBS31 checker, one {data, hdr} word per cycle
+                err, self.prbs31_state = prbs31_check(~(data_in << 2 | hdr_in), self.prbs31_state, self.width+2)
+                self.prbs31_bit_cnt += self.width+2
+                if err:
+                    self.prbs31_err_cnt += bin(err).count('1')
+                    self.prbs31_word_err_cnt += 1
+                self.pack_seq = 0
+                continue
 
             if self.pack_cnt > 1:
                 # pack input data
@@ -738,169 +1526,63 @@ class BaseRSerdesSink:
                 data = data_in
                 hdr = hdr_in
 
-            if self.scramble:
-                # 64b/66b descrambler
-                b = 0
-                for i in range(64):
-                    if bool(scrambler_state & (1 << 38)) ^ bool(scrambler_state & (1 << 57)) ^ bool(data & (1 << i)):
-                        b = b | (1 << i)
-                    scrambler_state = (scrambler_state & 0x1ffffffffffffff) << 1 | bool(data & (1 << i))
-                data = b
-
-            # 10GBASE-R decoding
-
-            # remap control characters
-            ctrl = bytearray(baser_ctrl_to_xgmii_mapping.get((data >> i*7+8) & 0x7f, XgmiiCtrl.ERROR) for i in range(8))
-
-            db = data.to_bytes(8, 'little')
-
-            dl = bytearray()
-            cl = []
-            if hdr == BaseRSync.DATA:
-                # data
-                dl = db
-                cl = [0]*8
-            elif hdr == BaseRSync.CTRL:
-                if db[0] == BaseRBlockType.CTRL:
-                    # C7 C6 C5 C4 C3 C2 C1 C0 BT
-                    dl = ctrl
-                    cl = [1]*8
-                elif db[0] == BaseRBlockType.OS_4:
-                    # D7 D6 D5 O4 C3 C2 C1 C0 BT
-                    dl = ctrl[0:4]
-                    cl = [1]*4
-                    if (db[4] >> 4) & 0xf == BaseRO.SEQ_OS:
-                        dl.append(XgmiiCtrl.SEQ_OS)
-                    elif (db[4] >> 4) & 0xf == BaseRO.SIG_OS:
-                        dl.append(XgmiiCtrl.SIG_OS)
-                    else:
-                        dl.append(XgmiiCtrl.ERROR)
-                    cl.append(1)
-                    dl += db[5:]
-                    cl += [0]*3
-                elif db[0] == BaseRBlockType.START_4:
-                    # D7 D6 D5    C3 C2 C1 C0 BT
-                    dl = ctrl[0:4]
-                    cl = [1]*4
-                    dl.append(XgmiiCtrl.START)
-                    cl.append(1)
-                    dl += db[5:]
-                    cl += [0]*3
-                elif db[0] == BaseRBlockType.OS_START:
-                    # D7 D6 D5    O0 D3 D2 D1 BT
-                    if db[4] & 0xf == BaseRO.SEQ_OS:
-                        dl.append(XgmiiCtrl.SEQ_OS)
-                    elif db[4] & 0xf == BaseRO.SIG_OS:
-                        dl.append(XgmiiCtrl.SIG_OS)
-                    else:
-                        dl.append(XgmiiCtrl.ERROR)
-                    cl.append(1)
-                    dl += db[1:4]
-                    cl += [0]*3
-                    dl.append(XgmiiCtrl.START)
-                    cl.append(1)
-                    dl += db[5:]
-                    cl += [0]*3
-                elif db[0] == BaseRBlockType.OS_04:
-                    # D7 D6 D5 O4 O0 D3 D2 D1 BT
-                    if db[4] & 0xf == BaseRO.SEQ_OS:
-                        dl.append(XgmiiCtrl.SEQ_OS)
-                    elif db[4] & 0xf == BaseRO.SIG_OS:
-                        dl.append(XgmiiCtrl.SIG_OS)
-                    else:
-                        dl.append(XgmiiCtrl.ERROR)
-                    cl.append(1)
-                    dl += db[1:4]
-                    cl += [0]*3
-                    if (db[4] >> 4) & 0xf == BaseRO.SEQ_OS:
-                        dl.append(XgmiiCtrl.SEQ_OS)
-                    elif (db[4] >> 4) & 0xf == BaseRO.SIG_OS:
-                        dl.append(XgmiiCtrl.SIG_OS)
-                    else:
-                        dl.append(XgmiiCtrl.ERROR)
-                    cl.append(1)
-                    dl += db[5:]
-                    cl += [0]*3
-                elif db[0] == BaseRBlockType.START_0:
-                    # D7 D6 D5 D4 D3 D2 D1    BT
-                    dl.append(XgmiiCtrl.START)
-                    cl.append(1)
-                    dl += db[1:]
-                    cl += [0]*7
-                elif db[0] == BaseRBlockType.OS_0:
-                    # C7 C6 C5 C4 O0 D3 D2 D1 BT
-                    if db[4] & 0xf == BaseRO.SEQ_OS:
-                        dl.append(XgmiiCtrl.SEQ_OS)
-                    elif db[4] & 0xf == BaseRO.SIG_OS:
-                        dl.append(XgmiiCtrl.SEQ_OS)
-                    else:
-                        dl.append(XgmiiCtrl.ERROR)
-                    cl.append(1)
-                    dl += db[1:4]
-                    cl += [0]*3
-                    dl += ctrl[4:]
-                    cl += [1]*4
-                elif db[0] in {BaseRBlockType.TERM_0, BaseRBlockType.TERM_1,
-                        BaseRBlockType.TERM_2, BaseRBlockType.TERM_3, BaseRBlockType.TERM_4,
-                        BaseRBlockType.TERM_5, BaseRBlockType.TERM_6, BaseRBlockType.TERM_7}:
-                    # C7 C6 C5 C4 C3 C2 C1    BT
-                    # C7 C6 C5 C4 C3 C2    D0 BT
-                    # C7 C6 C5 C4 C3    D1 D0 BT
-                    # C7 C6 C5 C4    D2 D1 D0 BT
-                    # C7 C6 C5    D3 D2 D1 D0 BT
-                    # C7 C6    D4 D3 D2 D1 D0 BT
-                    # C7    D5 D4 D3 D2 D1 D0 BT
-                    #    D6 D5 D4 D3 D2 D1 D0 BT
-                    term_lane = block_type_term_lane_mapping[db[0]]
-                    dl += db[1:term_lane+1]
-                    cl += [0]*term_lane
-                    dl.append(XgmiiCtrl.TERM)
-                    cl.append(1)
-                    dl += ctrl[term_lane+1:]
-                    cl += [1]*(7-term_lane)
-                else:
-                    # invalid block type
-                    self.log.warning("Invalid block type")
-                    dl = [XgmiiCtrl.ERROR]*8
-                    cl = [1]*8
+            if self.deferred_decode:
+                # capture raw block, decode later
+                if self.capture_buffer is None or len(self.capture_buffer) != self.capture_buffer_size:
+                    self._decode_captured()
+                    self.capture_buffer = [None]*self.capture_buffer_size
+
+                self.capture_buffer[self.capture_cnt] = (hdr, data, get_sim_time() + gbx_delay)
+                self.capture_cnt += 1
+
+                if self.capture_cnt >= self.capture_buffer_size or self.decode_waiting:
+                    self._decode_captured()
             else:
-                # invalid sync header
-                self.log.warning("Invalid sync header")
-                dl = [XgmiiCtrl.ERROR]*8
-                cl = [1]*8
+                if self.capture_cnt:
+                    self._decode_captured()
+                self._decode_block(hdr, data, get_sim_time() + gbx_delay)
 
-            for offset in range(8):
-                d_val = dl[offset]
-                c_val = cl[offset]
 
-                if frame is None:
-                    if c_val and d_val == XgmiiCtrl.START:
-                        # start
-                        frame = XgmiiFrame(bytearray([EthPre.PRE]), [0])
-                        frame.sim_time_start = get_sim_time() + gbx_delay
-                        frame.start_lane = offset
-                else:
-                    if c_val:
-                        # got a control character; terminate frame reception
-                        if d_val != XgmiiCtrl.TERM:
-                            # store control character if it's not a termination
-                            frame.data.append(d_val)
-                            frame.ctrl.append(c_val)
+class BaseRSerdesLaneGroup:
 
-                        frame.compact()
-                        frame.sim_time_end = get_sim_time() + gbx_delay
-                        self.log.info("RX frame: %s", frame)
+    def __init__(self, clock, lanes=None, *args, **kwargs):
+        self.log = logging.getLogger(f"cocotb.{clock._path}")
+        self.clock = clock
 
-                        self.queue_occupancy_bytes += len(frame)
-                        self.queue_occupancy_frames += 1
+        self.log.info("BASE-R serdes lane group")
 
-                        self.queue.put_nowait(frame)
-                        self.active_event.set()
+        super().__init__(*args, **kwargs)
 
-                        frame = None
-                    else:
-                        if frame.sim_time_sfd is None and d_val == EthPre.SFD:
-                            frame.sim_time_sfd = get_sim_time() + gbx_delay
+        self.lanes = []
+        self._steps = []
 
-                        frame.data.append(d_val)
-                        frame.ctrl.append(c_val)
+        for lane in lanes or []:
+            self.add_lane(lane)
+
+        self._run_cr = cocotb.start_soon(self._run())
+
+    def add_lane(self, lane):
+        # lanes are BaseRSerdesSource or BaseRSerdesSink instances with
+        # clocks that are in phase with the group clock; the group takes
+        # over stepping the lane from the lane's own coroutine
+        if lane in self.lanes:
+            return
+        if lane._run_cr is not None:
+            lane._run_cr.kill()
+            lane._run_cr = None
+        self.lanes.append(lane)
+        self._steps.append(lane._cycle.__next__)
+        self.log.info("Add lane %d: %s", len(self.lanes)-1, lane.data._path)
+
+    def remove_lane(self, lane):
+        k = self.lanes.index(lane)
+        del self.lanes[k]
+        del self._steps[k]
+        lane._run_cr = cocotb.start_soon(lane._run())
+
+    async def _run(self):
+        while True:
+            await RisingEdge(self.clock)
+
+            for step in self._steps:
+                step()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+# Benchmark for the BASE-R serdes models, run without a simulator:
+#
+#   python bench_baser.py            primitives and loopback throughput
+#   python bench_baser.py --reference    same, with the reference bit-serial
+#                                        bit reversal and scrambler
+
+import argparse
+import itertools
+import logging
+import os
+import random
+import sys
+import time
+import timeit
+
+from cocotb.utils import get_sim_steps
+from cocotbext.eth import XgmiiFrame
+
+try:
+    import baser
+except ImportError:
+    # attempt import from current directory
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+    try:
+        import baser
+    finally:
+        del sys.path[0]
+
+try:
+    import taxi_tb.loopback
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.loopback
+    finally:
+        del sys.path[0]
+
+
+async def run_loopback(sim, width=64, scramble=True, reverse=False, frames=200, length=512, reference=False):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    data = sim.signal("serdes_data", width)
+    data_valid = sim.signal("serdes_data_valid")
+    hdr = sim.signal("serdes_hdr", 2)
+    hdr_valid = sim.signal("serdes_hdr_valid")
+
+    source = baser.BaseRSerdesSource(data=data, data_valid=data_valid, hdr=hdr, hdr_valid=hdr_valid,
+        clock=clk, scramble=scramble, reverse=reverse)
+    sink = baser.BaseRSerdesSink(data=data, data_valid=data_valid, hdr=hdr, hdr_valid=hdr_valid,
+        clock=clk, scramble=scramble, reverse=reverse)
+
+    source.bitwise_scrambler = reference
+    sink.bitwise_scrambler = reference
+
+    payload = bytes(itertools.islice(itertools.cycle(range(256)), length))
+
+    for k in range(frames):
+        await source.send(XgmiiFrame.from_payload(payload))
+
+    for k in range(frames):
+        rx_frame = await sink.recv()
+        assert rx_frame.get_payload() == payload
+
+
+def bench_primitives(number):
+    rng = random.Random(1)
+    rows = []
+
+    for width in [8, 16, 32, 64]:
+        d = rng.getrandbits(width)
+        assert baser.reverse_bits(d, width) == baser.reverse_bits_bitwise(d, width)
+        t_ref = timeit.timeit(lambda: baser.reverse_bits_bitwise(d, width), number=number)
+        t_new = timeit.timeit(lambda: baser.reverse_bits(d, width), number=number)
+        rows.append((f"reverse_bits({width})", t_ref, t_new))
+
+    d = rng.getrandbits(64)
+    s = rng.getrandbits(58)
+    t_ref = timeit.timeit(lambda: baser.scramble_bitwise(d, s), number=number)
+    t_new = timeit.timeit(lambda: baser.scramble(d, s), number=number)
+    rows.append(("scramble", t_ref, t_new))
+    t_ref = timeit.timeit(lambda: baser.descramble_bitwise(d, s), number=number)
+    t_new = timeit.timeit(lambda: baser.descramble(d, s), number=number)
+    rows.append(("descramble", t_ref, t_new))
+
+    print(f"{'primitive':<20} {'reference':>12} {'current':>12} {'speedup':>8}")
+    for name, t_ref, t_new in rows:
+        print(f"{name:<20} {t_ref/number*1e9:10.0f}ns {t_new/number*1e9:10.0f}ns {t_ref/t_new:7.1f}x")
+
+
+def bench_loopback(frames, length, reference):
+    # the models have no switch for the bit reversal, swap in the reference
+    # implementation for the duration of the run only
+    reverse_bits = baser.reverse_bits
+    if reference:
+        baser.reverse_bits = baser.reverse_bits_bitwise
+
+    try:
+        print(f"{'width':>5} {'scramble':>8} {'reverse':>7} {'wall':>8} {'cycles/s':>10} {'Mbps':>8}")
+        for width, scramble, reverse in itertools.product([32, 64], [True, False], [False, True]):
+            start = time.perf_counter()
+            with taxi_tb.loopback.Sim() as sim:
+                sim.run(run_loopback(sim, width, scramble, reverse, frames, length, reference))
+                cycles = sim.time / get_sim_steps(6.4 if width == 64 else 3.2, "ns")
+            wall = time.perf_counter() - start
+            print(f"{width:5} {scramble!s:>8} {reverse!s:>7} {wall:7.2f}s {cycles/wall:10.0f} "
+                f"{frames*length*8/wall/1e6:8.2f}")
+    finally:
+        baser.reverse_bits = reverse_bits
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the BASE-R serdes models")
+    parser.add_argument('--reference', action='store_true', help="Use the reference bit-serial implementations")
+    parser.add_argument('--frames', type=int, default=200, help="Frames per loopback run")
+    parser.add_argument('--length', type=int, default=512, help="Payload length")
+    parser.add_argument('-n', '--number', type=int, default=10000, help="Iterations per primitive")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger("cocotb").setLevel(logging.ERROR)
+
+    bench_primitives(args.number)
+    print()
+    bench_loopback(args.frames, args.length, args.reference)
+
+
+if __name__ == '__main__':
+    main()
@@ -18,7 +18,6 @@ import sys
 from scapy.layers.l2 import Ether
 
 import pytest
-import cocotb_test.simulator
 
 import cocotb
 from cocotb.clock import Clock
@@ -31,12 +30,24 @@ from cocotbext.axi import AxiStreamBus, AxiStreamSource, AxiStreamSink, AxiStrea
 from cocotbext.axi import ApbBus, ApbMaster
 
 try:
-    from baser import BaseRSerdesSource, BaseRSerdesSink
+    from baser import BaseRSerdesSource, BaseRSerdesSink, BaseRSerdesLaneGroup
 except ImportError:
     # attempt import from current directory
     sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
     try:
-        from baser import BaseRSerdesSource, BaseRSerdesSink
+        from baser import BaseRSerdesSource, BaseRSerdesSink, BaseRSerdesLaneGroup
+    finally:
+        del sys.path[0]
+
+try:
+    import taxi_tb.filelist
+    import taxi_tb.sim
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.filelist
+        import taxi_tb.sim
     finally:
         del sys.path[0]
 
@@ -57,6 +68,10 @@ class TB:
         self.serdes_sources = []
         self.serdes_sinks = []
 
+        # serdes lanes with the same clock period are stepped together, as
+        # the serdes clocks are all started at the same time
+        self.lane_groups = {}
+
         self.clk_period = []
 
         for ch in dut.uut.ch:
@@ -103,6 +118,11 @@ class TB:
                 gbx_cfg=gbx_cfg
             ))
 
+            if clk not in self.lane_groups:
+                self.lane_groups[clk] = BaseRSerdesLaneGroup(gt_inst.tx_clk)
+            self.lane_groups[clk].add_lane(self.serdes_sources[-1])
+            self.lane_groups[clk].add_lane(self.serdes_sinks[-1])
+
         self.axis_sources = []
         self.tx_cpl_sinks = []
         self.axis_sinks = []
@@ -977,19 +997,6 @@ lib_dir = os.path.abspath(os.path.join(tests_dir, '..', '..', 'lib'))
 taxi_src_dir = os.path.abspath(os.path.join(lib_dir, 'taxi', 'src'))
 
 
-def process_f_files(files):
-    lst = {}
-    for f in files:
-        if f[-2:].lower() == '.f':
-            with open(f, 'r') as fp:
-                l = fp.read().split()
-            for f in process_f_files([os.path.join(os.path.dirname(f), x) for x in l]):
-                lst[os.path.basename(f)] = f
-        else:
-            lst[os.path.basename(f)] = f
-    return list(lst.values())
-
-
 @pytest.mark.parametrize(("dic_en", "pfc_en"), [(1, 1), (1, 0), (0, 0)])
 @pytest.mark.parametrize("low_latency", [1, 0])
 @pytest.mark.parametrize("combined_mac_pcs", [1, 0])
@@ -1004,7 +1011,7 @@ def test_taxi_eth_mac_25g_us(request, data_w, combined_mac_pcs, low_latency, dic
         os.path.join(rtl_dir, "us", f"{dut}.f"),
     ]
 
-    verilog_sources = process_f_files(verilog_sources)
+    verilog_sources = taxi_tb.filelist.process_f_files(verilog_sources)
 
     parameters = {}
 
@@ -1047,7 +1054,7 @@ def test_taxi_eth_mac_25g_us(request, data_w, combined_mac_pcs, low_latency, dic
     sim_build = os.path.join(tests_dir, "sim_build",
         request.node.name.replace('[', '-').replace(']', ''))
 
-    cocotb_test.simulator.run(
+    taxi_tb.sim.run(
         simulator="verilator",
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
@@ -12,12 +12,11 @@ Authors:
 import logging
 import os
 import struct
+import sys
 
 from scapy.layers.l2 import Ether
 from scapy.utils import mac2str
 
-import cocotb_test.simulator
-
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import RisingEdge
@@ -26,6 +25,18 @@ from cocotb.utils import get_sim_time
 
 from cocotbext.axi.stream import define_stream
 
+try:
+    import taxi_tb.filelist
+    import taxi_tb.sim
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.filelist
+        import taxi_tb.sim
+    finally:
+        del sys.path[0]
+
 
 McfBus, McfTransaction, McfSource, McfSink, McfMonitor = define_stream("Mcf",
     signals=["valid", "eth_dst", "eth_src", "eth_type", "opcode", "params"],
@@ -380,19 +391,6 @@ lib_dir = os.path.abspath(os.path.join(tests_dir, '..', '..', 'lib'))
 taxi_src_dir = os.path.abspath(os.path.join(lib_dir, 'taxi', 'src'))
 
 
-def process_f_files(files):
-    lst = {}
-    for f in files:
-        if f[-2:].lower() == '.f':
-            with open(f, 'r') as fp:
-                l = fp.read().split()
-            for f in process_f_files([os.path.join(os.path.dirname(f), x) for x in l]):
-                lst[os.path.basename(f)] = f
-        else:
-            lst[os.path.basename(f)] = f
-    return list(lst.values())
-
-
 def test_taxi_mac_pause_ctrl_rx(request):
     dut = "taxi_mac_pause_ctrl_rx"
     module = os.path.splitext(os.path.basename(__file__))[0]
@@ -402,7 +400,7 @@ def test_taxi_mac_pause_ctrl_rx(request):
         os.path.join(rtl_dir, f"{dut}.sv"),
     ]
 
-    verilog_sources = process_f_files(verilog_sources)
+    verilog_sources = taxi_tb.filelist.process_f_files(verilog_sources)
 
     parameters = {}
 
@@ -414,7 +412,7 @@ def test_taxi_mac_pause_ctrl_rx(request):
     sim_build = os.path.join(tests_dir, "sim_build",
         request.node.name.replace('[', '-').replace(']', ''))
 
-    cocotb_test.simulator.run(
+    taxi_tb.sim.run(
         simulator="verilator",
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
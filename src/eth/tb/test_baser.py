@@ -0,0 +1,797 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import itertools
+import logging
+import os
+import random
+import sys
+
+import pytest
+
+from cocotb.triggers import RisingEdge, ReadOnly, Timer, Event
+from cocotb.utils import get_sim_steps, get_time_from_sim_steps
+from cocotbext.eth import XgmiiFrame
+from cocotbext.eth.constants import EthPre, XgmiiCtrl, BaseRSync, BaseRBlockType
+
+try:
+    from baser import BaseRSerdesSource, BaseRSerdesSink, BaseRSerdesLaneGroup
+    from baser import CompactXgmiiFrame, encode_block
+    from baser import scramble, descramble, scramble_bitwise, descramble_bitwise
+    from baser import reverse_bits, reverse_bits_bitwise, reverse_hdr
+    from baser import prbs31, prbs31_check
+    from baser import PcapWriter, read_pcap
+except ImportError:
+    # attempt import from current directory
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+    try:
+        from baser import BaseRSerdesSource, BaseRSerdesSink, BaseRSerdesLaneGroup
+        from baser import CompactXgmiiFrame, encode_block
+        from baser import scramble, descramble, scramble_bitwise, descramble_bitwise
+        from baser import reverse_bits, reverse_bits_bitwise, reverse_hdr
+        from baser import prbs31, prbs31_check
+        from baser import PcapWriter, read_pcap
+    finally:
+        del sys.path[0]
+
+try:
+    import taxi_tb.loopback
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.loopback
+    finally:
+        del sys.path[0]
+
+
+async def run_test_loopback(sim, width=64, scramble=True, reverse=False, payload_lengths=None, payload_data=None, ifg=12,
+        bitwise_scrambler=(False, False)):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    data = sim.signal("serdes_data", width)
+    data_valid = sim.signal("serdes_data_valid")
+    hdr = sim.signal("serdes_hdr", 2)
+    hdr_valid = sim.signal("serdes_hdr_valid")
+
+    source = BaseRSerdesSource(data=data, data_valid=data_valid, hdr=hdr, hdr_valid=hdr_valid,
+        clock=clk, scramble=scramble, reverse=reverse)
+    sink = BaseRSerdesSink(data=data, data_valid=data_valid, hdr=hdr, hdr_valid=hdr_valid,
+        clock=clk, scramble=scramble, reverse=reverse)
+
+    source.ifg = ifg
+    source.bitwise_scrambler, sink.bitwise_scrambler = bitwise_scrambler
+
+    test_frames = [payload_data(x) for x in payload_lengths()]
+
+    for test_data in test_frames:
+        await source.send(XgmiiFrame.from_payload(test_data))
+
+    for test_data in test_frames:
+        rx_frame = await sink.recv()
+
+        assert rx_frame.get_payload() == test_data
+        assert rx_frame.check_fcs()
+
+    assert sink.empty()
+
+
+async def run_test_tx_timestamps(sim, width=64, ifg=12, force_offset_start=False):
+
+    period = 6.4 if width == 64 else 3.2
+
+    clk = sim.signal("clk")
+    sim.clock(clk, period, "ns")
+
+    data = sim.signal("serdes_data", width)
+    hdr = sim.signal("serdes_hdr", 2)
+
+    source = BaseRSerdesSource(data=data, hdr=hdr, clock=clk)
+
+    source.ifg = ifg
+    source.force_offset_start = force_offset_start
+
+    # one 66-bit block every 64/width cycles
+    block_time = get_sim_steps(period, "ns") * 64 // width
+
+    tx_frames = []
+
+    for k in range(60, 80):
+        await source.send(XgmiiFrame.from_payload(incrementing_payload(k), tx_complete=tx_frames.append))
+
+    while len(tx_frames) < 20:
+        await RisingEdge(clk)
+
+    last_end = None
+
+    for frame in tx_frames:
+        # frame data is left as sent, /T/ follows the last byte
+        assert frame.data[0] == EthPre.PRE
+        blocks = (frame.start_lane + len(frame.data)+8) // 8
+
+        # SFD is in lane 7 of the start block, or in the next block for an offset start
+        if frame.start_lane == 0:
+            assert frame.sim_time_sfd == frame.sim_time_start
+        else:
+            assert frame.sim_time_sfd == frame.sim_time_start + block_time
+        assert frame.sim_time_end == frame.sim_time_start + (blocks-1)*block_time
+
+        if last_end is not None:
+            assert frame.sim_time_start > last_end
+        last_end = frame.sim_time_end
+
+    if force_offset_start:
+        assert all(frame.start_lane == 4 for frame in tx_frames)
+
+
+class LogCapture(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+async def run_test_deferred_decode(sim, width=64, capture_buffer_size=16):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    data = sim.signal("serdes_data", width)
+    hdr = sim.signal("serdes_hdr", 2)
+    hdr_valid = sim.signal("serdes_hdr_valid")
+
+    source = BaseRSerdesSource(data=data, hdr=hdr, hdr_valid=hdr_valid, clock=clk)
+
+    # inline and deferred sinks on the same signals
+    sinks = []
+    for deferred in [False, True]:
+        sink = BaseRSerdesSink(data=data, hdr=hdr, hdr_valid=hdr_valid, clock=clk)
+        sink.deferred_decode = deferred
+        sink.capture_buffer_size = capture_buffer_size
+        sink.log = logging.getLogger(f"cocotb.serdes_data.{'deferred' if deferred else 'inline'}")
+        sink.log_capture = LogCapture()
+        sink.log.addHandler(sink.log_capture)
+        sinks.append(sink)
+
+    test_frames = [incrementing_payload(x) for x in list(range(60, 80)) + [512]]
+
+    for test_data in test_frames:
+        await source.send(XgmiiFrame.from_payload(test_data))
+
+    for test_data in test_frames:
+        for sink in sinks:
+            rx_frame = await sink.recv()
+
+            assert rx_frame.get_payload() == test_data
+            assert rx_frame.check_fcs()
+
+    # slip the source to generate decode errors, then realign
+    source.bit_offset = 13
+    for test_data in test_frames:
+        await source.send(XgmiiFrame.from_payload(test_data))
+    await source.wait()
+    await Timer(1, 'us')
+    source.bit_offset = 0
+    for test_data in test_frames:
+        await source.send(XgmiiFrame.from_payload(test_data))
+    await Timer(20, 'us')
+
+    rx_frames = []
+    for sink in sinks:
+        lst = []
+        while not sink.empty():
+            rx_frame = sink.recv_nowait(compact=False)
+            lst.append((rx_frame.data, rx_frame.ctrl, rx_frame.start_lane,
+                rx_frame.sim_time_start, rx_frame.sim_time_sfd, rx_frame.sim_time_end))
+        rx_frames.append(lst)
+
+        sink.log.removeHandler(sink.log_capture)
+
+    assert sinks[0].log_capture.messages
+    assert sinks[0].log_capture.messages == sinks[1].log_capture.messages
+    assert rx_frames[0] == rx_frames[1]
+
+
+async def run_test_lane_group(sim, width=64, lane_count=4, group=True):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    sources = []
+    sinks = []
+
+    for k in range(lane_count):
+        data = sim.signal(f"serdes_data_{k}", width)
+        hdr = sim.signal(f"serdes_hdr_{k}", 2)
+        hdr_valid = sim.signal(f"serdes_hdr_valid_{k}")
+
+        sources.append(BaseRSerdesSource(data=data, hdr=hdr, hdr_valid=hdr_valid, clock=clk))
+        sinks.append(BaseRSerdesSink(data=data, hdr=hdr, hdr_valid=hdr_valid, clock=clk))
+
+    if group:
+        lane_group = BaseRSerdesLaneGroup(clk, sources+sinks)
+        assert len(lane_group.lanes) == lane_count*2
+        assert all(lane._run_cr is None for lane in lane_group.lanes)
+
+    for k, source in enumerate(sources):
+        source.ifg = 12 - k
+        for length in range(60, 80):
+            await source.send(XgmiiFrame.from_payload(incrementing_payload(length+k)))
+
+    rx_frames = []
+
+    for k, sink in enumerate(sinks):
+        for length in range(60, 80):
+            rx_frame = await sink.recv()
+
+            assert rx_frame.get_payload() == incrementing_payload(length+k)
+            assert rx_frame.check_fcs()
+
+            rx_frames.append((k, rx_frame.start_lane, rx_frame.sim_time_start,
+                rx_frame.sim_time_sfd, rx_frame.sim_time_end))
+
+    if group:
+        # hand a lane back to its own clock coroutine
+        lane_group.remove_lane(sources[0])
+        lane_group.remove_lane(sinks[0])
+        assert len(lane_group.lanes) == lane_count*2-2
+
+        await sources[0].send(XgmiiFrame.from_payload(incrementing_payload(60)))
+        rx_frame = await sinks[0].recv()
+        assert rx_frame.get_payload() == incrementing_payload(60)
+
+    return rx_frames
+
+
+async def run_test_prbs31(sim, width=64, reverse=False, gbx_cfg=None):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    data = sim.signal("serdes_data", width)
+    data_valid = sim.signal("serdes_data_valid")
+    hdr = sim.signal("serdes_hdr", 2)
+    hdr_valid = sim.signal("serdes_hdr_valid")
+
+    source = BaseRSerdesSource(data=data, data_valid=data_valid, hdr=hdr, hdr_valid=hdr_valid,
+        clock=clk, reverse=reverse, gbx_cfg=gbx_cfg)
+    sink = BaseRSerdesSink(data=data, data_valid=data_valid, hdr=hdr, hdr_valid=hdr_valid,
+        clock=clk, reverse=reverse, gbx_cfg=gbx_cfg)
+
+    source.prbs31_enable = True
+    sink.prbs31_enable = True
+
+    for k in range(2000):
+        await RisingEdge(clk)
+
+    assert sink.prbs31_bit_cnt > 1000*(width+2)
+    assert sink.prbs31_err_cnt == 0
+    assert sink.prbs31_word_err_cnt == 0
+
+    # single bit error on the line
+    source.prbs31_error_inject = 1 << 7
+
+    for k in range(100):
+        await RisingEdge(clk)
+
+    assert sink.prbs31_err_cnt == 3
+    assert 1 <= sink.prbs31_word_err_cnt <= 3
+
+    # back to frames, after idles to resync the descrambler
+    source.prbs31_enable = False
+    sink.prbs31_enable = False
+
+    await Timer(100, 'ns')
+
+    test_frames = [incrementing_payload(x) for x in range(60, 70)]
+
+    for test_data in test_frames:
+        await source.send(XgmiiFrame.from_payload(test_data))
+
+    for test_data in test_frames:
+        rx_frame = await sink.recv()
+
+        assert rx_frame.get_payload() == test_data
+        assert rx_frame.check_fcs()
+
+
+async def run_test_pcap(sim, fn, width=64, queue_limit=-1, max_pending=4096, policy="block"):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    data = sim.signal("serdes_data", width)
+    hdr = sim.signal("serdes_hdr", 2)
+    hdr_valid = sim.signal("serdes_hdr_valid")
+
+    source = BaseRSerdesSource(data=data, hdr=hdr, hdr_valid=hdr_valid, clock=clk)
+    sink = BaseRSerdesSink(data=data, hdr=hdr, hdr_valid=hdr_valid, clock=clk)
+
+    sink.queue_occupancy_limit_frames = queue_limit
+    sink.open_pcap(fn, max_pending=max_pending, policy=policy)
+
+    test_frames = [incrementing_payload(x) for x in size_list()]
+    tx_frames = []
+    tx_done = Event()
+
+    def tx_complete(frame):
+        tx_frames.append(frame)
+        if len(tx_frames) == len(test_frames):
+            tx_done.set()
+
+    for test_data in test_frames:
+        await source.send(XgmiiFrame.from_payload(test_data, tx_complete=tx_complete))
+
+    await tx_done.wait()
+    await Timer(1, 'us')
+
+    rx_frames = []
+    while not sink.empty():
+        rx_frames.append(sink.recv_nowait())
+
+    writer = sink.pcap_writer
+    sink.close_pcap()
+
+    if queue_limit > 0:
+        assert len(rx_frames) == queue_limit
+        assert sink.queue_dropped_frames == len(test_frames) - queue_limit
+    else:
+        assert len(rx_frames) == len(test_frames)
+        assert sink.queue_dropped_frames == 0
+
+    pcap_frames = read_pcap(fn)
+
+    assert writer.frames + writer.dropped == len(test_frames)
+    assert len(pcap_frames) == writer.frames
+
+    if policy == "block":
+        for test_data, (ts, pkt) in zip(test_frames, pcap_frames):
+            assert pkt[:-4] == test_data
+            assert XgmiiFrame.from_payload(pkt[:-4]).get_payload(strip_fcs=False) == pkt
+
+        for rx_frame, (ts, pkt) in zip(rx_frames, pcap_frames):
+            assert ts == round(get_time_from_sim_steps(rx_frame.sim_time_sfd, 'ns'))
+            assert rx_frame.get_payload() == pkt[:-4]
+
+
+async def run_test_pcap_errors(sim, fn, width=64, deferred=False):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    data = sim.signal("serdes_data", width)
+    hdr = sim.signal("serdes_hdr", 2)
+    hdr_valid = sim.signal("serdes_hdr_valid")
+
+    source = BaseRSerdesSource(data=data, hdr=hdr, hdr_valid=hdr_valid, clock=clk)
+    sink = BaseRSerdesSink(data=data, hdr=hdr, hdr_valid=hdr_valid, clock=clk)
+
+    sink.deferred_decode = deferred
+    sink.open_pcap(fn)
+
+    test_data = incrementing_payload(64)
+    good_frame = XgmiiFrame.from_payload(test_data)
+
+    # start block with a corrupted SFD
+    bad_frame = XgmiiFrame(good_frame.data)
+    bad_frame.data[7] = 0x00
+
+    for frame in [good_frame, bad_frame, good_frame]:
+        await source.send(XgmiiFrame(frame.data))
+    await source.wait()
+    await Timer(1, 'us')
+
+    rx_frames = []
+    while not sink.empty():
+        rx_frames.append(sink.recv_nowait())
+
+    sink.close_pcap()
+
+    assert len(rx_frames) == 3
+    assert rx_frames[0].get_payload() == test_data
+    assert rx_frames[1].data == bad_frame.data
+    assert rx_frames[2].get_payload() == test_data
+
+    pcap_frames = read_pcap(fn)
+
+    assert [pkt for ts, pkt in pcap_frames] == [
+        good_frame.get_payload(strip_fcs=False),
+        bytes(bad_frame.data[1:]),
+        good_frame.get_payload(strip_fcs=False),
+    ]
+
+
+async def run_test_idle(sim, width=64, reverse=False):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    data = sim.signal("serdes_data", width)
+    data_valid = sim.signal("serdes_data_valid")
+    hdr = sim.signal("serdes_hdr", 2)
+    hdr_valid = sim.signal("serdes_hdr_valid")
+
+    source = BaseRSerdesSource(data=data, data_valid=data_valid, hdr=hdr, hdr_valid=hdr_valid,
+        clock=clk, reverse=reverse)
+    sink = BaseRSerdesSink(data=data, data_valid=data_valid, hdr=hdr, hdr_valid=hdr_valid,
+        clock=clk, reverse=reverse)
+
+    # idle blocks, scrambled
+    await RisingEdge(clk)
+    await RisingEdge(clk)
+
+    state = 0
+    blocks = []
+    for k in range(200):
+        block, state = scramble(BaseRBlockType.CTRL, state)
+        blocks.append(block)
+
+    index = None
+    for k in range(100*64 // width):
+        await RisingEdge(clk)
+        await ReadOnly()
+
+        assert source.idle()
+
+        d = data.value
+        h = hdr.value
+        if reverse:
+            d = reverse_bits(d, width)
+            h = reverse_hdr(h)
+
+        assert data_valid.value
+        if hdr_valid.value:
+            assert h == BaseRSync.CTRL
+            block = d
+            lanes = 1
+        else:
+            block |= d << width*lanes
+            lanes += 1
+
+        if lanes*width == 64:
+            # consecutive blocks of the scrambled idle sequence
+            if index is None:
+                index = blocks.index(block)
+            else:
+                index += 1
+                assert block == blocks[index]
+
+    # frames after a long idle period
+    test_frames = [incrementing_payload(x) for x in range(60, 64)]
+
+    for test_data in test_frames:
+        await source.send(XgmiiFrame.from_payload(test_data))
+
+    for test_data in test_frames:
+        rx_frame = await sink.recv()
+
+        assert rx_frame.get_payload() == test_data
+        assert rx_frame.check_fcs()
+
+
+async def run_test_gearbox(sim, width=64, gbx_cfg=(66, [64, 65]), gbx_cfg_2=None, ext_sync=False):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 6.4 if width == 64 else 3.2, "ns")
+
+    rx_gbx_sync = sim.signal("rx_gbx_sync")
+
+    # two loopbacks, driven identically, one using the per-cycle reference
+    # gearbox computation and the other replaying the schedule table
+    lanes = []
+    for ref in [True, False]:
+        sigs = dict(
+            data=sim.signal("serdes_data", width),
+            data_valid=sim.signal("serdes_data_valid"),
+            hdr=sim.signal("serdes_hdr", 2),
+            hdr_valid=sim.signal("serdes_hdr_valid"),
+            gbx_sync=sim.signal("serdes_gbx_sync"),
+            gbx_req_sync=sim.signal("serdes_gbx_req_sync"),
+            gbx_req_stall=sim.signal("serdes_gbx_req_stall"),
+        )
+
+        source = BaseRSerdesSource(data=sigs['data'], data_valid=sigs['data_valid'], hdr=sigs['hdr'],
+            hdr_valid=sigs['hdr_valid'], gbx_sync=sigs['gbx_sync'], clock=clk, gbx_cfg=gbx_cfg)
+        sink = BaseRSerdesSink(data=sigs['data'], data_valid=sigs['data_valid'], hdr=sigs['hdr'],
+            hdr_valid=sigs['hdr_valid'], gbx_sync=rx_gbx_sync if ext_sync else sigs['gbx_sync'],
+            gbx_req_sync=sigs['gbx_req_sync'], gbx_req_stall=sigs['gbx_req_stall'], clock=clk, gbx_cfg=gbx_cfg)
+
+        source.gbx_reference = ref
+        sink.gbx_reference = ref
+
+        lanes.append((source, sink, list(sigs.values()), []))
+
+    assert lanes[1][0].get_gbx_cfg() == (gbx_cfg[0], sorted(gbx_cfg[1]))
+    assert lanes[1][1].get_gbx_cfg() == (gbx_cfg[0], sorted(gbx_cfg[1]))
+
+    rng = random.Random(1)
+
+    for k in range(3000):
+        await RisingEdge(clk)
+
+        if rng.random() < 0.03:
+            payload = bytes(rng.getrandbits(8) for k in range(rng.randint(1, 120)))
+            for source, sink, sigs, tx_frames in lanes:
+                source.send_nowait(XgmiiFrame.from_payload(payload, tx_complete=tx_frames.append))
+
+        if ext_sync:
+            rx_gbx_sync.value = rng.random() < 0.05
+
+        # change configuration at runtime
+        if k == 1000:
+            for source, sink, sigs, tx_frames in lanes:
+                if gbx_cfg_2:
+                    source.set_gbx_cfg(*gbx_cfg_2)
+                    sink.set_gbx_cfg(*gbx_cfg_2)
+                else:
+                    source.set_gbx_cfg()
+                    sink.set_gbx_cfg()
+            if not gbx_cfg_2:
+                assert lanes[1][0].get_gbx_cfg() is None
+                assert lanes[1][1].get_gbx_cfg() is None
+        if k == 2000:
+            for source, sink, sigs, tx_frames in lanes:
+                source.set_gbx_cfg(*gbx_cfg)
+                sink.set_gbx_cfg(*gbx_cfg)
+
+        await ReadOnly()
+
+        ref, dut = lanes
+        assert [s.value for s in dut[2]] == [s.value for s in ref[2]]
+        assert (dut[0].gbx_seq, dut[0].gbx_bit_cnt) == (ref[0].gbx_seq, ref[0].gbx_bit_cnt)
+        assert (dut[1].gbx_seq, dut[1].gbx_seq_gen, dut[1].gbx_bit_cnt) == \
+            (ref[1].gbx_seq, ref[1].gbx_seq_gen, ref[1].gbx_bit_cnt)
+
+    ref, dut = lanes
+
+    # identical timestamps on both sides
+    assert len(dut[3]) == len(ref[3]) > 50
+    for ref_frame, dut_frame in zip(ref[3], dut[3]):
+        assert dut_frame.sim_time_start == ref_frame.sim_time_start
+        assert dut_frame.sim_time_sfd == ref_frame.sim_time_sfd
+        assert dut_frame.sim_time_end == ref_frame.sim_time_end
+
+    assert dut[1].count() == ref[1].count() > 0
+    while not ref[1].empty():
+        ref_frame = ref[1].recv_nowait()
+        dut_frame = dut[1].recv_nowait()
+        assert dut_frame.data == ref_frame.data
+        assert dut_frame.sim_time_start == ref_frame.sim_time_start
+        assert dut_frame.sim_time_sfd == ref_frame.sim_time_sfd
+        assert dut_frame.sim_time_end == ref_frame.sim_time_end
+
+
+def size_list():
+    return list(range(60, 128)) + [512, 1514, 9214] + [60]*10
+
+
+def incrementing_payload(length):
+    return bytearray(itertools.islice(itertools.cycle(range(256)), length))
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize("scramble", [True, False])
+@pytest.mark.parametrize("ifg", [12, 0])
+@pytest.mark.parametrize("width", [32, 64])
+def test_baser_loopback(width, ifg, scramble, reverse):
+    taxi_tb.loopback.run(run_test_loopback, width=width, scramble=scramble, reverse=reverse,
+        payload_lengths=size_list, payload_data=incrementing_payload, ifg=ifg,
+        timeout=100, timeout_unit="us")
+
+
+@pytest.mark.parametrize("bitwise_scrambler", [(True, False), (False, True)])
+def test_baser_loopback_bitwise_scrambler(bitwise_scrambler):
+    taxi_tb.loopback.run(run_test_loopback, payload_lengths=size_list, payload_data=incrementing_payload,
+        bitwise_scrambler=bitwise_scrambler, timeout=100, timeout_unit="us")
+
+
+@pytest.mark.parametrize("force_offset_start", [False, True])
+@pytest.mark.parametrize("ifg", [12, 0])
+@pytest.mark.parametrize("width", [32, 64])
+def test_baser_tx_timestamps(width, ifg, force_offset_start):
+    taxi_tb.loopback.run(run_test_tx_timestamps, width=width, ifg=ifg, force_offset_start=force_offset_start,
+        timeout=100, timeout_unit="us")
+
+
+@pytest.mark.parametrize("capture_buffer_size", [1, 16, 4096])
+@pytest.mark.parametrize("width", [32, 64])
+def test_baser_deferred_decode(width, capture_buffer_size):
+    taxi_tb.loopback.run(run_test_deferred_decode, width=width, capture_buffer_size=capture_buffer_size,
+        timeout=200, timeout_unit="us")
+
+
+@pytest.mark.parametrize("width", [32, 64])
+def test_baser_lane_group(width):
+    ref = taxi_tb.loopback.run(run_test_lane_group, width=width, group=False, timeout=100, timeout_unit="us")
+    rx_frames = taxi_tb.loopback.run(run_test_lane_group, width=width, group=True, timeout=100, timeout_unit="us")
+
+    # same cycle-level behavior as separate coroutines
+    assert rx_frames == ref
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize("width", [32, 64])
+def test_baser_prbs31(width, reverse):
+    taxi_tb.loopback.run(run_test_prbs31, width=width, reverse=reverse, timeout=100, timeout_unit="us")
+
+
+def prbs31_bitwise(state, n):
+    # bit-serial Fibonacci LFSR, newest bit in bit 0 of the register
+    lfsr = int(f"{state:031b}"[::-1], 2)
+    b = 0
+    for i in range(n):
+        bit = ((lfsr >> 30) ^ (lfsr >> 27)) & 1
+        b |= bit << i
+        lfsr = ((lfsr << 1) | bit) & 0x7fffffff
+    return b, int(f"{lfsr:031b}"[::-1], 2)
+
+
+@pytest.mark.parametrize("n", [10, 18, 34, 66])
+def test_prbs31(n):
+    state = ref_state = check_state = 0x7fffffff
+
+    for k in range(1000):
+        ref, ref_state = prbs31_bitwise(ref_state, n)
+        data, state = prbs31(state, n)
+
+        assert data == ref
+        assert state == ref_state
+
+        err, check_state = prbs31_check(data, check_state, n)
+        assert err == 0
+        assert check_state == state
+
+    # self-synchronizing, one bit error gives three error bits
+    rng = random.Random(n)
+    check_state = rng.getrandbits(31)
+    err_cnt = 0
+    for k in range(200):
+        data, state = prbs31(state, n)
+        if k == 100:
+            data ^= 1 << (n // 2)
+        err, check_state = prbs31_check(data, check_state, n)
+        if k*n >= 31:
+            err_cnt += bin(err).count('1')
+
+    assert err_cnt == 3
+
+
+@pytest.mark.parametrize("queue_limit", [-1, 10])
+@pytest.mark.parametrize("width", [32, 64])
+def test_baser_pcap(tmp_path, width, queue_limit):
+    taxi_tb.loopback.run(run_test_pcap, str(tmp_path / "rx.pcap"), width=width, queue_limit=queue_limit,
+        timeout=200, timeout_unit="us")
+
+
+def test_baser_pcap_drop(tmp_path):
+    taxi_tb.loopback.run(run_test_pcap, str(tmp_path / "rx.pcap"), max_pending=1, policy="drop",
+        timeout=200, timeout_unit="us")
+
+
+@pytest.mark.parametrize("deferred", [False, True])
+def test_baser_pcap_errors(tmp_path, deferred):
+    taxi_tb.loopback.run(run_test_pcap_errors, str(tmp_path / "rx.pcap"), deferred=deferred,
+        timeout=100, timeout_unit="us")
+
+
+def test_pcap(tmp_path):
+    fn = str(tmp_path / "test.pcap")
+    rng = random.Random(1)
+
+    frames = []
+    t = 0
+    for k in range(1000):
+        t += rng.randrange(1, 10**10)
+        frames.append((t, bytes(rng.getrandbits(8) for x in range(rng.randrange(14, 100)))))
+
+    writer = PcapWriter(fn, max_pending=16)
+    for ts, data in frames:
+        writer.write(data, ts)
+    writer.close()
+
+    assert read_pcap(fn) == frames
+
+
+@pytest.mark.parametrize("reverse", [False, True])
+@pytest.mark.parametrize("width", [32, 64])
+def test_baser_idle(width, reverse):
+    taxi_tb.loopback.run(run_test_idle, width=width, reverse=reverse, timeout=100, timeout_unit="us")
+
+
+@pytest.mark.parametrize("gbx_cfg,gbx_cfg_2,ext_sync", [
+    ((66, [64, 65]), (33, [32]), False),
+    ((66, [0, 1]), None, True),
+    ((132, [0, 33, 66, 99]), (66, [64, 65]), True),
+])
+@pytest.mark.parametrize("width", [32, 64])
+def test_baser_gearbox(width, gbx_cfg, gbx_cfg_2, ext_sync):
+    taxi_tb.loopback.run(run_test_gearbox, width=width, gbx_cfg=gbx_cfg, gbx_cfg_2=gbx_cfg_2,
+        ext_sync=ext_sync, timeout=100, timeout_unit="us")
+
+
+def test_compact_xgmii_frame():
+    rng = random.Random(1)
+
+    for k in range(500):
+        frame = XgmiiFrame.from_payload(bytes(rng.getrandbits(8) for k in range(rng.randint(0, 100))))
+        if k % 4 == 0:
+            # control characters, with a short ctrl list
+            frame.ctrl = [0] + [int(rng.random() < 0.1) for k in range(rng.randint(0, len(frame.data)))]
+            for i, c in enumerate(frame.ctrl[:len(frame.data)]):
+                if c and i > 7:
+                    frame.data[i] = rng.choice([XgmiiCtrl.ERROR, XgmiiCtrl.SEQ_OS])
+        start_lane = rng.choice([0, 4])
+
+        cf = CompactXgmiiFrame.from_frame(frame, start_lane)
+
+        # reference: lanes with idles, /S/, and /T/ in place, encoded block by block
+        normalized = XgmiiFrame(frame)
+        normalized.normalize()
+        dl = bytearray([XgmiiCtrl.IDLE]*start_lane + [XgmiiCtrl.START]) + normalized.data[1:]
+        cl = [1]*(start_lane+1) + normalized.ctrl[1:]
+        dl.append(XgmiiCtrl.TERM)
+        cl.append(1)
+        dl += bytearray([XgmiiCtrl.IDLE]*(-len(dl) % 8))
+        cl += [1]*(-len(cl) % 8)
+
+        assert cf.encode() == [encode_block(dl[i:i+8], cl[i:i+8]) for i in range(0, len(dl), 8)]
+
+        # conversion to XgmiiFrame
+        rx_frame = cf.to_frame()
+        assert rx_frame.data == frame.data
+        assert rx_frame.start_lane == start_lane
+        if any(normalized.ctrl):
+            assert rx_frame.ctrl == normalized.ctrl
+        else:
+            assert rx_frame.ctrl is None
+        assert cf.get_payload() == frame.get_payload()
+        assert len(cf) == len(frame)
+
+
+def test_scrambler():
+    rng = random.Random(1)
+
+    tx_state = tx_ref_state = 0
+    rx_state = rx_ref_state = rng.getrandbits(58)
+
+    for k in range(2000):
+        data = rng.choice([0, 2**64-1, 0x1e, rng.getrandbits(64)])
+
+        ref, tx_ref_state = scramble_bitwise(data, tx_ref_state)
+        out, tx_state = scramble(data, tx_state)
+
+        assert out == ref
+        assert tx_state == tx_ref_state
+
+        ref, rx_ref_state = descramble_bitwise(out, rx_ref_state)
+        out, rx_state = descramble(out, rx_state)
+
+        assert out == ref
+        assert rx_state == rx_ref_state
+
+        # self-synchronizing, descrambler locks after one block
+        if k > 0:
+            assert out == data
+
+
+@pytest.mark.parametrize("width", [8, 16, 32, 64])
+def test_reverse_bits(width):
+    rng = random.Random(width)
+
+    for data in [0, 1, 2**width-1, 2**(width-1)] + [rng.getrandbits(width) for k in range(1000)]:
+        assert reverse_bits(data, width) == reverse_bits_bitwise(data, width)
+
+    for hdr in range(4):
+        assert reverse_hdr(hdr) == reverse_bits_bitwise(hdr, 2)
@@ -11,14 +11,17 @@ Authors:
 
 import logging
 import mmap
-import struct
+import sys
+from array import array
+from collections import deque
 
 import cocotb
 from cocotb.queue import Queue, QueueFull
-from cocotb.triggers import RisingEdge, Timer, First, Event
+from cocotb.triggers import RisingEdge, Timer, First, Event, Lock
 from cocotb_bus.bus import Bus
 
 from cocotbext.pcie.core import Device
+from cocotbext.pcie.core.dllp import FcType
 from cocotbext.pcie.core.utils import PcieId
 from cocotbext.pcie.core.tlp import Tlp, TlpType, CplStatus
 from cocotbext.pcie.core.caps import MsiCapability, MsixCapability
@@ -88,8 +91,49 @@ def parity(d):
     return p
 
 
+# byte parity lookup tables: parity as '0'/'1' characters, and parity (or
+# inverted parity) placed at bit k for byte lane k of a dword
+_parity_chars = bytes(ord('0') + (bin(k).count('1') & 1) for k in range(256))
+_parity_lanes = [bytes((bin(k).count('1') & 1) << lane for k in range(256)) for lane in range(4)]
+_parity_lanes_odd = [bytes((~bin(k).count('1') & 1) << lane for k in range(256)) for lane in range(4)]
+
+
+def dword_parity_bulk(data, odd=False):
+    # dword_parity() of each little endian dword in data, inverted if odd is
+    # set; one table lookup pass per byte lane instead of one call per dword
+    tables = _parity_lanes_odd if odd else _parity_lanes
+    data = bytes(data)
+    p = 0
+    for k in range(4):
+        p |= int.from_bytes(data[k::4].translate(tables[k]), 'little')
+    return list(p.to_bytes(len(data) // 4, 'little'))
+
+
+def parity_bulk(d):
+    # parity() with a table lookup over the bytes of d
+    b = d.to_bytes((d.bit_length()+7) // 8, 'little')
+    return int(b.translate(_parity_chars)[::-1] or b'0', 2)
+
+
+# low and high nibble of each byte, for unpacking parity nibbles
+_nibble_lo = bytes(k & 0xf for k in range(256))
+_nibble_hi = bytes(k >> 4 for k in range(256))
+
+
+def dword_array(data=None):
+    # payload dwords as an array of 32-bit values, from dwords or from
+    # little endian bytes
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        a = array('I')
+        a.frombytes(data)
+        if sys.byteorder == 'big':
+            a.byteswap()
+        return a
+    return array('I', data or [])
+
+
 class PcieIfFrame:
-    def __init__(self, frame=None):
+    def __init__(self, frame=None, tx_complete=None):
         self.tlp_prfx = 0
         self.hdr = 0
         self.data = []
@@ -102,11 +146,12 @@ class PcieIfFrame:
         self.tlp_abort = 0
         self.error = 0
         self.seq = 0
+        self.tx_complete = None
 
         if isinstance(frame, PcieIfFrame):
             self.tlp_prfx = frame.tlp_prfx
             self.hdr = frame.hdr
-            self.data = list(frame.data)
+            self.data = array('I', frame.data)
             self.tlp_prfx_par = frame.tlp_prfx_par
             self.hdr_par = frame.hdr_par
             self.parity = list(frame.parity)
@@ -116,6 +161,10 @@ class PcieIfFrame:
             self.tlp_abort = frame.tlp_abort
             self.error = frame.error
             self.seq = frame.seq
+            self.tx_complete = frame.tx_complete
+
+        if tx_complete is not None:
+            self.tx_complete = tx_complete
 
     @classmethod
     def from_tlp(cls, tlp, force_64bit_addr=False):
@@ -133,10 +182,8 @@ class PcieIfFrame:
         frame.hdr = int.from_bytes(hdr.ljust(16, b'\x00'), 'big')
 
         data = tlp.get_data()
-        for k in range(0, len(data), 4):
-            frame.data.extend(struct.unpack_from('<L', data, k))
-
-        frame.update_parity()
+        frame.set_payload(data)
+        frame.update_parity(data)
 
         return frame
 
@@ -148,24 +195,55 @@ class PcieIfFrame:
             hdr = bytes([hdr[0] & 0xdf]) + hdr[1:8] + hdr[12:16]
 
         tlp = Tlp.unpack_header(hdr)
-
-        for dw in self.data:
-            tlp.data.extend(struct.pack('<L', dw))
+        tlp.data = bytearray(self.get_payload())
 
         return tlp
 
-    def update_parity(self):
-        self.parity = [dword_parity(d) ^ 0xf for d in self.data]
-        self.hdr_par = parity(self.hdr)
+    @property
+    def data(self):
+        return self._data
+
+    @data.setter
+    def data(self, data):
+        # payload dwords, stored as array('I'); lists of dwords and little
+        # endian bytes are converted, arrays are used as-is
+        if isinstance(data, array) and data.typecode == 'I':
+            self._data = data
+        else:
+            self._data = dword_array(data)
+
+    def get_payload(self):
+        # payload as little endian bytes
+        if sys.byteorder == 'big':
+            a = array('I', self._data)
+            a.byteswap()
+            return a.tobytes()
+        return self._data.tobytes()
+
+    def set_payload(self, data):
+        self._data = dword_array(data)
+
+    def update_parity(self, payload=None):
+        # payload: packed data, if already at hand
+        if payload is None:
+            payload = self.get_payload()
+        self.parity = dword_parity_bulk(payload, odd=True)
+        self.hdr_par = parity_bulk(self.hdr)
         self.tlp_prfx_par = dword_parity(self.tlp_prfx)
 
     def check_parity(self):
         return (
-            self.parity == [dword_parity(d) ^ 0xf for d in self.data] and
-            self.hdr_par == parity(self.hdr) and
+            self.parity == dword_parity_bulk(self.get_payload(), odd=True) and
+            self.hdr_par == parity_bulk(self.hdr) and
             self.tlp_prfx_par == dword_parity(self.tlp_prfx)
         )
 
+    def handle_tx_complete(self):
+        if isinstance(self.tx_complete, Event):
+            self.tx_complete.set(self)
+        elif callable(self.tx_complete):
+            self.tx_complete(self)
+
     def __eq__(self, other):
         if isinstance(other, PcieIfFrame):
             return (
@@ -215,6 +293,9 @@ class PcieIfTransaction:
             else:
                 setattr(self, sig, 0)
 
+        # frames with their eop in this transaction
+        self.eop_frames = []
+
         super().__init__(*args, **kwargs)
 
     def __repr__(self):
@@ -323,9 +404,13 @@ class PcieIfBase:
 
     def clear(self):
         while not self.queue.empty():
-            self.queue.get_nowait()
+            frame = self.queue.get_nowait()
+            frame.handle_tx_complete()
+        self.dequeue_event.set()
         self.idle_event.set()
         self.active_event.clear()
+        self.queue_occupancy_bytes = 0
+        self.queue_occupancy_frames = 0
 
     def idle(self):
         raise NotImplementedError()
@@ -370,6 +455,13 @@ class PcieIfSource(PcieIfBase):
         self.drive_obj = None
         self.drive_sync = Event()
 
+        # frames taken from the queue and not yet handed to the bus in a
+        # transaction with their eop
+        self.current_frames = []
+
+        # blocked senders, woken one at a time in order
+        self.send_waiters = deque()
+
         self.queue_occupancy_limit_bytes = -1
         self.queue_occupancy_limit_frames = -1
 
@@ -409,7 +501,7 @@ class PcieIfSource(PcieIfBase):
             self.bus.tlp_prfx_par.setimmediatevalue(0)
 
         cocotb.start_soon(self._run_source())
-        cocotb.start_soon(self._run())
+        self._run_cr = cocotb.start_soon(self._run())
 
     async def _drive(self, obj):
         if self.drive_obj is not None:
@@ -419,14 +511,22 @@ class PcieIfSource(PcieIfBase):
         self.drive_obj = obj
 
     async def send(self, frame):
-        while self.full():
-            self.dequeue_event.clear()
-            await self.dequeue_event.wait()
+        if self.full() or self.send_waiters:
+            waiter = Event()
+            self.send_waiters.append(waiter)
+            try:
+                while self.send_waiters[0] is not waiter or self.full():
+                    waiter.clear()
+                    await waiter.wait()
+            finally:
+                self.send_waiters.remove(waiter)
+                self._wake_sender()
         frame = PcieIfFrame(frame)
         await self.queue.put(frame)
         self.idle_event.clear()
         self.queue_occupancy_bytes += len(frame)
         self.queue_occupancy_frames += 1
+        self._wake_sender()
 
     def send_nowait(self, frame):
         if self.full():
@@ -437,6 +537,10 @@ class PcieIfSource(PcieIfBase):
         self.queue_occupancy_bytes += len(frame)
         self.queue_occupancy_frames += 1
 
+    def _wake_sender(self):
+        if self.send_waiters and not self.full():
+            self.send_waiters[0].set()
+
     def full(self):
         if self.queue_occupancy_limit_bytes > 0 and self.queue_occupancy_bytes > self.queue_occupancy_limit_bytes:
             return True
@@ -453,6 +557,7 @@ class PcieIfSource(PcieIfBase):
 
     async def _run_source(self):
         self.active = False
+        current_obj = None
 
         clock_edge_event = RisingEdge(self.clock)
 
@@ -464,13 +569,29 @@ class PcieIfSource(PcieIfBase):
             valid_sample = self.bus.valid.value
 
             if self.reset is not None and self.reset.value:
+                if self._run_cr is not None:
+                    self._run_cr.kill()
+                    self._run_cr = None
+                    self._flush([current_obj, self.drive_obj])
+                    self.drive_obj = None
                 self.active = False
                 self.bus.valid.value = 0
+                current_obj = None
                 continue
 
+            if self._run_cr is None:
+                self._run_cr = cocotb.start_soon(self._run())
+
             if ready_sample or not valid_sample:
+                if current_obj is not None and valid_sample:
+                    # transfer accepted
+                    for frame in current_obj.eop_frames:
+                        frame.handle_tx_complete()
+                current_obj = None
+
                 if self.drive_obj and not self.pause:
                     self.bus.drive(self.drive_obj)
+                    current_obj = self.drive_obj
                     self.drive_obj = None
                     self.drive_sync.set()
                     self.active = True
@@ -480,11 +601,26 @@ class PcieIfSource(PcieIfBase):
                     if not self.drive_obj:
                         self.idle_event.set()
 
+    def _flush(self, objs):
+        # frames dropped on reset still complete, so that anything waiting
+        # on them (such as flow control credits) is released
+        frames = self.current_frames
+        self.current_frames = []
+        for obj in objs:
+            if obj is not None:
+                frames.extend(obj.eop_frames)
+        for frame in frames:
+            self.log.warning("Flushed transmit frame during reset: %s", frame)
+            frame.handle_tx_complete()
+        if self.empty():
+            self.idle_event.set()
+
     async def _run(self):
         while True:
             frame = await self._get_frame()
             frame_offset = 0
-            self.log.info(f"TX frame: {frame}")
+            payload, payload_par = self._pack_frame(frame)
+            self.log.info("TX frame: %s", frame)
             first = True
 
             while frame is not None:
@@ -495,7 +631,8 @@ class PcieIfSource(PcieIfBase):
                         if not self.empty():
                             frame = self._get_frame_nowait()
                             frame_offset = 0
-                            self.log.info(f"TX frame: {frame}")
+                            payload, payload_par = self._pack_frame(frame)
+                            self.log.info("TX frame: %s", frame)
                             first = True
                         else:
                             break
@@ -523,30 +660,45 @@ class PcieIfSource(PcieIfBase):
 
                         cnt = min(self.seg_byte_lanes, len(frame.data)-frame_offset)
                         transaction.empty |= (self.seg_byte_lanes-cnt) << (seg*self.seg_empty_width)
-                        for k in range(cnt):
-                            transaction.data |= frame.data[frame_offset] << 32*(k+seg*self.seg_byte_lanes)
-                            transaction.data_par |= frame.parity[frame_offset] << 4*(k+seg*self.seg_byte_lanes)
-                            frame_offset += 1
+                        transaction.data |= int.from_bytes(payload[frame_offset*4:(frame_offset+cnt)*4],
+                            'little') << seg*self.seg_width
+                        transaction.data_par |= ((payload_par >> frame_offset*4) & ((1 << cnt*4)-1)) \
+                            << seg*self.seg_par_width
+                        frame_offset += cnt
 
                     if frame_offset >= len(frame.data):
                         transaction.eop |= 1 << seg
+                        transaction.eop_frames.append(frame)
 
                         frame = None
 
                 await self._drive(transaction)
+                for sent in transaction.eop_frames:
+                    self.current_frames.remove(sent)
+
+    def _pack_frame(self, frame):
+        # payload as little endian bytes and parity nibbles as one integer,
+        # so that each segment is a single slice
+        par = frame.parity
+        par = int.from_bytes(bytes(par[0::2]), 'little') | int.from_bytes(bytes(par[1::2]), 'little') << 4
+        return frame.get_payload(), par
 
     async def _get_frame(self):
         frame = await self.queue.get()
+        self.current_frames.append(frame)
         self.dequeue_event.set()
         self.queue_occupancy_bytes -= len(frame)
         self.queue_occupancy_frames -= 1
+        self._wake_sender()
         return frame
 
     def _get_frame_nowait(self):
         frame = self.queue.get_nowait()
+        self.current_frames.append(frame)
         self.dequeue_event.set()
         self.queue_occupancy_bytes -= len(frame)
         self.queue_occupancy_frames -= 1
+        self._wake_sender()
         return frame
 
 
@@ -574,7 +726,7 @@ class PcieIfSink(PcieIfBase):
         self.bus.ready.setimmediatevalue(0)
 
         cocotb.start_soon(self._run_sink())
-        cocotb.start_soon(self._run())
+        self._run_cr = cocotb.start_soon(self._run())
 
     def _recv(self, frame):
         if self.queue.empty():
@@ -621,9 +773,18 @@ class PcieIfSink(PcieIfBase):
             valid_sample = self.bus.valid.value
 
             if self.reset is not None and self.reset.value:
+                if self._run_cr is not None:
+                    # drop any partially received frame
+                    self._run_cr.kill()
+                    self._run_cr = None
+                    self.sample_obj = None
+                    self.active = False
                 self.bus.ready.value = 0
                 continue
 
+            if self._run_cr is None:
+                self._run_cr = cocotb.start_soon(self._run())
+
             if ready_sample and valid_sample:
                 self.sample_obj = self._transaction_obj()
                 self.bus.sample(self.sample_obj)
@@ -677,15 +838,20 @@ class PcieIfSink(PcieIfBase):
                     data = (int(sample.data) >> (seg*self.seg_width)) & self.seg_mask
                     data_par = (int(sample.data_par) >> (seg*self.seg_par_width)) & self.seg_par_mask
                     empty = (int(sample.empty) >> (seg*self.seg_empty_width)) & self.seg_empty_mask
-                    for k in range(self.seg_byte_lanes):
-                        if dword_count > 0:
-                            frame.data.append((data >> 32*k) & 0xffffffff)
-                            frame.parity.append((data_par >> 4*k) & 0xf)
-                            dword_count -= 1
+                    cnt = min(self.seg_byte_lanes, dword_count)
+                    frame.data.extend(dword_array(data.to_bytes(self.seg_width // 8, 'little')[:cnt*4]))
+
+                    # split parity bytes into nibbles
+                    data_par = data_par.to_bytes((self.seg_par_width+7) // 8, 'little')
+                    par = bytearray(len(data_par)*2)
+                    par[0::2] = data_par.translate(_nibble_lo)
+                    par[1::2] = data_par.translate(_nibble_hi)
+                    frame.parity.extend(par[:cnt])
+                    dword_count -= cnt
 
                 if int(sample.eop) & (1 << seg):
                     assert dword_count == 0, "framing error: incorrect length or early eop"
-                    self.log.info(f"RX frame: {frame}")
+                    self.log.info("RX frame: %s", frame)
                     self._sink_frame(frame)
                     self.active = False
                     frame = None
@@ -1297,10 +1463,31 @@ class PcieIfDevice(Device):
                 self.tx_fc_cpld_cons.value = self.upstream_port.fc_state[0].cpld.tx_credits_consumed & 0xfff
 
 
+class PcieIfTagState:
+    def __init__(self, tag, req=None):
+        self.tag = tag
+        self.req = req
+
+        self.queue = deque()
+        self.sync = Event()
+
+        self.cpl_count = 0
+        self.byte_count = 0
+        self.done = False
+
+    def __repr__(self):
+        return (f"{type(self).__name__}(tag={self.tag}, "
+            f"cpl_count={self.cpl_count}, "
+            f"byte_count={self.byte_count}, "
+            f"done={self.done})")
+
+
 class PcieIfTestDevice:
     def __init__(self,
             # configuration options
             force_64bit_addr=False,
+            tag_count=32,
+            queue_depth=2,
 
             # signals
             # Clock and reset
@@ -1323,6 +1510,14 @@ class PcieIfTestDevice:
             wr_req_tx_seq_num=None,
             wr_req_tx_seq_num_valid=None,
 
+            # Flow control
+            tx_fc_ph_av=None,
+            tx_fc_pd_av=None,
+            tx_fc_nph_av=None,
+            tx_fc_npd_av=None,
+            tx_fc_cplh_av=None,
+            tx_fc_cpld_av=None,
+
             *args, **kwargs):
 
         super().__init__(*args, **kwargs)
@@ -1340,13 +1535,20 @@ class PcieIfTestDevice:
         self.bar_ptr = 0
         self.regions = [None]*6
 
-        self.current_tag = 0
-        self.tag_count = 32
-        self.tag_active = [False]*256
-        self.tag_release = Event()
+        # per-tag completion state for outstanding requests
+        self.tag_state = {}
+        # free tags, reused in release order
+        self.tag_free = deque()
+        # tasks waiting for a free tag, [event, tag]
+        self.tag_waiters = deque()
+        self.tag_count = tag_count
 
-        self.rx_cpl_queues = [Queue() for k in range(256)]
-        self.rx_cpl_sync = [Event() for k in range(256)]
+        self.rd_req_outstanding = 0
+        self.rd_req_outstanding_bytes = 0
+        self.rd_req_outstanding_max = 0
+
+        # limit on outstanding read requests per transfer (default tag_count)
+        self.rd_req_limit = None
 
         self.dev_max_payload = 0
         self.dev_max_read_req = 0
@@ -1365,12 +1567,10 @@ class PcieIfTestDevice:
 
         if rx_req_tlp_bus is not None:
             self.rx_req_tlp_sink = PcieIfSink(rx_req_tlp_bus, self.clk, self.rst)
-            self.rx_req_tlp_sink.queue_occupancy_limit_frames = 2
             self.dw = self.rx_req_tlp_sink.width
 
         if tx_cpl_tlp_bus is not None:
             self.tx_cpl_tlp_source = PcieIfSource(tx_cpl_tlp_bus, self.clk, self.rst)
-            self.tx_cpl_tlp_source.queue_occupancy_limit_frames = 2
             self.dw = self.tx_cpl_tlp_source.width
 
         # Requester interfaces
@@ -1381,33 +1581,58 @@ class PcieIfTestDevice:
 
         if tx_rd_req_tlp_bus is not None:
             self.tx_rd_req_tlp_source = PcieIfSource(tx_rd_req_tlp_bus, self.clk, self.rst)
-            self.tx_rd_req_tlp_source.queue_occupancy_limit_frames = 2
             self.dw = self.tx_rd_req_tlp_source.width
 
         if tx_wr_req_tlp_bus is not None:
             self.tx_wr_req_tlp_source = PcieIfSource(tx_wr_req_tlp_bus, self.clk, self.rst)
-            self.tx_wr_req_tlp_source.queue_occupancy_limit_frames = 2
             self.dw = self.tx_wr_req_tlp_source.width
 
         if tx_msi_wr_req_tlp_bus is not None:
             self.tx_msi_wr_req_tlp_source = PcieIfSource(tx_msi_wr_req_tlp_bus, self.clk, self.rst)
-            self.tx_msi_wr_req_tlp_source.queue_occupancy_limit_frames = 2
 
         if rx_cpl_tlp_bus is not None:
             self.rx_cpl_tlp_sink = PcieIfSink(rx_cpl_tlp_bus, self.clk, self.rst)
-            self.rx_cpl_tlp_sink.queue_occupancy_limit_frames = 2
             self.dw = self.rx_cpl_tlp_sink.width
 
+        self.set_queue_depth(queue_depth)
+
         self.rd_req_tx_seq_num = init_signal(rd_req_tx_seq_num, None)
         self.rd_req_tx_seq_num_valid = init_signal(rd_req_tx_seq_num_valid, None)
 
         self.wr_req_tx_seq_num = init_signal(wr_req_tx_seq_num, None)
         self.wr_req_tx_seq_num_valid = init_signal(wr_req_tx_seq_num_valid, None)
 
+        # Flow control
+        self.tx_fc_ph_av = init_signal(tx_fc_ph_av, None)
+        self.tx_fc_pd_av = init_signal(tx_fc_pd_av, None)
+        self.tx_fc_nph_av = init_signal(tx_fc_nph_av, None)
+        self.tx_fc_npd_av = init_signal(tx_fc_npd_av, None)
+        self.tx_fc_cplh_av = init_signal(tx_fc_cplh_av, None)
+        self.tx_fc_cpld_av = init_signal(tx_fc_cpld_av, None)
+
+        self.fc_av = {
+            FcType.P: (self.tx_fc_ph_av, self.tx_fc_pd_av),
+            FcType.NP: (self.tx_fc_nph_av, self.tx_fc_npd_av),
+            FcType.CPL: (self.tx_fc_cplh_av, self.tx_fc_cpld_av),
+        }
+        self.fc_lock = {fc_type: Lock() for fc_type in FcType}
+        # credits of TLPs not yet reflected in the available counts
+        self.fc_pending = {fc_type: [0, 0] for fc_type in FcType}
+        # TLPs accepted by the DUT, [fc_type, data_credits, cycles since eop]
+        self.fc_accepted = deque()
+        # clock cycles from the eop of a TLP being accepted until the
+        # available counts reflect it
+        self.fc_latency = 4
+
+        # pace TLPs by the credits available at the DUT
+        self.fc_pacing = any(sig is not None for av in self.fc_av.values() for sig in av)
+
         # fork coroutines
 
         cocotb.start_soon(self._run_rx_req_tlp())
         cocotb.start_soon(self._run_rx_cpl_tlp())
+        if self.fc_pacing:
+            cocotb.start_soon(self._run_fc_logic())
 
     def add_region(self, size, read=None, write=None, ext=False, prefetch=False, io=False):
         if self.bar_ptr > 5 or (ext and self.bar_ptr > 4):
@@ -1450,53 +1675,163 @@ class PcieIfTestDevice:
         else:
             self.regions[region][1][addr:addr+len(data)] = data
 
+    @property
+    def tag_count(self):
+        return self._tag_count
+
+    @tag_count.setter
+    def tag_count(self, count):
+        # 32 (5-bit), 256 (8-bit extended), or 1024 (10-bit extended) tags
+        if count < 1 or count > 1024:
+            raise Exception("Invalid tag count")
+
+        self._tag_count = count
+        self.tag_free = deque(tag for tag in range(count) if tag not in self.tag_state)
+
+        while self.tag_waiters and self.tag_free:
+            waiter = self.tag_waiters.popleft()
+            waiter[1] = self.tag_free.popleft()
+            waiter[0].set()
+
+    def tags_in_use(self):
+        return len(self.tag_state)
+
     async def recv_cpl(self, tag, timeout=0, timeout_unit='ns'):
-        queue = self.rx_cpl_queues[tag]
-        sync = self.rx_cpl_sync[tag]
+        state = self.tag_state[tag]
 
-        if not queue.empty():
-            return queue.get_nowait()
+        if state.queue:
+            return state.queue.popleft()
 
-        sync.clear()
+        state.sync.clear()
         if timeout:
-            await First(sync.wait(), Timer(timeout, timeout_unit))
+            await First(state.sync.wait(), Timer(timeout, timeout_unit))
         else:
-            await sync.wait()
+            await state.sync.wait()
 
-        if not queue.empty():
-            return queue.get_nowait()
+        if state.queue:
+            return state.queue.popleft()
 
         return None
 
-    async def alloc_tag(self):
-        tag_count = min(256, self.tag_count)
+    async def alloc_tag(self, req=None):
+        if self.tag_free and not self.tag_waiters:
+            tag = self.tag_free.popleft()
+        else:
+            # wait in line, release_tag hands over the tag directly
+            waiter = [Event(), None]
+            self.tag_waiters.append(waiter)
+            await waiter[0].wait()
+            tag = waiter[1]
+
+        self.tag_state[tag] = PcieIfTagState(tag, req)
 
-        while True:
-            tag = self.current_tag
-            for k in range(tag_count):
-                tag = (tag + 1) % tag_count
-                if not self.tag_active[tag]:
-                    self.tag_active[tag] = True
-                    self.current_tag = tag
-                    return tag
+        if req is not None and req.fmt_type in {TlpType.MEM_READ, TlpType.MEM_READ_64, TlpType.IO_READ}:
+            self.rd_req_outstanding += 1
+            self.rd_req_outstanding_bytes += req.get_be_byte_count()
+            self.rd_req_outstanding_max = max(self.rd_req_outstanding_max, self.rd_req_outstanding)
 
-            self.tag_release.clear()
-            await self.tag_release.wait()
+        return tag
 
     def release_tag(self, tag):
-        assert self.tag_active[tag]
-        self.tag_active[tag] = False
-        self.tag_release.set()
+        state = self.tag_state.pop(tag)
+        req = state.req
+
+        if req is not None and req.fmt_type in {TlpType.MEM_READ, TlpType.MEM_READ_64, TlpType.IO_READ}:
+            self.rd_req_outstanding -= 1
+            self.rd_req_outstanding_bytes -= req.get_be_byte_count()
+
+        if tag >= self.tag_count:
+            # tag space was reduced while this tag was in use
+            return
+
+        if self.tag_waiters:
+            waiter = self.tag_waiters.popleft()
+            waiter[1] = tag
+            waiter[0].set()
+        else:
+            self.tag_free.append(tag)
+
+    def _handle_cpl(self, cpl):
+        state = self.tag_state.get(cpl.tag)
+
+        if state is None:
+            self.log.warning("Unexpected completion: tag %d not in use: %r", cpl.tag, cpl)
+            return
+
+        state.cpl_count += 1
+        if cpl.fmt_type in {TlpType.CPL_DATA, TlpType.CPL_LOCKED_DATA}:
+            state.byte_count += min(cpl.byte_count, cpl.length*4 - (cpl.lower_address & 0x3))
+
+        req = state.req
+
+        if req is None:
+            pass
+        elif cpl.status != CplStatus.SC:
+            # bad status
+            state.done = True
+        elif req.fmt_type in {TlpType.MEM_READ, TlpType.MEM_READ_64}:
+            # completion for memory read request
+
+            # request completed
+            if cpl.byte_count <= cpl.length*4 - (cpl.lower_address & 0x3):
+                state.done = True
+
+            # completion for read request has SC status but no data
+            if cpl.fmt_type in {TlpType.CPL, TlpType.CPL_LOCKED}:
+                state.done = True
+
+        else:
+            # completion for other request
+            state.done = True
+
+        state.queue.append(cpl)
+        state.sync.set()
+
+    def set_queue_depth(self, depth):
+        for q in [self.rx_req_tlp_sink, self.tx_cpl_tlp_source, self.tx_rd_req_tlp_source,
+                self.tx_wr_req_tlp_source, self.tx_msi_wr_req_tlp_source, self.rx_cpl_tlp_sink]:
+            if q is not None:
+                q.queue_occupancy_limit_frames = depth
+
+    def _fc_check(self, fc_type, data_credits):
+        hdr_av, data_av = self.fc_av[fc_type]
+        hdr_pending, data_pending = self.fc_pending[fc_type]
+
+        if hdr_av is not None and int(hdr_av.value) - hdr_pending < 1:
+            return False
+        if data_credits and data_av is not None and int(data_av.value) - data_pending < data_credits:
+            return False
+        return True
+
+    async def send_tlp(self, source, tlp):
+        frame = PcieIfFrame.from_tlp(tlp, self.force_64bit_addr)
+
+        if self.fc_pacing:
+            fc_type = tlp.get_fc_type()
+            data_credits = tlp.get_data_credits() if tlp.has_data() else 0
+
+            # one waiter per credit type, in order
+            async with self.fc_lock[fc_type]:
+                while not self._fc_check(fc_type, data_credits):
+                    await RisingEdge(self.clk)
+
+                self.fc_pending[fc_type][0] += 1
+                self.fc_pending[fc_type][1] += data_credits
+
+            frame.tx_complete = lambda frame: self.fc_accepted.append([fc_type, data_credits, 0])
+
+        await source.send(frame)
 
     async def perform_posted_operation(self, source, req):
-        await source.send(PcieIfFrame.from_tlp(req, self.force_64bit_addr))
+        await self.send_tlp(source, req)
 
     async def perform_nonposted_operation(self, source, req, timeout=0, timeout_unit='ns'):
         completions = []
 
-        req.tag = await self.alloc_tag()
+        req.tag = await self.alloc_tag(req)
+        state = self.tag_state[req.tag]
 
-        await source.send(PcieIfFrame.from_tlp(req, self.force_64bit_addr))
+        await self.send_tlp(source, req)
 
         while True:
             cpl = await self.recv_cpl(req.tag, timeout, timeout_unit)
@@ -1506,22 +1841,7 @@ class PcieIfTestDevice:
 
             completions.append(cpl)
 
-            if cpl.status != CplStatus.SC:
-                # bad status
-                break
-            elif req.fmt_type in {TlpType.MEM_READ, TlpType.MEM_READ_64}:
-                # completion for memory read request
-
-                # request completed
-                if cpl.byte_count <= cpl.length*4 - (cpl.lower_address & 0x3):
-                    break
-
-                # completion for read request has SC status but no data
-                if cpl.fmt_type in {TlpType.CPL, TlpType.CPL_LOCKED}:
-                    break
-
-            else:
-                # completion for other request
+            if state.done and not state.queue:
                 break
 
         self.release_tag(req.tag)
@@ -1639,44 +1959,52 @@ class PcieIfTestDevice:
             n += byte_length
             addr += byte_length
 
-    async def dma_mem_read(self, addr, length, timeout=0, timeout_unit='ns'):
-        data = bytearray()
+    async def dma_mem_read_into(self, addr, buf, timeout=0, timeout_unit='ns', max_outstanding=None):
+        # read into a writable buffer, keeping at most max_outstanding
+        # read requests in flight
+        buf = memoryview(buf).cast('B')
+        length = len(buf)
         n = 0
 
         zero_len = length <= 0
         if zero_len:
+            buf = memoryview(bytearray(1))
             length = 1
 
-        op_list = []
+        if max_outstanding is None:
+            max_outstanding = self.rd_req_limit or self.tag_count
 
-        while n < length:
-            req = Tlp()
-            if addr > 0xffffffff:
-                req.fmt_type = TlpType.MEM_READ_64
-            else:
-                req.fmt_type = TlpType.MEM_READ
-            req.requester_id = PcieId(self.dev_bus_num, self.dev_device_num, 0)
+        op_list = deque()
 
-            first_pad = addr % 4
-            # remaining length
-            byte_length = length-n
-            # limit to max read request size
-            if byte_length > (128 << self.dev_max_read_req) - first_pad:
-                # split on 128-byte read completion boundary
-                byte_length = min(byte_length, (128 << self.dev_max_read_req) - (addr & 0x7f))
-            # 4k align
-            byte_length = min(byte_length, 0x1000 - (addr & 0xfff))
-            req.set_addr_be(addr, byte_length)
+        while n < length or op_list:
+            while n < length and len(op_list) < max_outstanding:
+                req = Tlp()
+                if addr > 0xffffffff:
+                    req.fmt_type = TlpType.MEM_READ_64
+                else:
+                    req.fmt_type = TlpType.MEM_READ
+                req.requester_id = PcieId(self.dev_bus_num, self.dev_device_num, 0)
 
-            if zero_len:
-                req.first_be = 0
+                first_pad = addr % 4
+                # remaining length
+                byte_length = length-n
+                # limit to max read request size
+                if byte_length > (128 << self.dev_max_read_req) - first_pad:
+                    # split on 128-byte read completion boundary
+                    byte_length = min(byte_length, (128 << self.dev_max_read_req) - (addr & 0x7f))
+                # 4k align
+                byte_length = min(byte_length, 0x1000 - (addr & 0xfff))
+                req.set_addr_be(addr, byte_length)
 
-            op_list.append((byte_length, cocotb.start_soon(self.perform_nonposted_operation(self.tx_rd_req_tlp_source, req, timeout, timeout_unit))))
+                if zero_len:
+                    req.first_be = 0
 
-            n += byte_length
-            addr += byte_length
+                op_list.append((n, byte_length, cocotb.start_soon(self.perform_nonposted_operation(self.tx_rd_req_tlp_source, req, timeout, timeout_unit))))
+
+                n += byte_length
+                addr += byte_length
 
-        for byte_length, op in op_list:
+            offset, byte_length, op = op_list.popleft()
             cpl_list = await op.join()
 
             m = 0
@@ -1695,15 +2023,16 @@ class PcieIfTestDevice:
 
                 d = cpl.get_data()
 
-                offset = cpl.lower_address & 3
-                data.extend(d[offset:offset+cpl.byte_count])
+                start = cpl.lower_address & 3
+                cnt = min(cpl.byte_count, len(d)-start)
+                buf[offset+m:offset+m+cnt] = d[start:start+cnt]
 
-                m += len(d)-offset
-
-        if zero_len:
-            return b''
+                m += len(d)-start
 
-        return bytes(data[:length])
+    async def dma_mem_read(self, addr, length, timeout=0, timeout_unit='ns'):
+        data = bytearray(max(length, 0))
+        await self.dma_mem_read_into(addr, data, timeout, timeout_unit)
+        return bytes(data)
 
     async def issue_msi_interrupt(self, addr, data):
         data = data.to_bytes(4, 'little')
@@ -1744,8 +2073,7 @@ class PcieIfTestDevice:
             if tlp.fmt_type in {TlpType.CPL, TlpType.CPL_DATA, TlpType.CPL_LOCKED, TlpType.CPL_LOCKED_DATA}:
                 self.log.info("Completion")
 
-                self.rx_cpl_queues[tlp.tag].put_nowait(tlp)
-                self.rx_cpl_sync[tlp.tag].set()
+                self._handle_cpl(tlp)
 
             elif tlp.fmt_type == TlpType.IO_READ:
                 self.log.info("IO read")
@@ -1780,7 +2108,7 @@ class PcieIfTestDevice:
                 cpl.length = 1
 
                 self.log.debug("Completion: %s", repr(cpl))
-                await self.tx_cpl_tlp_source.send(PcieIfFrame.from_tlp(cpl, self.force_64bit_addr))
+                await self.send_tlp(self.tx_cpl_tlp_source, cpl)
 
             elif tlp.fmt_type == TlpType.IO_WRITE:
                 self.log.info("IO write")
@@ -1811,7 +2139,7 @@ class PcieIfTestDevice:
                     await self.write_region(region, addr+start_offset, data[start_offset:offset])
 
                 self.log.debug("Completion: %s", repr(cpl))
-                await self.tx_cpl_tlp_source.send(PcieIfFrame.from_tlp(cpl, self.force_64bit_addr))
+                await self.send_tlp(self.tx_cpl_tlp_source, cpl)
 
             elif tlp.fmt_type in {TlpType.MEM_READ, TlpType.MEM_READ_64}:
                 self.log.info("Memory read")
@@ -1849,7 +2177,7 @@ class PcieIfTestDevice:
                     cpl.set_data(data[m*4:(m+cpl_dw_length)*4])
 
                     self.log.debug("Completion: %s", repr(cpl))
-                    await self.tx_cpl_tlp_source.send(PcieIfFrame.from_tlp(cpl, self.force_64bit_addr))
+                    await self.send_tlp(self.tx_cpl_tlp_source, cpl)
 
                     m += cpl_dw_length
                     n += cpl_dw_length*4 - (addr & 3)
@@ -1916,5 +2244,20 @@ class PcieIfTestDevice:
             if tlp.fmt_type in {TlpType.CPL, TlpType.CPL_DATA, TlpType.CPL_LOCKED, TlpType.CPL_LOCKED_DATA}:
                 self.log.info("Completion")
 
-                self.rx_cpl_queues[tlp.tag].put_nowait(tlp)
-                self.rx_cpl_sync[tlp.tag].set()
+                self._handle_cpl(tlp)
+
+    async def _run_fc_logic(self):
+        clock_edge_event = RisingEdge(self.clk)
+
+        while True:
+            await clock_edge_event
+
+            # release credits once the available counts have caught up
+            # with accepted TLPs
+            for item in self.fc_accepted:
+                item[2] += 1
+
+            while self.fc_accepted and self.fc_accepted[0][2] > self.fc_latency:
+                fc_type, data_credits, age = self.fc_accepted.popleft()
+                self.fc_pending[fc_type][0] -= 1
+                self.fc_pending[fc_type][1] -= data_credits
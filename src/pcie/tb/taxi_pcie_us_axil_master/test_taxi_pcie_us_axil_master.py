@@ -13,9 +13,9 @@ import itertools
 import logging
 import os
 import re
+import sys
 from contextlib import contextmanager
 
-import cocotb_test.simulator
 import pytest
 
 import cocotb
@@ -27,6 +27,18 @@ from cocotbext.pcie.core import RootComplex
 from cocotbext.pcie.xilinx.us import UltraScalePlusPcieDevice
 from cocotbext.axi import AxiLiteBus, AxiLiteRam
 
+try:
+    import taxi_tb.filelist
+    import taxi_tb.sim
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.filelist
+        import taxi_tb.sim
+    finally:
+        del sys.path[0]
+
 
 @contextmanager
 def assert_raises(exc_type, pattern=None):
@@ -411,19 +423,6 @@ lib_dir = os.path.abspath(os.path.join(tests_dir, '..', '..', 'lib'))
 taxi_src_dir = os.path.abspath(os.path.join(lib_dir, 'taxi', 'src'))
 
 
-def process_f_files(files):
-    lst = {}
-    for f in files:
-        if f[-2:].lower() == '.f':
-            with open(f, 'r') as fp:
-                l = fp.read().split()
-            for f in process_f_files([os.path.join(os.path.dirname(f), x) for x in l]):
-                lst[os.path.basename(f)] = f
-        else:
-            lst[os.path.basename(f)] = f
-    return list(lst.values())
-
-
 @pytest.mark.parametrize("axis_pcie_data_w", [64, 128, 256, 512])
 def test_taxi_pcie_us_axil_master(request, axis_pcie_data_w):
     dut = "taxi_pcie_us_axil_master"
@@ -437,7 +436,7 @@ def test_taxi_pcie_us_axil_master(request, axis_pcie_data_w):
         os.path.join(taxi_src_dir, "axi", "rtl", "taxi_axil_if.sv"),
     ]
 
-    verilog_sources = process_f_files(verilog_sources)
+    verilog_sources = taxi_tb.filelist.process_f_files(verilog_sources)
 
     parameters = {}
 
@@ -454,7 +453,7 @@ def test_taxi_pcie_us_axil_master(request, axis_pcie_data_w):
     sim_build = os.path.join(tests_dir, "sim_build",
         request.node.name.replace('[', '-').replace(']', ''))
 
-    cocotb_test.simulator.run(
+    taxi_tb.sim.run(
         simulator="verilator",
         python_search=[tests_dir],
         verilog_sources=verilog_sources,
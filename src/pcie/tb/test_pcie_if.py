@@ -0,0 +1,554 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import itertools
+import os
+import random
+import struct
+import sys
+
+import pytest
+
+import cocotb
+from cocotb.triggers import RisingEdge, Timer
+
+from cocotbext.pcie.core.dllp import FcType
+from cocotbext.pcie.core.tlp import Tlp, TlpType
+from cocotbext.pcie.core.utils import PcieId
+
+try:
+    from pcie_if import PcieIfBus, PcieIfSource, PcieIfSink, PcieIfFrame, PcieIfTestDevice
+    from pcie_if import dword_parity, parity, dword_parity_bulk, parity_bulk
+except ImportError:
+    # attempt import from current directory
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+    try:
+        from pcie_if import PcieIfBus, PcieIfSource, PcieIfSink, PcieIfFrame, PcieIfTestDevice
+        from pcie_if import dword_parity, parity, dword_parity_bulk, parity_bulk
+    finally:
+        del sys.path[0]
+
+try:
+    import taxi_tb.loopback
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.loopback
+    finally:
+        del sys.path[0]
+
+
+async def run_test_loopback(sim, data_width=512, seg_count=1, payload_lengths=None, payload_data=None,
+        idle_inserter=None, backpressure_inserter=None):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 4, "ns")
+
+    seg_empty_width = ((data_width // 32 // seg_count)-1).bit_length()
+
+    dut = sim.entity("dut", {
+        "tlp_data": data_width,
+        "tlp_empty": seg_count*seg_empty_width,
+        "tlp_hdr": seg_count*128,
+        "tlp_valid": seg_count,
+        "tlp_sop": seg_count,
+        "tlp_eop": seg_count,
+        "tlp_ready": 1,
+        "tlp_data_par": data_width//8,
+        "tlp_hdr_par": seg_count*16,
+        "tlp_func_num": seg_count*8,
+        "tlp_error": seg_count*4,
+    })
+
+    bus = PcieIfBus.from_prefix(dut, "tlp")
+
+    source = PcieIfSource(bus, clk)
+    sink = PcieIfSink(bus, clk)
+
+    if idle_inserter is not None:
+        source.set_pause_generator(idle_inserter())
+    if backpressure_inserter is not None:
+        sink.set_pause_generator(backpressure_inserter())
+
+    test_frames = []
+
+    for k, length in enumerate(payload_lengths()):
+        tlp = Tlp()
+        if length:
+            tlp.fmt_type = TlpType.MEM_WRITE
+            tlp.set_addr_be_data(k*4, payload_data(length))
+        else:
+            tlp.fmt_type = TlpType.MEM_READ
+            tlp.set_addr_be(k*4, 4)
+        frame = PcieIfFrame.from_tlp(tlp)
+        frame.func_num = k % 4
+        test_frames.append(frame)
+
+    tx_frames = []
+
+    for frame in test_frames:
+        frame.tx_complete = tx_frames.append
+        await source.send(frame)
+
+    for frame in test_frames:
+        rx_frame = await sink.recv()
+
+        assert rx_frame == frame
+        assert rx_frame.check_parity()
+
+    assert sink.empty()
+
+    # completion is reported when the eop transfer is accepted
+    await RisingEdge(clk)
+    assert tx_frames == test_frames
+
+
+def pcie_if_bus(sim, name, data_width, seg_count=1):
+    seg_empty_width = ((data_width // 32 // seg_count)-1).bit_length()
+
+    dut = sim.entity(name, {
+        "tlp_data": data_width,
+        "tlp_empty": seg_count*seg_empty_width,
+        "tlp_hdr": seg_count*128,
+        "tlp_valid": seg_count,
+        "tlp_sop": seg_count,
+        "tlp_eop": seg_count,
+        "tlp_ready": 1,
+        "tlp_data_par": data_width//8,
+        "tlp_hdr_par": seg_count*16,
+        "tlp_func_num": seg_count*8,
+        "tlp_error": seg_count*4,
+    })
+
+    return PcieIfBus.from_prefix(dut, "tlp")
+
+
+async def run_test_dma_read(sim, data_width=256, tag_count=32, length=8192, batch=8):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 4, "ns")
+
+    rx_req_bus = pcie_if_bus(sim, "rx_req", data_width)
+    tx_cpl_bus = pcie_if_bus(sim, "tx_cpl", data_width)
+    tx_rd_req_bus = pcie_if_bus(sim, "tx_rd_req", data_width)
+    tx_wr_req_bus = pcie_if_bus(sim, "tx_wr_req", data_width)
+    rx_cpl_bus = pcie_if_bus(sim, "rx_cpl", data_width)
+
+    dev = PcieIfTestDevice(
+        tag_count=tag_count,
+        clk=clk,
+        rx_req_tlp_bus=rx_req_bus,
+        tx_cpl_tlp_bus=tx_cpl_bus,
+        tx_rd_req_tlp_bus=tx_rd_req_bus,
+        tx_wr_req_tlp_bus=tx_wr_req_bus,
+        rx_cpl_tlp_bus=rx_cpl_bus,
+    )
+
+    # host side of the link
+    PcieIfSource(rx_req_bus, clk)
+    PcieIfSink(tx_cpl_bus, clk)
+    PcieIfSink(tx_wr_req_bus, clk)
+    rd_req_sink = PcieIfSink(tx_rd_req_bus, clk)
+    cpl_source = PcieIfSource(rx_cpl_bus, clk)
+    cpl_source.queue_occupancy_limit_frames = 2
+
+    mem = incrementing_payload(length+0x2000)
+    host_tags = set()
+
+    async def host():
+        while True:
+            # collect a batch of requests and complete them in reverse order
+            reqs = [(await rd_req_sink.recv()).to_tlp()]
+            while len(reqs) < batch and not rd_req_sink.empty():
+                reqs.append((await rd_req_sink.recv()).to_tlp())
+
+            for req in reqs:
+                assert req.tag < tag_count
+                assert req.tag not in host_tags
+                host_tags.add(req.tag)
+
+            assert dev.tags_in_use() >= len(host_tags)
+
+            for req in reversed(reqs):
+                addr = req.address+req.get_first_be_offset()
+                byte_length = req.get_be_byte_count()
+                n = 0
+                m = 0
+
+                # split completions on 64-byte boundaries
+                while m < req.length:
+                    cpl = Tlp.create_completion_data_for_tlp(req, PcieId(0, 0, 0))
+                    cpl_dw_length = min(req.length-m, 16 - ((addr & 0x3c) >> 2))
+                    cpl.byte_count = byte_length-n
+                    cpl.lower_address = addr & 0x7f
+                    cpl.set_data(mem[(req.address & ~3)+m*4:(req.address & ~3)+(m+cpl_dw_length)*4])
+
+                    if m+cpl_dw_length >= req.length:
+                        host_tags.remove(req.tag)
+                    await cpl_source.send(PcieIfFrame.from_tlp(cpl))
+
+                    m += cpl_dw_length
+                    n += cpl_dw_length*4 - (addr & 3)
+                    addr += cpl_dw_length*4 - (addr & 3)
+
+    sim_host = cocotb.start_soon(host())
+
+    for offset in [0, 1, 3, 126]:
+        data = await dev.dma_mem_read(0x1000+offset, length)
+        assert data == mem[0x1000+offset:0x1000+offset+length]
+
+        assert dev.rd_req_outstanding == 0
+        assert dev.rd_req_outstanding_bytes == 0
+        assert dev.tags_in_use() == 0
+
+    # requester interface saturated with every tag in flight
+    assert dev.rd_req_outstanding_max == min(tag_count, length // 128 + 1)
+
+    # completion for a tag that is not in use is dropped
+    req = Tlp()
+    req.fmt_type = TlpType.MEM_READ
+    req.set_addr_be(0, 4)
+    req.tag = 0
+    cpl = Tlp.create_completion_data_for_tlp(req, PcieId(0, 0, 0))
+    cpl.byte_count = 4
+    cpl.set_data(bytes(4))
+    await cpl_source.send(PcieIfFrame.from_tlp(cpl))
+    await cpl_source.wait()
+    await Timer(100, 'ns')
+
+    assert dev.tags_in_use() == 0
+
+    data = await dev.dma_mem_read(0x2000, 4)
+    assert data == mem[0x2000:0x2004]
+
+    sim_host.kill()
+
+
+async def run_test_tag_alloc(sim, tag_count=32):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 4, "ns")
+
+    dev = PcieIfTestDevice(
+        tag_count=tag_count,
+        clk=clk,
+        rx_req_tlp_bus=pcie_if_bus(sim, "rx_req", 64),
+        rx_cpl_tlp_bus=pcie_if_bus(sim, "rx_cpl", 64),
+    )
+
+    tags = [await dev.alloc_tag() for k in range(tag_count)]
+    assert sorted(tags) == list(range(tag_count))
+    assert dev.tags_in_use() == tag_count
+
+    # waiters are served in order, each with a released tag
+    served = []
+
+    async def waiter(k):
+        served.append((k, await dev.alloc_tag()))
+
+    waiters = [cocotb.start_soon(waiter(k)) for k in range(4)]
+    await Timer(10, 'ns')
+    assert not served
+
+    for tag in [5, 3, 17, 9]:
+        dev.release_tag(tag)
+    for w in waiters:
+        await w
+
+    assert served == [(0, 5), (1, 3), (2, 17), (3, 9)]
+
+    for k, tag in served:
+        dev.release_tag(tag)
+    for tag in tags:
+        if tag not in {5, 3, 17, 9}:
+            dev.release_tag(tag)
+
+    assert dev.tags_in_use() == 0
+
+    # released tags are reused oldest first
+    assert await dev.alloc_tag() == 5
+    dev.release_tag(5)
+
+    # shrinking the tag space retires tags above the limit on release
+    tag = None
+    while tag is None or tag < 16:
+        if tag is not None:
+            dev.release_tag(tag)
+        tag = await dev.alloc_tag()
+    dev.tag_count = 16
+    dev.release_tag(tag)
+    tags = [await dev.alloc_tag() for k in range(16)]
+    assert sorted(tags) == list(range(16))
+
+
+async def run_test_dma_stream(sim, data_width=256, queue_depth=2, fc_limit=None, length=65536, reset=False):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, 4, "ns")
+    rst = sim.signal("rst")
+
+    rx_req_bus = pcie_if_bus(sim, "rx_req", data_width)
+    tx_cpl_bus = pcie_if_bus(sim, "tx_cpl", data_width)
+    tx_rd_req_bus = pcie_if_bus(sim, "tx_rd_req", data_width)
+    tx_wr_req_bus = pcie_if_bus(sim, "tx_wr_req", data_width)
+    rx_cpl_bus = pcie_if_bus(sim, "rx_cpl", data_width)
+
+    tx_fc_ph_av = sim.signal("tx_fc_ph_av", 8)
+    tx_fc_pd_av = sim.signal("tx_fc_pd_av", 12)
+    tx_fc_nph_av = sim.signal("tx_fc_nph_av", 8)
+
+    fc = fc_limit is not None
+
+    dev = PcieIfTestDevice(
+        queue_depth=queue_depth,
+        clk=clk,
+        rst=rst,
+        rx_req_tlp_bus=rx_req_bus,
+        tx_cpl_tlp_bus=tx_cpl_bus,
+        tx_rd_req_tlp_bus=tx_rd_req_bus,
+        tx_wr_req_tlp_bus=tx_wr_req_bus,
+        rx_cpl_tlp_bus=rx_cpl_bus,
+        tx_fc_ph_av=tx_fc_ph_av if fc else None,
+        tx_fc_pd_av=tx_fc_pd_av if fc else None,
+        tx_fc_nph_av=tx_fc_nph_av if fc else None,
+    )
+
+    dev.dev_max_payload = 1
+    dev.dev_max_read_req = 2
+
+    assert dev.fc_pacing == fc
+    assert dev.tx_rd_req_tlp_source.queue_occupancy_limit_frames == queue_depth
+
+    # host side of the link, processing one request every few cycles
+    PcieIfSource(rx_req_bus, clk, rst)
+    PcieIfSink(tx_cpl_bus, clk, rst)
+    rd_req_sink = PcieIfSink(tx_rd_req_bus, clk, rst)
+    wr_req_sink = PcieIfSink(tx_wr_req_bus, clk, rst)
+    cpl_source = PcieIfSource(rx_cpl_bus, clk, rst)
+
+    mem = bytearray(length+0x3000)
+    mem[0:length] = incrementing_payload(length)
+    rd_pending = []
+    wr_pending = []
+
+    async def fc_logic():
+        while True:
+            await RisingEdge(clk)
+
+            nph = len(rd_pending) + rd_req_sink.count()
+            ph = len(wr_pending) + wr_req_sink.count()
+            pd = sum((len(frame.data)+3)//4 for frame in wr_pending) + (wr_req_sink.queue_occupancy_bytes+3)//4
+
+            if fc:
+                assert nph <= fc_limit[0]
+                assert ph <= fc_limit[1]
+                assert pd <= fc_limit[2]
+
+                tx_fc_nph_av.value = fc_limit[0] - nph
+                tx_fc_ph_av.value = fc_limit[1] - ph
+                tx_fc_pd_av.value = fc_limit[2] - pd
+
+    async def rd_req_recv():
+        while True:
+            rd_pending.append((await rd_req_sink.recv()).to_tlp())
+
+    async def wr_req_recv():
+        while True:
+            wr_pending.append(await wr_req_sink.recv())
+
+    async def host():
+        while True:
+            for k in range(4):
+                await RisingEdge(clk)
+
+            if wr_pending:
+                req = wr_pending.pop(0).to_tlp()
+                data = req.get_data()
+                for k in range(len(data)):
+                    if k < 4:
+                        be = req.first_be
+                    elif k >= len(data)-4:
+                        be = req.last_be
+                    else:
+                        be = 0xf
+                    if be & (1 << (k & 3)):
+                        mem[req.address+k] = data[k]
+
+            if rd_pending:
+                req = rd_pending[0]
+                cpl = Tlp.create_completion_data_for_tlp(req, PcieId(0, 0, 0))
+                cpl.byte_count = req.get_be_byte_count()
+                cpl.lower_address = (req.address+req.get_first_be_offset()) & 0x7f
+                cpl.set_data(mem[req.address & ~3:(req.address & ~3)+req.length*4])
+                await cpl_source.send(PcieIfFrame.from_tlp(cpl))
+                rd_pending.pop(0)
+
+    cocotb.start_soon(fc_logic())
+    cocotb.start_soon(rd_req_recv())
+    cocotb.start_soon(wr_req_recv())
+    cocotb.start_soon(host())
+
+    # stream a buffer through with bounded outstanding reads
+    buf = bytearray(length)
+    dev.rd_req_limit = 8
+    await dev.dma_mem_read_into(0, buf)
+    assert buf == mem[0:length]
+    assert dev.rd_req_outstanding_max <= 8
+
+    if reset:
+        # reset in the middle of a write stream, with frames queued, on the
+        # bus and partially transferred
+        wr_req_sink.pause = True
+        write = cocotb.start_soon(dev.dma_mem_write(length+0x1000, bytearray(4096)))
+        for k in range(8):
+            await RisingEdge(clk)
+        wr_req_sink.pause = False
+        for k in range(4):
+            await RisingEdge(clk)
+
+        rst.value = 1
+        dev.tx_wr_req_tlp_source.clear()
+        for k in range(4):
+            await RisingEdge(clk)
+        rst.value = 0
+
+        await write
+        await dev.tx_wr_req_tlp_source.wait()
+        while wr_pending:
+            await RisingEdge(clk)
+
+        # credits of the dropped TLPs are returned
+        for k in range(dev.fc_latency+2):
+            await RisingEdge(clk)
+        assert dev.fc_pending[FcType.P] == [0, 0]
+        assert not dev.tx_wr_req_tlp_source.current_frames
+
+    await dev.dma_mem_write(length+0x1000+3, memoryview(buf)[0:4096])
+
+    # reads may pass posted writes in this host model
+    await dev.tx_wr_req_tlp_source.wait()
+    while wr_pending:
+        await RisingEdge(clk)
+
+    data = await dev.dma_mem_read(length+0x1000+3, 4096)
+    assert data == buf[0:4096]
+
+    assert dev.rd_req_outstanding == 0
+
+
+def size_list():
+    return [0] + list(range(4, 256+4, 4)) + [0]*8 + [4]*8
+
+
+def incrementing_payload(length):
+    return bytearray(itertools.islice(itertools.cycle(range(256)), length))
+
+
+def cycle_pause():
+    return itertools.cycle([1, 1, 1, 0])
+
+
+@pytest.mark.parametrize("idle,backpressure", [(False, False), (True, False), (False, True), (True, True)])
+@pytest.mark.parametrize("data_width,seg_count", [(64, 1), (256, 1), (512, 1), (512, 2)])
+def test_pcie_if_loopback(data_width, seg_count, idle, backpressure):
+    taxi_tb.loopback.run(run_test_loopback, data_width=data_width, seg_count=seg_count,
+        payload_lengths=size_list, payload_data=incrementing_payload,
+        idle_inserter=cycle_pause if idle else None,
+        backpressure_inserter=cycle_pause if backpressure else None,
+        timeout=100, timeout_unit="us")
+
+
+@pytest.mark.parametrize("tag_count", [1, 32, 256])
+def test_pcie_if_dma_read(tag_count):
+    taxi_tb.loopback.run(run_test_dma_read, tag_count=tag_count,
+        length=max(8192, tag_count*128),
+        timeout=10, timeout_unit="ms")
+
+
+@pytest.mark.parametrize("tag_count", [32, 256, 1024])
+def test_pcie_if_tag_alloc(tag_count):
+    taxi_tb.loopback.run(run_test_tag_alloc, tag_count=tag_count,
+        timeout=100, timeout_unit="us")
+
+
+@pytest.mark.parametrize("queue_depth,fc_limit,reset", [
+    (2, None, False), (16, None, False), (16, (4, 4, 32), False), (16, (1, 1, 16), False),
+    (16, None, True), (16, (4, 4, 32), True), (16, (1, 1, 16), True)])
+def test_pcie_if_dma_stream(queue_depth, fc_limit, reset):
+    taxi_tb.loopback.run(run_test_dma_stream, queue_depth=queue_depth, fc_limit=fc_limit, reset=reset,
+        timeout=10, timeout_unit="ms")
+
+
+def test_parity():
+    rng = random.Random(1)
+
+    for length in [0, 1, 2, 3, 16, 1024]:
+        data = [rng.choice([0, 2**32-1, rng.getrandbits(32)]) for k in range(length)]
+        payload = struct.pack(f'<{length}L', *data)
+
+        assert dword_parity_bulk(payload) == [dword_parity(d) for d in data]
+        assert dword_parity_bulk(payload, odd=True) == [dword_parity(d) ^ 0xf for d in data]
+
+    for k in range(1000):
+        d = rng.getrandbits(rng.randint(0, 128))
+        assert parity_bulk(d) == parity(d)
+
+    tlp = Tlp()
+    tlp.fmt_type = TlpType.MEM_WRITE
+    tlp.set_addr_be_data(0x1000, incrementing_payload(4096))
+    frame = PcieIfFrame.from_tlp(tlp)
+
+    assert frame.parity == [dword_parity(d) ^ 0xf for d in frame.data]
+    assert frame.hdr_par == parity(frame.hdr)
+    assert frame.check_parity()
+
+    frame.data[100] ^= 0x10000
+    assert not frame.check_parity()
+    frame.update_parity()
+    assert frame.check_parity()
+    assert frame.parity[100] == dword_parity(frame.data[100]) ^ 0xf
+
+
+def test_frame_payload():
+    payload = incrementing_payload(1024)
+    dwords = [int.from_bytes(payload[k:k+4], 'little') for k in range(0, len(payload), 4)]
+
+    tlp = Tlp()
+    tlp.fmt_type = TlpType.MEM_WRITE
+    tlp.set_addr_be_data(0x1000, payload)
+    frame = PcieIfFrame.from_tlp(tlp)
+
+    assert list(frame.data) == dwords
+    assert frame.get_payload() == payload
+    assert len(frame) == len(dwords)
+    assert frame.to_tlp() == tlp
+
+    # lists of dwords and bytes are both accepted
+    frame2 = PcieIfFrame()
+    frame2.hdr = frame.hdr
+    frame2.data = dwords
+    frame2.update_parity()
+    assert frame2 == frame
+
+    frame2.data = payload
+    frame2.update_parity()
+    assert frame2 == frame
+
+    frame2.set_payload(bytes(1024))
+    assert list(frame2.data) == [0]*256
+    assert not frame2.check_parity()
+
+    # copies do not share storage
+    frame3 = PcieIfFrame(frame)
+    frame3.data[0] ^= 1
+    assert frame.data[0] == dwords[0]
+    assert frame3 != frame
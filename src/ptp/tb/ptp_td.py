@@ -391,7 +391,7 @@ class PtpTdSink(Reset):
     def get_period_ns(self):
         p = Decimal((self.period_ns << 32) | self.period_fns)
         if self.drift_denom:
-            return p + Decimal(self.drift_num) / Decimal(self.drift_denom)
+            p += Decimal(self.drift_num) / Decimal(self.drift_denom)
         return p / Decimal(2**32)
 
     def get_ts_tod(self):
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import os
+import sys
+
+import pytest
+
+from cocotb.triggers import ClockCycles
+
+try:
+    from ptp_td import PtpTdSource, PtpTdSink
+except ImportError:
+    # attempt import from current directory
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+    try:
+        from ptp_td import PtpTdSource, PtpTdSink
+    finally:
+        del sys.path[0]
+
+try:
+    import taxi_tb.loopback
+except ImportError:
+    # attempt import from taxi library root
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'lib', 'taxi'))
+    try:
+        import taxi_tb.loopback
+    finally:
+        del sys.path[0]
+
+
+async def run_test_loopback(sim, period_ns=6.4):
+
+    clk = sim.signal("clk")
+    sim.clock(clk, period_ns, "ns")
+
+    rst = sim.signal("rst")
+    data = sim.signal("ptp_td_sd")
+
+    source = PtpTdSource(data=data, clock=clk, reset=rst, period_ns=period_ns)
+    sink = PtpTdSink(data=data, clock=clk, reset=rst, period_ns=period_ns)
+
+    rst.setimmediatevalue(1)
+    await ClockCycles(clk, 4)
+    rst.value = 0
+    await ClockCycles(clk, 4)
+
+    # the sink sees the source one clock cycle later
+    def check():
+        assert sink.get_period_ns() == source.get_period_ns()
+        assert abs(source.get_ts_tod_ns() - sink.get_ts_tod_ns() - source.get_period_ns()) < 0.001
+        assert abs(source.get_ts_rel_ns() - sink.get_ts_rel_ns() - source.get_period_ns()) < 0.001
+
+    await ClockCycles(clk, 2000)
+    check()
+
+    source.set_ts_tod_s(1234.5)
+    source.set_ts_rel_ns(123456789)
+
+    await ClockCycles(clk, 2000)
+    check()
+
+    # seconds rollover
+    source.set_ts_tod_s(1235 - 1e-6)
+
+    await ClockCycles(clk, 3000)
+    check()
+    assert sink.get_ts_tod()[0] == 1235
+
+
+@pytest.mark.parametrize("period_ns", [6.4, 3.2, 4.0])
+def test_ptp_td_loopback(period_ns):
+    taxi_tb.loopback.run(run_test_loopback, period_ns=period_ns, timeout=100, timeout_unit="us")
@@ -0,0 +1,17 @@
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import os
+
+root_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+
+def cache_dir():
+    return os.path.abspath(os.getenv("SIM_CACHE_DIR", os.path.join(root_dir, ".sim_cache")))
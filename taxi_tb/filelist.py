@@ -0,0 +1,406 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import argparse
+import ast
+import json
+import os
+import re
+import sys
+import time
+
+from . import root_dir, cache_dir
+
+
+# parsed .f file contents, keyed on absolute path; entries are
+# revalidated against the file mtime on every lookup
+_f_cache = {}
+
+
+def read_f_file(fn):
+    key = os.path.abspath(fn)
+    mtime = os.stat(key).st_mtime_ns
+    c = _f_cache.get(key)
+    if c is None or c[0] != mtime:
+        with open(fn, 'r') as f:
+            c = (mtime, f.read().split())
+        _f_cache[key] = c
+    return [os.path.join(os.path.dirname(fn), x) for x in c[1]]
+
+
+def process_f_files(files, f_files=None):
+    lst = {}
+    for f in files:
+        if f[-2:].lower() == '.f':
+            if f_files is not None:
+                f_files.append(f)
+            for f in process_f_files(read_f_file(f), f_files):
+                lst[os.path.basename(f)] = f
+        else:
+            lst[os.path.basename(f)] = f
+    return list(lst.values())
+
+
+module_re = re.compile(r'^\s*(?:module|interface|package)\s+(?:automatic\s+|static\s+)?(\w+)', re.M)
+
+
+class _Unknown(Exception):
+    pass
+
+
+# placeholder for list elements that could not be evaluated
+_unknown = object()
+
+
+class _RunnerEval:
+    # minimal evaluator for the path expressions used by cocotb-test runners
+
+    def __init__(self, names):
+        self.names = dict(names)
+
+    def eval(self, node):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Name):
+            if node.id in self.names and self.names[node.id] is not None:
+                return self.names[node.id]
+            raise _Unknown(node.id)
+        if isinstance(node, ast.JoinedStr):
+            s = ""
+            for v in node.values:
+                if isinstance(v, ast.FormattedValue):
+                    s += str(self.eval(v.value))
+                else:
+                    s += str(self.eval(v))
+            return s
+        if isinstance(node, ast.List) or isinstance(node, ast.Tuple):
+            lst = []
+            for e in node.elts:
+                try:
+                    lst.append(self.eval(e))
+                except _Unknown:
+                    lst.append(_unknown)
+            return lst
+        if isinstance(node, ast.BinOp) and isinstance(node.op, ast.Add):
+            return self.eval(node.left) + self.eval(node.right)
+        if isinstance(node, ast.Subscript):
+            return self.eval(node.value)[self.eval(node.slice)]
+        if isinstance(node, ast.Call):
+            func = ast.unparse(node.func)
+            args = [self.eval(a) for a in node.args]
+            if func == 'os.path.join':
+                return os.path.join(*args)
+            if func == 'os.path.abspath':
+                return os.path.abspath(*args)
+            if func == 'os.path.dirname':
+                return os.path.dirname(*args)
+            if func == 'os.path.basename':
+                return os.path.basename(*args)
+            if func == 'os.path.splitext':
+                return os.path.splitext(*args)
+            if func.endswith('process_f_files'):
+                return args[0]
+        raise _Unknown(ast.unparse(node))
+
+    def exec(self, body):
+        for stmt in body:
+            if isinstance(stmt, ast.Assign):
+                for t in stmt.targets:
+                    if isinstance(t, ast.Name):
+                        try:
+                            val = self.eval(stmt.value)
+                        except _Unknown:
+                            val = None
+                        # merge list literals so that all branches are covered
+                        if isinstance(stmt.value, ast.List) and isinstance(self.names.get(t.id), list):
+                            val = self.names[t.id] + [x for x in val if x not in self.names[t.id]]
+                        self.names[t.id] = val
+            elif isinstance(stmt, ast.AugAssign) and isinstance(stmt.target, ast.Name):
+                try:
+                    self.names[stmt.target.id] = self.names.get(stmt.target.id) + self.eval(stmt.value)
+                except (_Unknown, TypeError):
+                    pass
+            elif isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call):
+                func = stmt.value.func
+                if isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name) and func.attr in ('append', 'extend'):
+                    lst = self.names.get(func.value.id)
+                    if isinstance(lst, list):
+                        try:
+                            val = self.eval(stmt.value.args[0])
+                        except _Unknown:
+                            continue
+                        if func.attr == 'append':
+                            lst.append(val)
+                        else:
+                            lst.extend(val)
+            elif isinstance(stmt, (ast.If, ast.For, ast.While, ast.With, ast.Try)):
+                for field in ('body', 'orelse', 'finalbody'):
+                    self.exec(getattr(stmt, field, []))
+                for h in getattr(stmt, 'handlers', []):
+                    self.exec(h.body)
+
+
+def _calls_simulator(func):
+    for node in ast.walk(func):
+        if isinstance(node, ast.Call) and ast.unparse(node.func).endswith(('sim.run', 'simulator.run')):
+            return True
+    return False
+
+
+def parse_runner(fn):
+    # statically extract toplevel and source list from a cocotb-test runner;
+    # runners whose sources cannot be determined get verilog_sources None,
+    # and None is returned if the file cannot be parsed at all
+    fn = os.path.abspath(fn)
+    try:
+        with open(fn, 'r') as f:
+            tree = ast.parse(f.read(), fn)
+    except (SyntaxError, ValueError):
+        return None
+
+    ev = _RunnerEval({'__file__': fn})
+    ev.exec([stmt for stmt in tree.body if isinstance(stmt, ast.Assign)])
+
+    runners = []
+    for stmt in tree.body:
+        if not isinstance(stmt, ast.FunctionDef) or not stmt.name.startswith('test_'):
+            continue
+        fev = _RunnerEval(ev.names)
+        fev.exec(stmt.body)
+        sources = fev.names.get('verilog_sources')
+        if not isinstance(sources, list) or _unknown in sources:
+            if sources is None and not _calls_simulator(stmt):
+                # not a runner
+                continue
+            sources = None
+        runners.append({
+            'name': stmt.name,
+            'toplevel': fev.names.get('toplevel'),
+            'dut': fev.names.get('dut'),
+            'verilog_sources': sources,
+            'python_search': fev.names.get('tests_dir'),
+        })
+    return runners
+
+
+# bump when the parse_runner output changes to invalidate cached results
+runner_cache_version = 2
+
+
+def _walk(path, match):
+    # walk source tree, skipping lib symlinks and build output
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames[:] = sorted(d for d in dirnames if d not in ('lib', 'sim_build', '__pycache__')
+            and not d.startswith('.'))
+        for fn in sorted(filenames):
+            if match(fn):
+                yield os.path.join(dirpath, fn)
+
+
+class DependencyIndex:
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or root_dir)
+
+        # RTL file -> modules defined in the file
+        self.file_modules = {}
+        # module -> RTL file
+        self.module_files = {}
+        # .f file -> resolved source files
+        self.f_files = {}
+        # testbench (test module path) -> files it depends on
+        self.tb_deps = {}
+        # testbench -> runner info
+        self.tb_runners = {}
+        # file -> testbenches that depend on it
+        self.dependents = {}
+        # testbenches with runners that could not be evaluated, these
+        # depend on every file
+        self.always = set()
+
+        self._realpath = {}
+        self._runner_cache = {}
+        self._runner_cache_dirty = False
+
+    def rel(self, fn):
+        return os.path.relpath(fn, self.root)
+
+    def real(self, fn):
+        # resolve symlinks, memoizing directories as most paths go through lib/taxi
+        d, b = os.path.split(fn)
+        r = self._realpath.get(d)
+        if r is None:
+            r = os.path.realpath(d)
+            self._realpath[d] = r
+        r = os.path.join(r, b)
+        if os.path.islink(r):
+            r = os.path.realpath(r)
+        return r
+
+    def parse_runner(self, fn):
+        # parsed runners are cached on disk, keyed on the test module mtime
+        mtime = os.stat(fn).st_mtime_ns
+        c = self._runner_cache.get(fn)
+        if c is None or c['mtime'] != mtime:
+            c = {'mtime': mtime, 'runners': parse_runner(fn)}
+            self._runner_cache[fn] = c
+            self._runner_cache_dirty = True
+        return c['runners']
+
+    def add_rtl_file(self, fn):
+        fn = self.real(fn)
+        if fn in self.file_modules:
+            return
+        try:
+            with open(fn, 'r', errors='replace') as f:
+                mods = set(module_re.findall(f.read()))
+        except OSError:
+            mods = set()
+        self.file_modules[fn] = mods
+        for m in mods:
+            self.module_files.setdefault(m, fn)
+
+    def add_f_file(self, fn):
+        srcs = process_f_files([fn])
+        self.f_files[self.real(fn)] = [self.real(x) for x in srcs]
+        for s in srcs:
+            self.add_rtl_file(s)
+
+    def add_testbench(self, fn):
+        fn = os.path.abspath(fn)
+        deps = {self.real(fn)}
+        parsed = self.parse_runner(fn)
+
+        if parsed is None or any(r['verilog_sources'] is None for r in parsed):
+            self.always.add(fn)
+        runners = [r for r in parsed or [] if r['verilog_sources'] is not None]
+
+        for r in runners:
+            f_files = []
+            try:
+                srcs = process_f_files(r['verilog_sources'], f_files)
+            except OSError:
+                srcs = [x for x in r['verilog_sources'] if os.path.exists(x)]
+            for s in srcs + f_files:
+                if os.path.exists(s):
+                    deps.add(self.real(s))
+            for s in srcs:
+                self.add_rtl_file(s)
+
+            # python modules in the search path (shared models are symlinks)
+            if r['python_search']:
+                for x in os.listdir(r['python_search']):
+                    if x.endswith('.py'):
+                        deps.add(self.real(os.path.join(r['python_search'], x)))
+
+        if not runners and fn not in self.always:
+            # model tests, depend on the models next to them
+            d = os.path.dirname(fn)
+            for x in os.listdir(d):
+                if x.endswith('.py'):
+                    deps.add(self.real(os.path.join(d, x)))
+
+        self.tb_deps[fn] = deps
+        self.tb_runners[fn] = None if parsed is None else runners
+        for d in deps:
+            self.dependents.setdefault(d, set()).add(fn)
+
+    def scan(self, cache_file=None):
+        if cache_file is None:
+            cache_file = os.path.join(cache_dir(), "runners.json")
+
+        try:
+            with open(cache_file, 'r') as f:
+                c = json.load(f)
+            if c.get('root') == self.root and c.get('version') == runner_cache_version:
+                self._runner_cache = c['runners']
+        except (OSError, ValueError, KeyError):
+            pass
+
+        src = os.path.join(self.root, 'src')
+        for fn in _walk(src, lambda x: x.endswith('.f')):
+            self.add_f_file(fn)
+        for fn in _walk(src, lambda x: x.startswith('test_') and x.endswith('.py')):
+            self.add_testbench(fn)
+
+        if self._runner_cache_dirty:
+            try:
+                os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+                with open(cache_file+f".{os.getpid()}", 'w') as f:
+                    json.dump({'root': self.root, 'version': runner_cache_version,
+                        'runners': self._runner_cache}, f)
+                os.replace(cache_file+f".{os.getpid()}", cache_file)
+            except OSError:
+                pass
+            self._runner_cache_dirty = False
+
+        return self
+
+    def known(self, fn):
+        # False for files the index has no information on, and for test
+        # modules that could not be parsed
+        fn = os.path.abspath(fn)
+        if fn in self.tb_runners:
+            return self.tb_runners[fn] is not None
+        fn = self.real(fn)
+        return fn in self.dependents or fn in self.file_modules or fn in self.f_files
+
+    def tests_for(self, fn):
+        fn = self.real(os.path.abspath(fn))
+        return sorted(self.dependents.get(fn, set()) | self.always)
+
+    def modules_in(self, fn):
+        return sorted(self.file_modules.get(self.real(os.path.abspath(fn)), set()))
+
+    def modules_for(self, tb):
+        mods = set()
+        for d in self.tb_deps.get(os.path.abspath(tb), set()):
+            mods.update(self.file_modules.get(d, set()))
+        return sorted(mods)
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    if _index is None:
+        _index = DependencyIndex().scan()
+    return _index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query testbench dependencies")
+    parser.add_argument('files', nargs='*', help="Files to look up dependent testbenches for")
+    parser.add_argument('--modules', action='store_true', help="List modules defined in each file")
+    parser.add_argument('--deps', action='store_true', help="List dependencies of testbenches instead")
+
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = get_index()
+    print(f"Indexed {len(index.tb_deps)} testbenches and {len(index.file_modules)} RTL files "
+        f"in {time.perf_counter()-start:.3f} s", file=sys.stderr)
+
+    for fn in args.files:
+        if args.deps:
+            print(f"{index.rel(os.path.abspath(fn))}:")
+            for d in sorted(index.tb_deps.get(os.path.abspath(fn), set())):
+                print(f"  {index.rel(d)}")
+        elif args.modules:
+            print(f"{fn}: {' '.join(index.modules_in(fn))}")
+        else:
+            print(f"{fn}:")
+            for tb in index.tests_for(fn):
+                print(f"  {index.rel(tb)}")
+
+
+if __name__ == '__main__':
+    main()
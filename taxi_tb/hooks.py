@@ -0,0 +1,124 @@
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+# Instrumentation hooks for the cocotb scheduler and regression manager,
+# shared by taxi_tb.telemetry and taxi_tb.profiler.  The cocotb internals
+# (Scheduler._react, Task._advance, RegressionManager._start_test and
+# _record_result) are patched once, on the first call to register(), each
+# event is passed on to every registered listener, and the original methods
+# are restored when the last listener is unregistered.
+
+import time
+
+from cocotb.regression import RegressionManager
+from cocotb.scheduler import Scheduler
+from cocotb.task import Task
+
+
+def coro_name(task):
+    coro = getattr(task, '_coro', None)
+    return getattr(coro, '__qualname__', None) or getattr(task, '__name__', repr(task))
+
+
+class Listener:
+    # override as needed; python_time is the time spent in the cocotb
+    # scheduler (and the coroutines it runs) since the start of the test
+
+    def start_test(self):
+        pass
+
+    def resume(self, task):
+        pass
+
+    def resumed(self, task):
+        pass
+
+    def end_test(self, log, test, outcome, wall_time_s, sim_time_ns, python_time):
+        pass
+
+
+_listeners = []
+_python_time = 0.0
+_originals = None
+
+
+def register(listener):
+    if not _listeners:
+        install()
+    _listeners.append(listener)
+
+
+def unregister(listener):
+    _listeners.remove(listener)
+    if not _listeners:
+        uninstall()
+
+
+def installed():
+    return _originals is not None
+
+
+def install():
+    global _originals
+    if _originals is not None:
+        return
+
+    _originals = (Scheduler._react, Task._advance,
+        RegressionManager._start_test, RegressionManager._record_result)
+    orig_react, orig_advance, orig_start_test, orig_record_result = _originals
+
+    def _react(self, trigger):
+        global _python_time
+        if self._is_reacting:
+            return orig_react(self, trigger)
+        start = time.perf_counter()
+        try:
+            return orig_react(self, trigger)
+        finally:
+            _python_time += time.perf_counter() - start
+
+    def _advance(self, outcome):
+        for listener in _listeners:
+            listener.resume(self)
+        try:
+            return orig_advance(self, outcome)
+        finally:
+            for listener in reversed(_listeners):
+                listener.resumed(self)
+
+    def _start_test(self):
+        global _python_time
+        _python_time = 0.0
+        for listener in _listeners:
+            listener.start_test()
+        return orig_start_test(self)
+
+    def _record_result(self, test, outcome, wall_time_s, sim_time_ns):
+        for listener in _listeners:
+            try:
+                listener.end_test(self.log, test, outcome, wall_time_s, sim_time_ns, _python_time)
+            except Exception:
+                self.log.exception("Failed to run %s", type(listener).__name__)
+        return orig_record_result(self, test, outcome, wall_time_s, sim_time_ns)
+
+    Scheduler._react = _react
+    Task._advance = _advance
+    RegressionManager._start_test = _start_test
+    RegressionManager._record_result = _record_result
+
+
+def uninstall():
+    global _originals
+    if _originals is None:
+        return
+
+    (Scheduler._react, Task._advance,
+        RegressionManager._start_test, RegressionManager._record_result) = _originals
+    _originals = None
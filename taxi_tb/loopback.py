@@ -0,0 +1,315 @@
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+# Simulator-free backend for the testbench models.  Signals are plain Python
+# objects with the parts of the cocotb handle interface that the models use
+# (value, setimmediatevalue, len), and a small event loop stands in for the
+# simulator underneath the regular cocotb scheduler, so tasks, triggers,
+# queues, events, and deferred writes behave as they do in a simulation.
+# Connecting a source model and a sink model to the same signals runs them
+# back to back at the speed of the models, for unit tests of the models and
+# for throughput benchmarks:
+#
+#   async def loopback(sim):
+#       clk = sim.signal("clk")
+#       sim.clock(clk, 6.4, "ns")
+#       data = sim.signal("data", 64)
+#       hdr = sim.signal("hdr", 2)
+#       source = BaseRSerdesSource(data, hdr, clk)
+#       sink = BaseRSerdesSink(data, hdr, clk)
+#       ...
+#
+#   taxi_tb.loopback.run(loopback)
+
+import heapq
+import itertools
+import logging
+
+import cocotb
+import cocotb.triggers
+import cocotb.utils
+from cocotb.result import SimTimeoutError
+from cocotb.scheduler import Scheduler
+from cocotb.utils import get_sim_steps
+
+
+class Callback:
+    __slots__ = ('func', 'args', 'active')
+
+    def __init__(self, func, args):
+        self.func = func
+        self.args = args
+        self.active = True
+
+    def deregister(self):
+        self.active = False
+
+    def fire(self):
+        if self.active:
+            self.active = False
+            self.func(*self.args)
+
+
+class Signal:
+    def __init__(self, sim, name, width=1, value=0):
+        self._sim = sim
+        self._path = name
+        self._name = name.rsplit('.', 1)[-1]
+        self._handle = self
+        self._width = width
+        self._mask = 2**width-1
+        self._value = value & self._mask
+        self._prev = None
+        self._edge_cbs = []
+
+    def __len__(self):
+        return self._width
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self._path!r}, width={self._width}, value={self._value:#x})"
+
+    @property
+    def value(self):
+        return self._value
+
+    @value.setter
+    def value(self, value):
+        # applied in the ReadWrite phase, as for simulator handles
+        cocotb.scheduler._schedule_write(self, self._set, value)
+
+    def setimmediatevalue(self, value):
+        self._set(value)
+
+    def _set(self, value):
+        value = int(value) & self._mask
+        if value != self._value:
+            if self._prev is None:
+                self._prev = self._value
+                self._sim._changed.append(self)
+            self._value = value
+
+
+class Entity:
+    def __init__(self, sim, name, signals=None):
+        self._sim = sim
+        self._name = name
+        self._path = name
+        self._log = logging.getLogger(f"cocotb.{name}")
+
+        for k, v in (signals or {}).items():
+            self.add_signal(k, v)
+
+    def add_signal(self, name, width=1, value=0):
+        sig = Signal(self._sim, f"{self._path}.{name}", width, value)
+        setattr(self, name, sig)
+        return sig
+
+
+class Clock:
+    def __init__(self, sim, signal, period, units="step"):
+        self.sim = sim
+        self.signal = signal
+        self.period = get_sim_steps(period, units)
+        self.high = self.period // 2
+        self.low = self.period - self.high
+        self.cb = None
+
+    def start(self, start_high=True):
+        self.stop()
+        self.signal._set(start_high)
+        self.cb = self.sim.register_timed_callback(self.high if start_high else self.low, self._toggle)
+
+    def stop(self):
+        if self.cb is not None:
+            self.cb.deregister()
+            self.cb = None
+
+    def _toggle(self):
+        v = self.signal._value ^ 1
+        self.signal._set(v)
+        self.cb = self.sim.register_timed_callback(self.high if v else self.low, self._toggle)
+
+
+class Sim:
+    def __init__(self, precision=-12):
+        self.precision = precision
+        self.time = 0
+
+        self._seq = itertools.count()
+        self._timed = []
+        self._changed = []
+        self._rw = []
+        self._ro = []
+        self._next = []
+
+        self.scheduler = None
+        self._saved = None
+        self._done = False
+
+    # GPI functions used by cocotb.triggers and cocotb.utils
+
+    def get_precision(self):
+        return self.precision
+
+    def get_sim_time(self):
+        return (self.time >> 32) & 0xffffffff, self.time & 0xffffffff
+
+    def register_timed_callback(self, steps, func, *args):
+        cb = Callback(func, args)
+        heapq.heappush(self._timed, (self.time + steps, next(self._seq), cb))
+        return cb
+
+    def register_value_change_callback(self, signal, func, edge, *args):
+        cb = Callback(func, args)
+        if len(signal._edge_cbs) > 64:
+            signal._edge_cbs = [x for x in signal._edge_cbs if x[1].active]
+        signal._edge_cbs.append((edge, cb))
+        return cb
+
+    def register_rwsynch_callback(self, func, *args):
+        cb = Callback(func, args)
+        self._rw.append(cb)
+        return cb
+
+    def register_readonly_callback(self, func, *args):
+        cb = Callback(func, args)
+        self._ro.append(cb)
+        return cb
+
+    def register_nextstep_callback(self, func, *args):
+        cb = Callback(func, args)
+        self._next.append(cb)
+        return cb
+
+    # testbench interface
+
+    def signal(self, name, width=1, value=0):
+        return Signal(self, name, width, value)
+
+    def entity(self, name, signals=None):
+        return Entity(self, name, signals)
+
+    def clock(self, signal, period, units="step", start_high=True):
+        clk = Clock(self, signal, period, units)
+        clk.start(start_high)
+        return clk
+
+    def install(self):
+        self._saved = (cocotb.triggers.simulator, cocotb.utils.simulator,
+            cocotb.utils._get_simulator_precision, cocotb.scheduler)
+        cocotb.triggers.simulator = self
+        cocotb.utils.simulator = self
+        cocotb.utils._get_simulator_precision = self.get_precision
+        self.scheduler = cocotb.scheduler = Scheduler(handle_result=self._handle_result)
+
+    def uninstall(self):
+        (cocotb.triggers.simulator, cocotb.utils.simulator,
+            cocotb.utils._get_simulator_precision, cocotb.scheduler) = self._saved
+        self._saved = None
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, *args):
+        self.uninstall()
+
+    def _handle_result(self, test):
+        self._done = True
+
+    def _settle(self):
+        # delta cycles: edges on changed signals, then writes, until stable
+        while True:
+            if self._changed:
+                changed, self._changed = self._changed, []
+                for sig in changed:
+                    prev, sig._prev = sig._prev, None
+                    new = sig._value
+                    if new == prev or not sig._edge_cbs:
+                        continue
+                    rising = (new & 1) and not (prev & 1)
+                    falling = (prev & 1) and not (new & 1)
+                    cbs, sig._edge_cbs = sig._edge_cbs, []
+                    for edge, cb in cbs:
+                        if not cb.active:
+                            continue
+                        if edge == 3 or (edge == 1 and rising) or (edge == 2 and falling):
+                            cb.fire()
+                        else:
+                            sig._edge_cbs.append((edge, cb))
+            elif self._rw:
+                cbs, self._rw = self._rw, []
+                for cb in cbs:
+                    cb.fire()
+            else:
+                return
+
+    def _fire(self, cbs):
+        for cb in cbs:
+            cb.fire()
+        self._settle()
+
+    def _step(self):
+        while self._timed and not self._timed[0][2].active:
+            heapq.heappop(self._timed)
+        if not self._timed:
+            return False
+
+        self.time = self._timed[0][0]
+
+        if self._next:
+            cbs, self._next = self._next, []
+            self._fire(cbs)
+
+        while self._timed and self._timed[0][0] <= self.time:
+            heapq.heappop(self._timed)[2].fire()
+        self._settle()
+
+        if self._ro:
+            cbs, self._ro = self._ro, []
+            self._fire(cbs)
+
+        return True
+
+    def next_time(self):
+        while self._timed and not self._timed[0][2].active:
+            heapq.heappop(self._timed)
+        return self._timed[0][0] if self._timed else None
+
+    def run(self, coro, timeout=None, timeout_unit="step"):
+        # run coroutine as a cocotb test until it completes, returns its result
+        limit = None
+        if timeout is not None:
+            limit = self.time + get_sim_steps(timeout, timeout_unit)
+
+        test = self.scheduler.create_task(coro)
+        self._done = False
+        self.scheduler._add_test(test)
+        self._settle()
+
+        aborted = False
+        while not self._done:
+            t = self.next_time()
+            if not aborted and t is None:
+                aborted = True
+                self.scheduler._finish_test(RuntimeError("No pending events, test cannot complete"))
+            elif not aborted and limit is not None and t > limit:
+                aborted = True
+                self.scheduler._finish_test(SimTimeoutError(f"Timed out after {timeout} {timeout_unit}"))
+            elif not self._step():
+                break
+
+        return test.result()
+
+
+def run(test, *args, precision=-12, timeout=None, timeout_unit="step", **kwargs):
+    # run test(sim, *args, **kwargs) on a new Sim
+    with Sim(precision) as sim:
+        return sim.run(test(sim, *args, **kwargs), timeout, timeout_unit)
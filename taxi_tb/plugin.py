@@ -0,0 +1,253 @@
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import json
+import os
+import subprocess
+import types
+
+import pytest
+
+from . import root_dir
+from . import filelist
+from . import shard
+from . import sim
+from . import timing
+
+
+timing_key = pytest.StashKey()
+shard_key = pytest.StashKey()
+
+
+# changes to these affect every testbench
+global_inputs = [
+    os.path.join(root_dir, 'taxi_tb'),
+    os.path.join(root_dir, 'tox.ini'),
+    os.path.join(root_dir, 'conftest.py'),
+]
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("taxi", "taxi testbench options")
+    group.addoption("--changed", action="append", default=[], metavar="FILE",
+        help="only run testbenches that depend on FILE (may be repeated)")
+    group.addoption("--changed-since", action="store", default=None, metavar="REF",
+        help="only run testbenches affected by changes since git REF, including uncommitted changes")
+    group.addoption("--sim-plan", action="store", default=None, metavar="FILE",
+        help="write the simulator arguments of each collected test to FILE (used by taxi_tb.sched)")
+    group.addoption("--store-timings", action="store_true", default=False,
+        help="record compile and simulation times of each test in the timing store")
+    group.addoption("--timings-path", action="store", default=None, metavar="FILE",
+        help="timing store used for ordering and splitting tests (default: .test_timings)")
+    group.addoption("--no-timing-order", action="store_true", default=False,
+        help="run tests in collection order instead of longest first")
+    group.addoption("--sim-telemetry", action="store", default=None, metavar="DIR",
+        help="write simulation performance telemetry for each test to DIR")
+    group.addoption("--sim-profile", action="store", default=None, metavar="DIR",
+        help="profile the time spent in each coroutine, writing collapsed stacks and a summary per test to DIR")
+    group.addoption("--sim-parallel", action="store", default=None, metavar="N",
+        help="split the cocotb tests of each simulation across N simulator processes sharing one build ('auto' for one per core)")
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_configure(config):
+    config.addinivalue_line("markers",
+        "shards(n): run the test as n shards, passing a taxi_tb.shard.Shard as the 'shard' argument")
+
+    if not hasattr(config, "workerinput"):
+        config.stash[shard_key] = shard.freeze()
+
+    config.stash[timing_key] = timing.TimingStore(config.getoption("timings_path"))
+
+    if config.getoption("sim_telemetry"):
+        os.environ["SIM_TELEMETRY"] = os.path.abspath(config.getoption("sim_telemetry"))
+
+    if config.getoption("sim_profile"):
+        os.environ["SIM_PROFILE"] = os.path.abspath(config.getoption("sim_profile"))
+
+    if config.getoption("sim_parallel"):
+        os.environ["SIM_PARALLEL"] = config.getoption("sim_parallel")
+
+    if config.getoption("no_timing_order"):
+        return
+
+    # with tests ordered longest first, handing them out one at a time gives
+    # longest-processing-time-first scheduling across xdist workers
+    if getattr(config.option, "dist", "no") != "no" and getattr(config.option, "maxschedchunk", 0) is None:
+        config.option.maxschedchunk = 1
+
+
+def git_changed_files(ref, cwd=root_dir):
+    top = subprocess.run(["git", "rev-parse", "--show-toplevel"], cwd=cwd,
+        capture_output=True, text=True, check=True).stdout.strip()
+    files = set()
+    for cmd in [["git", "diff", "--name-only", ref, "--"],
+            ["git", "ls-files", "--others", "--exclude-standard"]]:
+        out = subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, check=True).stdout
+        files.update(os.path.join(top, x) for x in out.split('\n') if x)
+    return sorted(files)
+
+
+def affected_testbenches(changed, index=None):
+    # returns None if every testbench is affected
+    if index is None:
+        index = filelist.get_index()
+
+    tbs = set()
+    for fn in changed:
+        fn = os.path.realpath(os.path.abspath(fn))
+        for g in global_inputs:
+            if fn == g or fn.startswith(g + os.sep):
+                return None
+        if not index.known(fn):
+            # could be anything, including a deleted dependency
+            return None
+        tbs.update(index.tests_for(fn))
+    return tbs
+
+
+def pytest_unconfigure(config):
+    fn = config.stash.get(shard_key, None)
+    if fn:
+        os.remove(fn)
+        del os.environ[shard.SNAPSHOT_ENV]
+
+
+@pytest.hookimpl(trylast=True)
+def pytest_generate_tests(metafunc):
+    m = metafunc.definition.get_closest_marker("shards")
+    if m is not None and "shard" in metafunc.fixturenames:
+        metafunc.parametrize("shard", shard.shards(*m.args, **m.kwargs), ids=str)
+
+
+def select_changed(config, items):
+    changed = [os.path.abspath(x) for x in config.getoption("changed")]
+    ref = config.getoption("changed_since")
+
+    if not changed and ref is None:
+        return
+
+    if ref is not None:
+        changed += git_changed_files(ref)
+
+    tbs = affected_testbenches(changed)
+
+    if tbs is None:
+        return
+
+    selected = []
+    deselected = []
+    for item in items:
+        if os.path.abspath(str(item.path)) in tbs:
+            selected.append(item)
+        else:
+            deselected.append(item)
+
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+        items[:] = selected
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_collection_modifyitems(session, config, items):
+    select_changed(config, items)
+
+    store = config.stash[timing_key]
+
+    split = config.pluginmanager.get_plugin("pytestsplitplugin")
+    if split is not None:
+        # balance pytest-split groups on recorded compile and simulation times
+        split.cached_durations = store.durations([item.nodeid for item in items])
+
+    yield
+
+    if config.getoption("no_timing_order") or not (store.timings or store.legacy):
+        return
+
+    # longest first, the sort is stable so ties keep collection order
+    durations = store.durations([item.nodeid for item in items])
+    items.sort(key=lambda item: -durations[item.nodeid])
+
+
+def capture_runner(item):
+    # call the cocotb-test runner with simulation disabled to get its arguments
+    args = dict(item.callspec.params) if hasattr(item, 'callspec') else {}
+    if 'request' in item._fixtureinfo.argnames:
+        args['request'] = types.SimpleNamespace(node=item, config=item.config)
+
+    with sim.capture() as captured:
+        try:
+            item.obj(**args)
+        except sim.Captured:
+            pass
+
+    return captured[0] if captured else None
+
+
+def pytest_collection_finish(session):
+    fn = session.config.getoption("sim_plan")
+    if not fn:
+        return
+
+    plan = []
+    for item in session.items:
+        entry = {'nodeid': item.nodeid}
+        try:
+            entry['kwargs'] = capture_runner(item)
+        except Exception as e:
+            entry['error'] = repr(e)
+        plan.append(entry)
+
+    with open(fn, 'w') as f:
+        json.dump({'rootdir': str(session.config.rootpath), 'tests': plan}, f, indent=4)
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item):
+    with sim.record() as records:
+        yield
+
+    if not records or not item.config.getoption("store_timings"):
+        return
+
+    rec = {'compile_time': 0, 'sim_wall_time': 0, 'sim_time': 0, 'tests': 0}
+    for stats in records:
+        if stats.get('compile_time') is None:
+            rec['compile_time'] = None
+        elif rec['compile_time'] is not None:
+            rec['compile_time'] += stats['compile_time']
+        rec['sim_wall_time'] += stats.get('sim_wall_time', 0)
+        if 'build' in stats:
+            rec['build'] = stats['build']
+        tests, sim_time = timing.results_summary(stats.get('results'))
+        if tests is not None:
+            rec['tests'] += tests
+            rec['sim_time'] += sim_time
+
+    item.user_properties.append(("sim_timing", rec))
+
+
+timing_records = {}
+
+
+def pytest_runtest_logreport(report):
+    if report.when != "call":
+        return
+    for name, value in report.user_properties:
+        if name == "sim_timing":
+            timing_records[report.nodeid] = value
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if not config.getoption("store_timings") or hasattr(config, "workerinput"):
+        return
+    if timing_records:
+        config.stash[timing_key].update(timing_records)
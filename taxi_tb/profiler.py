@@ -0,0 +1,138 @@
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+# Coroutine-level profiler.  When listed first in MODULE with TAXI_PROFILE
+# set to an output path prefix, this measures the wall-clock time spent
+# running each cocotb coroutine and, for each cocotb test, writes
+#
+#   <prefix>.<test>.folded  collapsed stacks for flamegraph.pl or speedscope
+#   <prefix>.<test>.txt     summary table, also written to the test log
+#
+# Stacks are test;task coroutine;awaited coroutines, where the awaited
+# coroutines are those the task was suspended in when it was resumed.
+# Time spent in the simulator and in the cocotb scheduler itself is
+# reported as [simulator] and [cocotb].
+
+import os
+import re
+import time
+
+import cocotb
+
+from . import root_dir
+from . import hooks
+
+
+PREFIX_ENV = "TAXI_PROFILE"
+DIR_ENV = "SIM_PROFILE"
+
+
+def await_chain(coro):
+    names = []
+    c = getattr(coro, 'cr_await', None)
+    while c is not None and hasattr(c, 'cr_code'):
+        names.append(c.__qualname__)
+        c = c.cr_await
+    return tuple(names)
+
+
+class Profiler(hooks.Listener):
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.start_test()
+
+    def start_test(self):
+        self.stacks = {}
+        self.tasks = {}
+        self.active = []
+        self.start_time = time.perf_counter()
+
+    def resume(self, task):
+        stack = (hooks.coro_name(task),) + await_chain(getattr(task, '_coro', None))
+        # [stack, start time, time in nested resumes]
+        self.active.append([stack, time.perf_counter(), 0.0])
+
+    def resumed(self, task):
+        stack, start, nested = self.active.pop()
+        dt = time.perf_counter() - start
+        if self.active:
+            self.active[-1][2] += dt
+        dt -= nested
+
+        self.stacks[stack] = self.stacks.get(stack, 0.0) + dt
+        t = self.tasks.setdefault(stack[0], [0, 0.0])
+        t[0] += 1
+        t[1] += dt
+
+    def summary(self, wall_time, python_time):
+        coro_time = sum(t for c, t in self.tasks.values())
+        rows = sorted(self.tasks.items(), key=lambda x: -x[1][1])
+        rows.append(("[cocotb]", [0, max(python_time - coro_time, 0.0)]))
+        rows.append(("[simulator]", [0, max(wall_time - python_time, 0.0)]))
+
+        lines = [f"{'time (s)':>10} {'%':>6} {'resumes':>10} {'us/resume':>10}  coroutine"]
+        for name, (count, t) in rows:
+            pct = t / wall_time if wall_time else 0
+            per = f"{t / count * 1e6:10.1f}" if count else f"{'':10}"
+            lines.append(f"{t:10.3f} {pct:6.1%} {count:10} {per}  {name}")
+        return lines
+
+    def write(self, test, python_time):
+        wall_time = time.perf_counter() - self.start_time
+        name = re.sub(r'[^\w\-.]+', '_', test.__qualname__)
+
+        with open(f"{self.prefix}.{name}.folded", 'w') as f:
+            root = test.__qualname__
+            for stack, t in sorted(self.stacks.items()):
+                us = int(t * 1e6)
+                if us:
+                    f.write(";".join((root,) + stack) + f" {us}\n")
+            f.write(f"{root};[cocotb] {int(max(python_time - sum(self.stacks.values()), 0) * 1e6)}\n")
+            f.write(f"{root};[simulator] {int(max(wall_time - python_time, 0) * 1e6)}\n")
+
+        lines = self.summary(wall_time, python_time)
+        with open(f"{self.prefix}.{name}.txt", 'w') as f:
+            f.write(f"{test.__module__}.{test.__qualname__}: {wall_time:.3f} s\n")
+            f.write("\n".join(lines) + "\n")
+
+        return lines
+
+    def end_test(self, log, test, outcome, wall_time_s, sim_time_ns, python_time):
+        if test.__module__ == "taxi_tb.testlist":
+            return
+        lines = self.write(test, python_time)
+        log.info("Profile of %s:\n%s", test.__qualname__, "\n".join(lines[:20]))
+
+
+# runner side
+
+def enabled():
+    return bool(os.getenv(DIR_ENV))
+
+
+def prepare(work_dir, kwargs):
+    # returns run() arguments that load this module ahead of the tests
+    nodeid = os.getenv("PYTEST_CURRENT_TEST", "").rsplit(" (", 1)[0] or os.path.basename(work_dir)
+    out_dir = os.path.abspath(os.getenv(DIR_ENV))
+    os.makedirs(out_dir, exist_ok=True)
+
+    kwargs = dict(kwargs)
+    kwargs['module'] = __name__ + "," + kwargs['module']
+    kwargs['python_search'] = list(kwargs.get('python_search') or []) + [root_dir]
+    kwargs['extra_env'] = dict(kwargs.get('extra_env') or {},
+        **{PREFIX_ENV: os.path.join(out_dir, re.sub(r'[^\w\-.]+', '_', nodeid))})
+    return kwargs
+
+
+_profiler = None
+
+if os.getenv(PREFIX_ENV) and cocotb.top is not None:
+    _profiler = Profiler(os.getenv(PREFIX_ENV))
+    hooks.register(_profiler)
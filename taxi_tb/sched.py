@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import argparse
+import heapq
+import json
+import logging
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from xml.etree import ElementTree as ET
+
+from . import root_dir, cache_dir
+from . import shard
+from . import sim
+from . import timing
+
+
+class Build:
+    def __init__(self, key, kwargs):
+        self.key = key
+        self.kwargs = kwargs
+        self.tests = []
+        self.compile_time = 0
+        self.sim_time = 0
+        self.error = None
+
+    def cost(self):
+        return self.compile_time + self.sim_time
+
+
+class Test:
+    def __init__(self, nodeid, build=None, duration=0):
+        self.nodeid = nodeid
+        self.build = build
+        self.duration = duration
+        self.result = None
+        self.wall_time = 0
+        self.log_file = None
+        self.junit_file = None
+
+
+class Scheduler:
+    # two-phase scheduler: a compile pool (memory-bounded by CompileSlots) feeds
+    # a simulation pool bounded by the number of cores
+
+    def __init__(self, sim_jobs=None, compile_jobs=None, log_dir=None, store_timings=False):
+        cpus = os.cpu_count() or 1
+
+        self.sim_jobs = sim_jobs or cpus
+        self.compile_jobs = compile_jobs or max(1, cpus // 2)
+        self.log_dir = os.path.abspath(log_dir or os.path.join(cache_dir(), "logs"))
+
+        self.cache = sim.get_cache()
+        self.timings = timing.TimingStore()
+        self.store_timings = store_timings
+
+        self.builds = []
+        self.tests = []
+
+        self.lock = threading.Condition()
+        self.build_queue = []
+        self.sim_queue = []
+        self.builds_pending = 0
+        self.seq = 0
+
+        self.log = logging.getLogger("taxi_tb.sched")
+
+    def plan(self, args):
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, "plan.json")
+            cmd = [sys.executable, "-m", "pytest", "--collect-only", "-q", "-p", "no:xdist",
+                "--sim-plan", fn] + args
+            ret = subprocess.run(cmd, cwd=root_dir, stdout=subprocess.DEVNULL)
+            if not os.path.exists(fn):
+                raise SystemExit(f"Test collection failed ({ret.returncode})")
+            with open(fn, 'r') as f:
+                plan = json.load(f)
+
+        durations = self.timings.durations([e['nodeid'] for e in plan['tests']], cached=True)
+
+        builds = {}
+        for entry in plan['tests']:
+            kwargs = entry.get('kwargs')
+            test = Test(entry['nodeid'], duration=durations[entry['nodeid']])
+            self.tests.append(test)
+
+            if not kwargs or os.getenv("SIM", kwargs.get('simulator')) != "verilator":
+                # no prebuild possible, run as-is
+                continue
+
+            kwargs = dict(kwargs)
+            kwargs.pop('simulator', None)
+            kwargs.pop('sim_build', None)
+
+            key = self.cache.key(kwargs)
+            b = builds.get(key)
+            if b is None:
+                b = Build(key, kwargs)
+                b.compile_time = (self.timings.compile_time(test.nodeid) or
+                    self.cache.estimate(kwargs)['compile_time'])
+                builds[key] = b
+                self.builds.append(b)
+            b.tests.append(test)
+            b.sim_time += test.duration
+            test.build = b
+
+        self.log.info("Planned %d tests using %d builds", len(self.tests), len(self.builds))
+
+    def _push_sim(self, test, prio):
+        heapq.heappush(self.sim_queue, (-prio, self.seq, test))
+        self.seq += 1
+
+    def _compile_worker(self):
+        while True:
+            with self.lock:
+                if not self.build_queue:
+                    return
+                b = self.build_queue.pop(0)
+
+            start = time.perf_counter()
+            b.error = "compile did not complete"
+            try:
+                b.error = self._compile(b)
+            except Exception as e:
+                b.error = repr(e)
+            finally:
+                # always release the simulation workers waiting on this build
+                with self.lock:
+                    self.builds_pending -= 1
+                    if b.error:
+                        self.log.error("Build %s failed (%s)", b.key, b.error)
+                        for t in b.tests:
+                            t.result = "error"
+                    else:
+                        self.log.info("Built %s in %.1f s, %d tests ready", b.key,
+                            time.perf_counter()-start, len(b.tests))
+                        # longest tests first
+                        for t in b.tests:
+                            self._push_sim(t, t.duration)
+                    self.lock.notify_all()
+
+    def _compile(self, b):
+        if self.cache.load_meta(b.key) is not None:
+            return None
+
+        # compile in a separate process so that peak memory can be measured
+        fd, fn = tempfile.mkstemp(suffix=".json")
+        with os.fdopen(fd, 'w') as f:
+            json.dump(b.kwargs, f)
+        log_file = os.path.join(self.log_dir, f"build-{b.key}.log")
+        try:
+            with open(log_file, 'w') as lf:
+                ret = subprocess.run([sys.executable, "-m", "taxi_tb.sim", "build", fn],
+                    cwd=root_dir, stdout=lf, stderr=subprocess.STDOUT)
+        finally:
+            os.remove(fn)
+        if ret.returncode:
+            return f"see {log_file}"
+        return None
+
+    def _sim_worker(self):
+        while True:
+            with self.lock:
+                while not self.sim_queue and self.builds_pending:
+                    self.lock.wait()
+                if not self.sim_queue:
+                    return
+                prio, seq, t = heapq.heappop(self.sim_queue)
+
+            try:
+                self._run_test(t)
+            except Exception as e:
+                t.result = "error"
+                self.log.error("ERROR %s (%r)", t.nodeid, e)
+
+    def _run_test(self, t):
+        name = re.sub(r'[^\w\-.]+', '_', t.nodeid)
+        t.log_file = os.path.join(self.log_dir, f"{name}.log")
+        t.junit_file = os.path.join(self.log_dir, f"{name}.xml")
+
+        cmd = [sys.executable, "-m", "pytest", "-q", "-p", "no:xdist", "-p", "no:cacheprovider",
+            f"--junitxml={t.junit_file}", t.nodeid]
+        if self.store_timings:
+            cmd.append("--store-timings")
+
+        start = time.perf_counter()
+        with open(t.log_file, 'w') as lf:
+            ret = subprocess.run(cmd, cwd=root_dir, stdout=lf, stderr=subprocess.STDOUT)
+        t.wall_time = time.perf_counter() - start
+        t.result = "passed" if ret.returncode == 0 else "failed"
+
+        self.log.info("%s %s (%.1f s)", t.result.upper(), t.nodeid, t.wall_time)
+
+    def run(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+
+        # longest builds first, counting the simulations that depend on them
+        self.build_queue = sorted(self.builds, key=lambda b: b.cost(), reverse=True)
+        self.builds_pending = len(self.build_queue)
+
+        for t in self.tests:
+            if t.build is None:
+                self._push_sim(t, t.duration)
+
+        threads = [threading.Thread(target=self._compile_worker) for k in range(self.compile_jobs)]
+        threads += [threading.Thread(target=self._sim_worker) for k in range(self.sim_jobs)]
+
+        start = time.perf_counter()
+        for th in threads:
+            th.start()
+        for th in threads:
+            th.join()
+        elapsed = time.perf_counter() - start
+
+        counts = {}
+        for t in self.tests:
+            counts[t.result] = counts.get(t.result, 0) + 1
+
+        self.log.info("Ran %d tests in %.1f s: %s", len(self.tests), elapsed,
+            ", ".join(f"{v} {k}" for k, v in sorted(counts.items())))
+
+        for t in self.tests:
+            if t.result != "passed":
+                self.log.info("%s %s (%s)", t.result.upper(), t.nodeid, t.log_file or (t.build and t.build.error))
+
+        return all(t.result == "passed" for t in self.tests)
+
+    def write_junit(self, fn):
+        root = ET.Element("testsuites")
+        for t in self.tests:
+            if t.junit_file and os.path.exists(t.junit_file):
+                for ts in ET.parse(t.junit_file).getroot().iter("testsuite"):
+                    root.append(ts)
+        ET.ElementTree(root).write(fn, encoding="utf-8", xml_declaration=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-phase compile/simulate test scheduler",
+        epilog="Remaining arguments are passed to pytest for test selection")
+    parser.add_argument('-j', '--sim-jobs', type=int, default=None,
+        help="Number of concurrent simulations (default: number of cores)")
+    parser.add_argument('--compile-jobs', type=int, default=None,
+        help="Maximum number of concurrent compiles (default: half the number of cores)")
+    parser.add_argument('--compile-mem', default=None,
+        help="Memory budget for concurrent compiles (default: 75%% of physical memory)")
+    parser.add_argument('--log-dir', default=None, help="Directory for build and test logs")
+    parser.add_argument('--junitxml', default=None, help="Write merged JUnit report")
+    parser.add_argument('--store-timings', action='store_true',
+        help="Record compile and simulation times in the timing store")
+
+    args, pytest_args = parser.parse_known_args()
+
+    logging.basicConfig(format="%(asctime)s %(levelname)s %(message)s", level=logging.INFO)
+
+    if args.compile_mem:
+        # inherited by the build processes
+        os.environ["SIM_COMPILE_MEM"] = args.compile_mem
+
+    snapshot = shard.freeze()
+
+    sched = Scheduler(sim_jobs=args.sim_jobs, compile_jobs=args.compile_jobs, log_dir=args.log_dir,
+        store_timings=args.store_timings)
+    sched.plan(pytest_args)
+    try:
+        ok = sched.run()
+    finally:
+        if snapshot:
+            os.remove(snapshot)
+
+    if args.junitxml:
+        sched.write_junit(args.junitxml)
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
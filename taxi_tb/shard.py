@@ -0,0 +1,214 @@
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+# Splitting the iteration space of a long-running cocotb test across several
+# simulations.  The runner is marked with @pytest.mark.shards(N) and takes a
+# 'shard' argument, which pytest parametrizes with N Shard objects; the
+# runner passes shard.env() to the simulation via extra_env.  In the cocotb
+# test, wrapping a loop with items() selects the items for the current shard.
+#
+# Every item is timed and the costs are kept in the build cache, so later
+# runs assign items to shards by measured cost instead of round-robin.
+
+import json
+import os
+import sys
+import time
+
+from . import cache_dir
+from . import sim
+
+
+INDEX_ENV = "SHARD_INDEX"
+COUNT_ENV = "SHARD_COUNT"
+COSTS_ENV = "SHARD_COSTS"
+SNAPSHOT_ENV = "SHARD_COSTS_SNAPSHOT"
+
+COST_FILE = "shard_costs.json"
+
+
+class Shard:
+    def __init__(self, index=0, count=1):
+        self.index = index
+        self.count = count
+
+    def env(self):
+        return {INDEX_ENV: str(self.index), COUNT_ENV: str(self.count)}
+
+    def __str__(self):
+        return str(self.index)
+
+    def __repr__(self):
+        return f"Shard({self.index}, {self.count})"
+
+
+def shards(count):
+    return [Shard(k, count) for k in range(count)]
+
+
+def current():
+    return Shard(int(os.getenv(INDEX_ENV, 0)), int(os.getenv(COUNT_ENV, 1)))
+
+
+def assign(n, count, costs=None):
+    # indices of the items in each shard; round-robin without cost
+    # information, otherwise balanced on cost
+    if not costs:
+        return [list(range(k, n, count)) for k in range(count)]
+    default = sum(costs.values()) / len(costs)
+    groups = sim.lpt_groups({k: costs.get(k, default) for k in range(n)}, count)
+    return [sorted(g) for c, g in groups]
+
+
+# simulator side
+
+_measured = {}
+
+
+def _load_costs():
+    fn = os.getenv(COSTS_ENV)
+    if not fn:
+        return {}
+    try:
+        with open(fn, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_measured():
+    with open(COST_FILE + ".tmp", 'w') as f:
+        json.dump(_measured, f)
+    os.replace(COST_FILE + ".tmp", COST_FILE)
+
+
+def items(iterable, name=None):
+    # yield the items of iterable that belong to the current shard
+    if name is None:
+        name = sys._getframe(1).f_code.co_name
+
+    lst = list(iterable)
+    n = len(lst)
+    shard = current()
+
+    costs = _load_costs().get(name)
+    if not costs or costs.get('n') != n:
+        costs = None
+    else:
+        costs = {int(k): v for k, v in costs['costs'].items()}
+
+    sel = assign(n, shard.count, costs)[shard.index]
+
+    if not os.getenv(COSTS_ENV):
+        # not started by the runner, nowhere to report costs
+        for k in sel:
+            yield lst[k]
+        return
+
+    m = _measured.setdefault(name, {'n': n, 'costs': {}})
+    if m['n'] != n:
+        m['n'] = n
+        m['costs'] = {}
+
+    try:
+        for k in sel:
+            start = time.perf_counter()
+            yield lst[k]
+            m['costs'][str(k)] = m['costs'].get(str(k), 0) + time.perf_counter() - start
+    finally:
+        _save_measured()
+
+
+# runner side
+
+_snapshot = None
+
+
+def cost_path():
+    return os.path.join(cache_dir(), "shard_costs.json")
+
+
+def freeze():
+    # copy the cost table for the processes started from here (xdist workers,
+    # scheduler jobs), so that every shard of a test sees the same table and
+    # the shards stay disjoint; returns the copy, or None if already frozen
+    if os.getenv(SNAPSHOT_ENV):
+        return None
+    fn = os.path.join(cache_dir(), f"shard_costs.{os.getpid()}.json")
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    with open(fn, 'w') as f:
+        json.dump(snapshot(), f)
+    os.environ[SNAPSHOT_ENV] = fn
+    return fn
+
+
+def snapshot():
+    global _snapshot
+    if _snapshot is None:
+        try:
+            with open(os.getenv(SNAPSHOT_ENV) or cost_path(), 'r') as f:
+                _snapshot = json.load(f)
+        except (OSError, ValueError):
+            _snapshot = {}
+    return _snapshot
+
+
+def prepare(key, work_dir, extra_env):
+    # called before a sharded simulation, returns the updated extra_env
+    os.makedirs(work_dir, exist_ok=True)
+    for root, dirs, files in os.walk(work_dir):
+        if COST_FILE in files:
+            os.remove(os.path.join(root, COST_FILE))
+
+    fn = os.path.join(work_dir, "shard_costs_in.json")
+    with open(fn, 'w') as f:
+        json.dump(snapshot().get(key, {}), f)
+
+    return dict(extra_env, **{COSTS_ENV: fn})
+
+
+def collect(key, work_dir):
+    # merge the item costs measured by a sharded simulation into the cost table
+    measured = {}
+    for root, dirs, files in os.walk(work_dir):
+        if COST_FILE not in files:
+            continue
+        try:
+            with open(os.path.join(root, COST_FILE), 'r') as f:
+                d = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for name, m in d.items():
+            t = measured.setdefault(name, {'n': m['n'], 'costs': {}})
+            if t['n'] != m['n']:
+                continue
+            for k, v in m['costs'].items():
+                t['costs'][k] = t['costs'].get(k, 0) + v
+
+    if not measured:
+        return
+
+    fn = cost_path()
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    with sim.file_lock(fn + ".lock"):
+        try:
+            with open(fn, 'r') as f:
+                table = json.load(f)
+        except (OSError, ValueError):
+            table = {}
+        entry = table.setdefault(key, {})
+        for name, m in measured.items():
+            t = entry.get(name)
+            if t is None or t['n'] != m['n']:
+                t = entry[name] = {'n': m['n'], 'costs': {}}
+            t['costs'].update(m['costs'])
+        with open(fn + ".tmp", 'w') as f:
+            json.dump(table, f)
+        os.replace(fn + ".tmp", fn)
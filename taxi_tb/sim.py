@@ -0,0 +1,705 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import time
+from xml.etree import ElementTree as ET
+
+import cocotb
+import cocotb_test.simulator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from . import root_dir, cache_dir
+from . import profiler
+from . import shard
+from . import telemetry
+
+
+def parse_size(s):
+    s = str(s).strip().upper().rstrip('B')
+    for k, suffix in enumerate("KMGT"):
+        if s.endswith(suffix):
+            return int(float(s[:-1]) * 1024**(k+1))
+    return int(s)
+
+
+@contextlib.contextmanager
+def file_lock(path, shared=False, blocking=True):
+    # advisory lock on a separate lock file; raises BlockingIOError
+    # if blocking is False and the lock is held elsewhere
+    with open(path, 'a') as f:
+        if fcntl is not None:
+            op = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            if not blocking:
+                op |= fcntl.LOCK_NB
+            fcntl.flock(f, op)
+        yield
+
+
+def dir_size(path):
+    size = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for fn in filenames:
+            try:
+                size += os.lstat(os.path.join(dirpath, fn)).st_size
+            except OSError:
+                pass
+    return size
+
+
+def total_memory():
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 16*1024**3
+
+
+def children_peak_rss():
+    # peak RSS of the largest terminated child process, in bytes
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    if sys.platform == 'darwin':
+        return rss
+    return rss*1024
+
+
+class CompileSlots:
+    # cross-process memory budget for compilation, implemented as a set of
+    # lock files that each represent a fixed amount of memory
+
+    def __init__(self, path, budget=None, unit=256*1024**2):
+        if budget is None:
+            budget = os.getenv("SIM_COMPILE_MEM")
+        if budget is None:
+            budget = int(total_memory() * 0.75)
+
+        self.path = path
+        self.unit = unit
+        self.budget = parse_size(budget)
+        self.count = max(1, self.budget // self.unit)
+
+        self.log = logging.getLogger("cocotb.sim_cache")
+
+    @contextlib.contextmanager
+    def acquire(self, mem):
+        # slots are only taken while holding the gate lock, so waiters block in
+        # flock and are served one at a time instead of polling; requests larger
+        # than the budget get the whole budget
+        n = min(max(1, -(-int(mem) // self.unit)), self.count)
+
+        if fcntl is None:
+            yield
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+
+        held = []
+        try:
+            with open(os.path.join(self.path, "gate.lock"), 'a') as gate:
+                try:
+                    fcntl.flock(gate, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    self.log.info("Waiting for %d MB of compile memory", n*self.unit // 1024**2)
+                    fcntl.flock(gate, fcntl.LOCK_EX)
+
+                # prefer free slots, then block on the rest in order
+                for k in range(self.count):
+                    f = open(os.path.join(self.path, f"slot{k}.lock"), 'a')
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        f.close()
+                        continue
+                    held.append(f)
+                    if len(held) >= n:
+                        break
+
+                k = 0
+                while len(held) < n:
+                    fn = os.path.join(self.path, f"slot{k}.lock")
+                    k += 1
+                    if any(f.name == fn for f in held):
+                        continue
+                    f = open(fn, 'a')
+                    held.append(f)
+                    fcntl.flock(f, fcntl.LOCK_EX)
+
+            yield
+        finally:
+            for f in held:
+                f.close()
+
+
+_verilator_version = None
+
+
+def verilator_version():
+    global _verilator_version
+    if _verilator_version is None:
+        verilator_exec = shutil.which("verilator")
+        if verilator_exec is None:
+            return None
+        _verilator_version = subprocess.run([verilator_exec, "--version"],
+            capture_output=True, text=True).stdout.strip()
+    return _verilator_version
+
+
+_file_hashes = {}
+
+
+def file_hash(fn):
+    st = os.stat(fn)
+    k = (fn, st.st_mtime_ns, st.st_size)
+    h = _file_hashes.get(k)
+    if h is None:
+        with open(fn, 'rb') as f:
+            h = hashlib.sha256(f.read()).hexdigest()
+        _file_hashes[k] = h
+    return h
+
+
+class CachedVerilator(cocotb_test.simulator.Verilator):
+    # run a prebuilt model from build_dir, using sim_build as the work directory
+    def __init__(self, build_dir, *args, results_file=None, **kwargs):
+        self.build_dir = build_dir
+        self.results_file = results_file
+        super().__init__(*args, **kwargs)
+
+    def set_env(self):
+        super().set_env()
+        if self.results_file:
+            self.env["COCOTB_RESULTS_FILE"] = self.results_file
+
+    def build_command(self):
+        return [[os.path.join(self.build_dir, self.toplevel_module)] + self.plus_args]
+
+    def execute_only(self):
+        # run without checking the results file
+        __tracebackhide__ = True
+        if self.results_file and os.path.exists(self.results_file):
+            os.remove(self.results_file)
+        self.set_env()
+        self.execute(self.build_command())
+
+
+def lpt_groups(costs, n):
+    # longest processing time first: assign each item to the least-loaded
+    # group, returns (total, [items]) per group
+    groups = [[0, k, []] for k in range(n)]
+    for item in sorted(costs, key=lambda x: (-costs[x], x)):
+        g = min(groups)
+        g[0] += costs[item]
+        g[2].append(item)
+    return [(g[0], g[2]) for g in groups]
+
+
+def results_times(fn):
+    # wall time per test from a cocotb results file
+    times = {}
+    try:
+        tree = ET.parse(fn)
+    except (OSError, ET.ParseError):
+        return times
+    for tc in tree.iter("testcase"):
+        times[tc.get("name")] = float(tc.get("time", 0))
+    return times
+
+
+def merge_results(files, fn):
+    # combine the test cases from several cocotb results files
+    root = None
+    for f in files:
+        tree = ET.parse(f)
+        if root is None:
+            root = tree.getroot()
+            suite = root.find("testsuite")
+        else:
+            for tc in tree.iter("testcase"):
+                suite.append(tc)
+    ET.ElementTree(root).write(fn+".tmp", encoding="UTF-8", xml_declaration=True)
+    os.replace(fn+".tmp", fn)
+
+
+def parallel_jobs(jobs=None):
+    if jobs is None:
+        jobs = os.getenv("SIM_PARALLEL", "1")
+    if jobs == "auto":
+        return os.cpu_count() or 1
+    return max(1, int(jobs))
+
+
+class BuildCache:
+    def __init__(self, path=None, size_limit=None):
+        if path is None:
+            path = cache_dir()
+        if size_limit is None:
+            size_limit = os.getenv("SIM_CACHE_SIZE", "32G")
+
+        self.path = os.path.abspath(path)
+        self.size_limit = parse_size(size_limit)
+
+        self.slots = CompileSlots(os.path.join(self.path, "slots"))
+
+        self.log = logging.getLogger("cocotb.sim_cache")
+
+    def key(self, kwargs):
+        waves = kwargs.get('waves')
+        if waves is None:
+            waves = int(os.getenv("WAVES", 0))
+
+        sources = [os.path.abspath(f) for f in kwargs.get('verilog_sources') or []]
+        parameters = kwargs.get('parameters') or {}
+
+        d = {
+            'toplevel': kwargs.get('toplevel'),
+            'toplevel_lang': kwargs.get('toplevel_lang', 'verilog'),
+            'sources': [(os.path.basename(f), file_hash(f)) for f in sources],
+            'includes': [os.path.abspath(f) for f in kwargs.get('includes') or []],
+            'defines': list(kwargs.get('defines') or []),
+            'parameters': {k: str(v) for k, v in parameters.items()},
+            'compile_args': list(kwargs.get('compile_args') or []),
+            'verilog_compile_args': list(kwargs.get('verilog_compile_args') or []),
+            'extra_args': list(kwargs.get('extra_args') or []),
+            'make_args': list(kwargs.get('make_args') or []),
+            'timescale': kwargs.get('timescale'),
+            'waves': bool(waves),
+            'verilator': verilator_version(),
+            'cocotb': cocotb.__version__,
+        }
+
+        h = hashlib.sha256(json.dumps(d, sort_keys=True).encode()).hexdigest()
+        return f"{d['toplevel']}-{h[:24]}"
+
+    def entry_dir(self, key):
+        return os.path.join(self.path, key)
+
+    def lock_path(self, key):
+        return os.path.join(self.path, key+".lock")
+
+    def load_meta(self, key):
+        try:
+            with open(os.path.join(self.entry_dir(key), "meta.json"), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def touch(self, key):
+        try:
+            os.utime(os.path.join(self.entry_dir(key), "meta.json"))
+        except OSError:
+            pass
+
+    def entries(self):
+        if not os.path.isdir(self.path):
+            return
+        for name in os.listdir(self.path):
+            if os.path.isdir(self.entry_dir(name)):
+                meta = self.load_meta(name)
+                if meta is not None:
+                    yield meta
+
+    def estimate(self, kwargs):
+        # estimate compile time and peak memory from previous builds of the
+        # same toplevel, falling back on the size of the sources
+        toplevel = kwargs.get('toplevel')
+        mem = 0
+        compile_time = 0
+        for meta in self.entries():
+            if meta.get('toplevel') == toplevel:
+                mem = max(mem, meta.get('peak_rss') or 0)
+                compile_time = max(compile_time, meta.get('compile_time') or 0)
+        if not mem or not compile_time:
+            size = sum(os.path.getsize(f) for f in kwargs.get('verilog_sources') or [] if os.path.exists(f))
+            if not mem:
+                mem = 512*1024**2 + size*1024
+            if not compile_time:
+                compile_time = 10 + size / 2000
+        return {'peak_rss': mem, 'compile_time': compile_time}
+
+    def compile(self, key, kwargs):
+        build_dir = self.entry_dir(key)
+        shutil.rmtree(build_dir, ignore_errors=True)
+
+        est = self.estimate(kwargs)
+
+        kwargs = dict(kwargs)
+        kwargs['sim_build'] = build_dir
+        kwargs['compile_only'] = True
+
+        with self.slots.acquire(est['peak_rss']):
+            self.log.info("Compiling %s into %s", kwargs.get('toplevel'), build_dir)
+
+            rss = children_peak_rss()
+            start = time.perf_counter()
+            try:
+                cocotb_test.simulator.Verilator(**kwargs).run()
+            except BaseException:
+                shutil.rmtree(build_dir, ignore_errors=True)
+                raise
+            compile_time = time.perf_counter() - start
+
+            # only meaningful if the compiler set a new high-water mark
+            peak_rss = children_peak_rss()
+            if peak_rss <= rss:
+                peak_rss = None
+
+        # compile-only runs still create an empty results file
+        for fn in os.listdir(build_dir):
+            if fn.endswith("_results.xml"):
+                os.remove(os.path.join(build_dir, fn))
+
+        meta = {
+            'key': key,
+            'toplevel': kwargs.get('toplevel'),
+            'compile_time': compile_time,
+            'peak_rss': peak_rss,
+            'size': dir_size(build_dir),
+            'created': time.time(),
+        }
+
+        fn = os.path.join(build_dir, "meta.json")
+        with open(fn+".tmp", 'w') as f:
+            json.dump(meta, f, indent=4)
+        os.replace(fn+".tmp", fn)
+
+        return meta
+
+    def evict(self, exclude=None):
+        try:
+            with file_lock(os.path.join(self.path, ".evict.lock"), blocking=False):
+                entries = []
+                total = 0
+                for name in os.listdir(self.path):
+                    fn = os.path.join(self.path, name, "meta.json")
+                    try:
+                        mtime = os.stat(fn).st_mtime
+                        with open(fn, 'r') as f:
+                            size = json.load(f).get('size', 0)
+                    except (OSError, ValueError):
+                        continue
+                    total += size
+                    entries.append((mtime, name, size))
+
+                # least recently used first
+                entries.sort()
+
+                for mtime, name, size in entries:
+                    if total <= self.size_limit:
+                        break
+                    if name == exclude:
+                        continue
+                    try:
+                        with file_lock(self.lock_path(name), blocking=False):
+                            self.log.info("Evicting %s", name)
+                            os.remove(os.path.join(self.entry_dir(name), "meta.json"))
+                            shutil.rmtree(self.entry_dir(name), ignore_errors=True)
+                            total -= size
+                    except (BlockingIOError, OSError):
+                        # in use
+                        continue
+        except BlockingIOError:
+            # another process is already evicting
+            pass
+
+    def build(self, stats=None, **kwargs):
+        __tracebackhide__ = True
+
+        os.makedirs(self.path, exist_ok=True)
+
+        key = self.key(kwargs)
+        force = kwargs.pop('force_compile', False)
+
+        with file_lock(self.lock_path(key)):
+            if force or self.load_meta(key) is None:
+                self.compile(key, kwargs)
+                if stats is not None:
+                    stats['compiled'] = True
+                built = True
+            else:
+                built = False
+            self.touch(key)
+
+        if built:
+            self.evict(exclude=key)
+
+        return key
+
+    def run(self, stats=None, **kwargs):
+        __tracebackhide__ = True
+
+        os.makedirs(self.path, exist_ok=True)
+
+        if stats is None:
+            stats = {}
+
+        key = self.key(kwargs)
+        stats['build'] = key
+        work_dir = os.path.abspath(kwargs.pop('sim_build', "sim_build"))
+        force = kwargs.pop('force_compile', False)
+        compile_only = kwargs.pop('compile_only', False)
+        jobs = parallel_jobs(kwargs.pop('parallel', None))
+
+        # an explicit test selection applies to every process
+        if kwargs.get('testcase') or os.getenv("TESTCASE"):
+            jobs = 1
+
+        while True:
+            # hold a shared lock while running so the build is not evicted
+            with file_lock(self.lock_path(key), shared=True):
+                meta = None if force else self.load_meta(key)
+                if meta is not None:
+                    self.touch(key)
+                    stats['compile_time'] = meta.get('compile_time', 0)
+                    if compile_only:
+                        return None
+                    os.makedirs(work_dir, exist_ok=True)
+                    start = time.perf_counter()
+                    if jobs > 1:
+                        try:
+                            return self.run_parallel(key, work_dir, kwargs, jobs, stats)
+                        finally:
+                            stats['sim_wall_time'] = time.perf_counter() - start
+                    sim = CachedVerilator(build_dir=self.entry_dir(key), sim_build=work_dir, **kwargs)
+                    try:
+                        return sim.run()
+                    finally:
+                        stats['sim_wall_time'] = time.perf_counter() - start
+                        stats['results'] = sim.env.get("COCOTB_RESULTS_FILE")
+
+            self.build(stats=stats, force_compile=force, **kwargs)
+            force = False
+
+    def list_tests(self, key, work_dir, kwargs):
+        # run the model once with taxi_tb.testlist to find the cocotb tests,
+        # including any generated by TestFactory
+        __tracebackhide__ = True
+
+        fn = os.path.join(work_dir, "tests.json")
+
+        kwargs = dict(kwargs)
+        kwargs['module'] = kwargs['module'] + ",taxi_tb.testlist"
+        kwargs['testcase'] = "taxi_list_tests"
+        kwargs['python_search'] = list(kwargs.get('python_search') or []) + [root_dir]
+        kwargs['extra_env'] = dict(kwargs.get('extra_env') or {}, TAXI_TEST_LIST=fn)
+        kwargs['waves'] = False
+
+        list_dir = os.path.join(work_dir, "list")
+        sim = CachedVerilator(build_dir=self.entry_dir(key), sim_build=list_dir,
+            results_file=os.path.join(list_dir, "results.xml"), **kwargs)
+        sim.execute_only()
+
+        with open(fn, 'r') as f:
+            return json.load(f)
+
+    def run_parallel(self, key, work_dir, kwargs, jobs, stats):
+        # run the cocotb tests of one module in several simulator processes
+        # sharing the same build, each with a subset of the tests
+        __tracebackhide__ = True
+
+        tests = self.list_tests(key, work_dir, kwargs)
+        results_file = os.path.join(work_dir, "results.xml")
+
+        # balance on the test times from the last run, if any
+        times = results_times(results_file)
+        default = sum(times.values()) / len(times) if times else 1.0
+        costs = {t: times.get(t, default) for t in tests}
+        order = {t: k for k, t in enumerate(tests)}
+        groups = [sorted(g, key=order.get) for c, g in lpt_groups(costs, min(jobs, len(tests))) if g] or [[]]
+
+        self.log.info("Running %d tests of %s in %d processes", len(tests), kwargs.get('module'), len(groups))
+
+        def run_group(k, group):
+            shard_dir = os.path.join(work_dir, f"shard{k}")
+            sim = CachedVerilator(build_dir=self.entry_dir(key), sim_build=shard_dir,
+                results_file=os.path.join(shard_dir, "results.xml"), testcase=",".join(group), **kwargs)
+            try:
+                sim.execute_only()
+            except SystemExit as e:
+                self.log.error("Process %d: %s", k, e)
+            return sim.results_file
+
+        with concurrent.futures.ThreadPoolExecutor(len(groups)) as ex:
+            files = list(ex.map(run_group, range(len(groups)), groups))
+
+        files = [f for f in files if os.path.isfile(f)]
+        if len(files) < len(groups):
+            raise SystemExit("ERROR: Simulation terminated abnormally. Cocotb results file not found.")
+
+        merge_results(files, results_file)
+        stats['results'] = results_file
+
+        failed = 0
+        for tc in ET.parse(results_file).iter("testcase"):
+            if tc.find("failure") is not None:
+                self.log.error(f'Failed: {tc.get("classname")}::{tc.get("name")}')
+                failed += 1
+
+        # for the cocotb-test JUnit report
+        if os.getenv("COCOTB_RESULTS_FILE"):
+            shutil.copyfile(results_file, os.getenv("COCOTB_RESULTS_FILE"))
+
+        if failed:
+            raise SystemExit(f"FAILED {failed} tests.")
+
+        return results_file
+
+
+_cache = None
+_capture = None
+_record = None
+
+
+class Captured(Exception):
+    pass
+
+
+@contextlib.contextmanager
+def capture():
+    # record run() arguments instead of running simulations
+    global _capture
+    _capture = []
+    try:
+        yield _capture
+    finally:
+        _capture = None
+
+
+@contextlib.contextmanager
+def record():
+    # collect build and simulation statistics from run() calls
+    global _record
+    _record = []
+    try:
+        yield _record
+    finally:
+        _record = None
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = BuildCache()
+    return _cache
+
+
+def cache_enabled():
+    return os.getenv("SIM_CACHE", "1") not in ("", "0")
+
+
+def run(simulator=None, **kwargs):
+    # drop-in replacement for cocotb_test.simulator.run that shares
+    # Verilator builds between runs with identical build inputs
+    __tracebackhide__ = True
+
+    if _capture is not None:
+        _capture.append(dict(simulator=simulator, **kwargs))
+        raise Captured()
+
+    stats = {'compile_time': 0, 'compiled': False}
+    if _record is not None:
+        _record.append(stats)
+
+    work_dir = os.path.abspath(kwargs.get('sim_build', "sim_build"))
+
+    extra_env = kwargs.get('extra_env') or {}
+    shard_key = None
+    if shard.INDEX_ENV in extra_env:
+        # item costs are kept per build and cocotb test module
+        shard_key = get_cache().key(kwargs) + "/" + kwargs['module']
+        kwargs['extra_env'] = shard.prepare(shard_key, work_dir, extra_env)
+
+    if telemetry.enabled():
+        kwargs = telemetry.prepare(work_dir, kwargs)
+
+    if profiler.enabled():
+        kwargs = profiler.prepare(work_dir, kwargs)
+
+    try:
+        return _run(simulator, stats, **kwargs)
+    finally:
+        if shard_key:
+            shard.collect(shard_key, work_dir)
+        if telemetry.enabled():
+            telemetry.collect(work_dir, stats)
+
+
+def _run(simulator, stats, **kwargs):
+    __tracebackhide__ = True
+
+    sim = os.getenv("SIM", simulator)
+
+    if sim != "verilator" or not cache_enabled() or verilator_version() is None:
+        # compile and simulation are not separable here
+        kwargs.pop('parallel', None)
+        stats['compile_time'] = None
+        stats['compiled'] = True
+        start = time.perf_counter()
+        try:
+            results = cocotb_test.simulator.run(simulator=simulator, **kwargs)
+        finally:
+            stats['sim_wall_time'] = time.perf_counter() - start
+        stats['results'] = results
+        return results
+
+    return get_cache().run(stats=stats, **kwargs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verilator build cache")
+    subparsers = parser.add_subparsers(dest='cmd', required=True)
+
+    p = subparsers.add_parser('build', help="Compile a model from a JSON file of run() arguments")
+    p.add_argument('file')
+
+    subparsers.add_parser('list', help="List cached builds")
+
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(levelname)s %(name)s: %(message)s", level=logging.INFO)
+
+    cache = get_cache()
+
+    if args.cmd == 'build':
+        with open(args.file, 'r') as f:
+            kwargs = json.load(f)
+        kwargs.pop('simulator', None)
+        kwargs.pop('sim_build', None)
+        key = cache.build(**kwargs)
+        print(json.dumps(cache.load_meta(key)))
+    elif args.cmd == 'list':
+        total = 0
+        for meta in sorted(cache.entries(), key=lambda m: m['key']):
+            total += meta['size']
+            print(f"{meta['key']}  {meta['size']/1024**2:8.1f} MB  {meta['compile_time']:7.1f} s")
+        print(f"Total {total/1024**2:.1f} MB (limit {cache.size_limit/1024**2:.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
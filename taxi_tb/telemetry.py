@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+# Simulation performance telemetry.  When listed first in MODULE with
+# TAXI_TELEMETRY set to an output file, this instruments the cocotb
+# scheduler and writes one JSON record per cocotb test with the simulated
+# time, wall time, time spent in Python and in the simulator, the number of
+# times each coroutine was resumed (normally once per clock edge for the bus
+# models), and the peak RSS of the simulator process.
+
+import argparse
+import glob
+import json
+import os
+import re
+import time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import cocotb
+
+from . import root_dir
+from . import hooks
+
+
+OUTPUT_ENV = "TAXI_TELEMETRY"
+DIR_ENV = "SIM_TELEMETRY"
+
+OUTPUT_FILE = "telemetry.jsonl"
+
+
+def peak_rss():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class Telemetry(hooks.Listener):
+    def __init__(self, fn):
+        self.fn = fn
+        self.start_test()
+
+    def start_test(self):
+        self.resumes = {}
+        self.start_time = time.perf_counter()
+
+    def resume(self, task):
+        name = hooks.coro_name(task)
+        self.resumes[name] = self.resumes.get(name, 0) + 1
+
+    def end_test(self, log, test, outcome, wall_time_s, sim_time_ns, python_time):
+        wall_time = time.perf_counter() - self.start_time
+        rec = {
+            'test': test.__qualname__,
+            'module': test.__module__,
+            'sim_time_ns': sim_time_ns,
+            'wall_time': wall_time,
+            'python_time': python_time,
+            'simulator_time': max(wall_time - python_time, 0.0),
+            'sim_ns_per_s': sim_time_ns / wall_time if wall_time else None,
+            'peak_rss': peak_rss(),
+            'resumes': dict(sorted(self.resumes.items(), key=lambda x: -x[1])),
+        }
+        with open(self.fn, 'a') as f:
+            f.write(json.dumps(rec) + '\n')
+
+
+def load(fn):
+    records = []
+    try:
+        with open(fn, 'r') as f:
+            for line in f:
+                if line.strip():
+                    records.append(json.loads(line))
+    except (OSError, ValueError):
+        pass
+    return records
+
+
+# runner side
+
+def enabled():
+    return bool(os.getenv(DIR_ENV))
+
+
+def prepare(work_dir, kwargs):
+    # returns run() arguments that load this module ahead of the tests
+    for root, dirs, files in os.walk(work_dir):
+        if OUTPUT_FILE in files:
+            os.remove(os.path.join(root, OUTPUT_FILE))
+
+    kwargs = dict(kwargs)
+    kwargs['module'] = __name__ + "," + kwargs['module']
+    kwargs['python_search'] = list(kwargs.get('python_search') or []) + [root_dir]
+    kwargs['extra_env'] = dict(kwargs.get('extra_env') or {}, **{OUTPUT_ENV: OUTPUT_FILE})
+    return kwargs
+
+
+def collect(work_dir, stats):
+    # gather the records written by the simulator process(es) into one
+    # file per test in the telemetry directory
+    records = []
+    for root, dirs, files in os.walk(work_dir):
+        if OUTPUT_FILE in files:
+            records.extend(r for r in load(os.path.join(root, OUTPUT_FILE)) if r['module'] != "taxi_tb.testlist")
+
+    nodeid = os.getenv("PYTEST_CURRENT_TEST", "").rsplit(" (", 1)[0] or os.path.basename(work_dir)
+
+    out = {
+        'nodeid': nodeid,
+        'build': stats.get('build'),
+        'compile_time': stats.get('compile_time'),
+        'compiled': stats.get('compiled'),
+        'sim_wall_time': stats.get('sim_wall_time'),
+        'tests': records,
+    }
+
+    out_dir = os.path.abspath(os.getenv(DIR_ENV))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, re.sub(r'[^\w\-.]+', '_', nodeid) + ".json"), 'w') as f:
+        json.dump(out, f, indent=4)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize simulation telemetry")
+    parser.add_argument('dir', nargs='?', default=os.getenv(DIR_ENV, "."), help="Telemetry directory")
+    parser.add_argument('-n', type=int, default=3, help="Number of coroutines to list per test")
+
+    args = parser.parse_args()
+
+    rows = []
+    for fn in glob.glob(os.path.join(args.dir, "*.json")):
+        with open(fn, 'r') as f:
+            d = json.load(f)
+        for rec in d['tests']:
+            rows.append((d['nodeid'], rec))
+
+    rows.sort(key=lambda x: -x[1]['wall_time'])
+
+    print(f"{'wall':>8} {'python':>7} {'sim ns/s':>10} {'RSS MB':>7}  test")
+    for nodeid, rec in rows:
+        py = rec['python_time'] / rec['wall_time'] if rec['wall_time'] else 0
+        rss = (rec['peak_rss'] or 0) / 1024**2
+        print(f"{rec['wall_time']:8.1f} {py:7.1%} {rec['sim_ns_per_s'] or 0:10.0f} {rss:7.0f}  {nodeid} {rec['test']}")
+        for name, count in list(rec['resumes'].items())[:args.n]:
+            print(f"{'':37}{count:10}  {name}")
+
+
+_telemetry = None
+
+if os.getenv(OUTPUT_ENV) and cocotb.top is not None:
+    _telemetry = Telemetry(os.path.abspath(os.getenv(OUTPUT_ENV)))
+    hooks.register(_telemetry)
+
+
+if __name__ == '__main__':
+    main()
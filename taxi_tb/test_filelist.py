@@ -0,0 +1,265 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import glob
+import importlib.util
+import os
+import textwrap
+
+import pytest
+
+from taxi_tb import root_dir
+from taxi_tb import filelist
+from taxi_tb import sim
+
+
+def process_f_files_ref(files):
+    # the implementation that the runners used before taxi_tb.filelist
+    lst = {}
+    for f in files:
+        if f[-2:].lower() == '.f':
+            with open(f, 'r') as fp:
+                l = fp.read().split()
+            for f in process_f_files_ref([os.path.join(os.path.dirname(f), x) for x in l]):
+                lst[os.path.basename(f)] = f
+        else:
+            lst[os.path.basename(f)] = f
+    return list(lst.values())
+
+
+def write_files(root, files):
+    for name, text in files.items():
+        fn = os.path.join(root, name)
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        with open(fn, 'w') as f:
+            f.write(textwrap.dedent(text))
+
+
+def test_filelist_nested_f_files(tmp_path):
+    root = str(tmp_path)
+    write_files(root, {
+        "rtl/top.f": "top.sv\nsub/inner.f\n../common/c.sv\n",
+        "rtl/sub/inner.f": "a.sv ../b.sv\n../../common/common.f\n",
+        "common/common.f": "c.sv d.sv\n",
+    })
+
+    f_files = []
+    srcs = filelist.process_f_files([os.path.join(root, "rtl/top.f"), os.path.join(root, "tb.sv")], f_files)
+
+    # one entry per file name, in order of first appearance, the last path wins
+    assert [os.path.relpath(os.path.normpath(x), root) for x in srcs] == [
+        "rtl/top.sv",
+        "rtl/sub/a.sv",
+        "rtl/b.sv",
+        "common/c.sv",
+        "common/d.sv",
+        "tb.sv",
+    ]
+    assert [os.path.relpath(os.path.normpath(x), root) for x in f_files] == [
+        "rtl/top.f",
+        "rtl/sub/inner.f",
+        "common/common.f",
+    ]
+
+    assert srcs == process_f_files_ref([os.path.join(root, "rtl/top.f"), os.path.join(root, "tb.sv")])
+
+
+def test_filelist_f_file_update(tmp_path):
+    fn = str(tmp_path / "x.f")
+    with open(fn, 'w') as f:
+        f.write("a.sv b.sv\n")
+    st = os.stat(fn)
+    assert filelist.process_f_files([fn]) == [str(tmp_path / "a.sv"), str(tmp_path / "b.sv")]
+
+    # cached contents are revalidated against the mtime
+    with open(fn, 'w') as f:
+        f.write("a.sv c.sv\n")
+    os.utime(fn, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert filelist.process_f_files([fn]) == [str(tmp_path / "a.sv"), str(tmp_path / "c.sv")]
+
+
+f_files = sorted(glob.glob(os.path.join(root_dir, "src", "*", "rtl", "**", "*.f"), recursive=True))
+
+
+def test_filelist_real_f_files():
+    assert f_files
+    for fn in f_files:
+        ref = process_f_files_ref([fn])
+        assert filelist.process_f_files([fn]) == ref, fn
+        # again from the cache
+        assert filelist.process_f_files([fn]) == ref, fn
+
+
+def first_params(func):
+    # the first parametrization of a pytest test function
+    params = {}
+    for m in getattr(func, 'pytestmark', []):
+        if m.name != 'parametrize':
+            continue
+        names, values = m.args[0], m.args[1]
+        if isinstance(names, str):
+            names = [x.strip() for x in names.split(',')]
+        if len(names) == 1:
+            params[names[0]] = values[0]
+        else:
+            params.update(zip(names, values[0]))
+    return params
+
+
+class Node:
+    def __init__(self, name):
+        self.node = self
+        self.name = name
+
+
+def capture_runner(fn, name):
+    spec = importlib.util.spec_from_file_location(f"_runner_{name}", fn)
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+
+    func = getattr(mod, name)
+    args = first_params(func)
+    if 'request' in func.__code__.co_varnames[:func.__code__.co_argcount]:
+        args['request'] = Node(name)
+
+    with sim.capture() as captured:
+        with pytest.raises(sim.Captured):
+            func(**args)
+    return captured[0]
+
+
+@pytest.mark.parametrize("runner", [
+    "src/eth/tb/taxi_eth_mac_10g/test_taxi_eth_mac_10g.py",
+    "src/axis/tb/taxi_axis_async_fifo/test_taxi_axis_async_fifo.py",
+    "src/lfsr/tb/taxi_lfsr_crc/test_taxi_lfsr_crc.py",
+])
+def test_filelist_parse_runner(runner):
+    fn = os.path.join(root_dir, runner)
+    runners = filelist.parse_runner(fn)
+    assert runners
+
+    for r in runners:
+        kwargs = capture_runner(fn, r['name'])
+        assert r['toplevel'] == kwargs['toplevel']
+        assert filelist.process_f_files(r['verilog_sources']) == kwargs['verilog_sources']
+
+
+runner_ok = """
+    import os
+    import taxi_tb.filelist
+    import taxi_tb.sim
+
+    tests_dir = os.path.abspath(os.path.dirname(__file__))
+    rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', '..', 'rtl'))
+
+    def test_ok(request):
+        dut = "x"
+        toplevel = dut
+        verilog_sources = [
+            os.path.join(rtl_dir, f"{dut}.f"),
+        ]
+        verilog_sources = taxi_tb.filelist.process_f_files(verilog_sources)
+        taxi_tb.sim.run(verilog_sources=verilog_sources, toplevel=toplevel)
+"""
+
+runner_call = """
+    import os
+    import taxi_tb.sim
+
+    from helpers import get_sources
+
+    def test_call(request):
+        verilog_sources = get_sources("x")
+        taxi_tb.sim.run(verilog_sources=verilog_sources, toplevel="x")
+"""
+
+runner_element = """
+    import os
+    import cocotb_test.simulator
+
+    tests_dir = os.path.abspath(os.path.dirname(__file__))
+
+    def test_element(request):
+        verilog_sources = [
+            os.path.join(tests_dir, "tb.sv"),
+            find_source("y.sv"),
+        ]
+        cocotb_test.simulator.run(verilog_sources=verilog_sources, toplevel="x")
+"""
+
+runner_syntax = """
+    def test_syntax(:
+        pass
+"""
+
+model_test = """
+    from model import Model
+
+    def test_model():
+        assert Model()
+"""
+
+
+def make_tree(root):
+    write_files(root, {
+        "src/x/rtl/x.f": "x.sv\n../../y/rtl/y.sv\n",
+        "src/x/rtl/x.sv": "module x;\nendmodule\n",
+        "src/y/rtl/y.sv": "module y;\nendmodule\n",
+        "src/x/tb/ok/test_ok.py": runner_ok,
+        "src/x/tb/call/test_call.py": runner_call,
+        "src/x/tb/element/test_element.py": runner_element,
+        "src/x/tb/syntax/test_syntax.py": runner_syntax,
+        "src/x/tb/test_model.py": model_test,
+        "src/x/tb/model.py": "class Model:\n    pass\n",
+    })
+    return filelist.DependencyIndex(root).scan(cache_file=os.path.join(root, "runners.json"))
+
+
+def test_filelist_parse_runner_fallback(tmp_path):
+    root = str(tmp_path)
+    make_tree(root)
+
+    r = filelist.parse_runner(os.path.join(root, "src/x/tb/ok/test_ok.py"))
+    assert [x['name'] for x in r] == ["test_ok"]
+    assert r[0]['verilog_sources'] == [os.path.join(root, "src/x/rtl/x.f")]
+
+    for name in ["call", "element"]:
+        r = filelist.parse_runner(os.path.join(root, f"src/x/tb/{name}/test_{name}.py"))
+        assert [x['name'] for x in r] == [f"test_{name}"]
+        assert r[0]['verilog_sources'] is None
+
+    assert filelist.parse_runner(os.path.join(root, "src/x/tb/syntax/test_syntax.py")) is None
+
+    # not a runner
+    assert filelist.parse_runner(os.path.join(root, "src/x/tb/test_model.py")) == []
+
+
+def test_filelist_index(tmp_path):
+    root = str(tmp_path)
+    index = make_tree(root)
+
+    def tb(name):
+        return os.path.join(root, "src/x/tb", name)
+
+    always = {tb("call/test_call.py"), tb("element/test_element.py"), tb("syntax/test_syntax.py")}
+    assert index.always == always
+
+    assert set(index.tests_for(os.path.join(root, "src/y/rtl/y.sv"))) == always | {tb("ok/test_ok.py")}
+    assert set(index.tests_for(os.path.join(root, "src/x/rtl/x.f"))) == always | {tb("ok/test_ok.py")}
+    assert set(index.tests_for(tb("model.py"))) == always | {tb("test_model.py")}
+    assert set(index.tests_for(os.path.join(root, "src/x/rtl/unused.sv"))) == always
+
+    assert index.modules_for(tb("ok/test_ok.py")) == ["x", "y"]
+
+    # results come from the runner cache the second time
+    index = filelist.DependencyIndex(root).scan(cache_file=os.path.join(root, "runners.json"))
+    assert not index._runner_cache_dirty
+    assert index.always == always
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import os
+import textwrap
+
+import pytest
+
+from taxi_tb import root_dir
+from taxi_tb import filelist
+from taxi_tb import plugin
+
+
+runner = """
+    import os
+    import taxi_tb.filelist
+    import taxi_tb.sim
+
+    tests_dir = os.path.abspath(os.path.dirname(__file__))
+    rtl_dir = os.path.abspath(os.path.join(tests_dir, '..', '..', 'rtl'))
+
+    def test_{name}(request):
+        dut = "{name}"
+        toplevel = f"test_{{dut}}"
+        verilog_sources = [
+            os.path.join(tests_dir, f"{{toplevel}}.sv"),
+            os.path.join(rtl_dir, f"{{dut}}.f"),
+        ]
+        verilog_sources = taxi_tb.filelist.process_f_files(verilog_sources)
+        taxi_tb.sim.run(python_search=[tests_dir], verilog_sources=verilog_sources, toplevel=toplevel)
+"""
+
+model_test = """
+    from {name} import {cls}
+
+    def test_{name}():
+        assert {cls}()
+"""
+
+tree = {
+    "src/a/rtl/fifo.f": "fifo.sv\n../../common/rtl/ram.sv\n",
+    "src/a/rtl/fifo.sv": "module fifo;\nendmodule\n",
+    "src/a/rtl/mux.f": "mux.sv\n../../common/rtl/ram.sv\n",
+    "src/a/rtl/mux.sv": "module mux;\nendmodule\n",
+    "src/a/rtl/unused.sv": "module unused;\nendmodule\n",
+    "src/common/rtl/ram.sv": "module ram;\nendmodule\n",
+    "src/common/rtl/ptr.f": "ptr.sv\n",
+    "src/common/rtl/ptr.sv": "module ptr;\nendmodule\n",
+    "src/a/tb/fifo/test_fifo.py": runner.format(name="fifo"),
+    "src/a/tb/fifo/test_fifo.sv": "module test_fifo;\nendmodule\n",
+    "src/a/tb/mux/test_mux.py": runner.format(name="mux"),
+    "src/a/tb/mux/test_mux.sv": "module test_mux;\nendmodule\n",
+    "src/common/tb/ptr/test_ptr.py": runner.format(name="ptr"),
+    "src/common/tb/ptr/test_ptr.sv": "module test_ptr;\nendmodule\n",
+    "src/a/tb/model.py": "class Model:\n    pass\n",
+    "src/a/tb/helper.py": "class Helper:\n    pass\n",
+    "src/a/tb/test_model.py": model_test.format(name="model", cls="Model"),
+    "src/a/tb/test_helper.py": model_test.format(name="helper", cls="Helper"),
+    "src/common/tb/other.py": "class Other:\n    pass\n",
+    "src/common/tb/test_other.py": model_test.format(name="other", cls="Other"),
+}
+
+
+@pytest.fixture
+def index(tmp_path):
+    root = str(tmp_path)
+    for name, text in tree.items():
+        fn = os.path.join(root, name)
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+        with open(fn, 'w') as f:
+            f.write(textwrap.dedent(text))
+    return filelist.DependencyIndex(root).scan(cache_file=os.path.join(root, "runners.json"))
+
+
+def affected(index, *files):
+    tbs = plugin.affected_testbenches([os.path.join(index.root, f) for f in files], index)
+    if tbs is None:
+        return None
+    return sorted(os.path.relpath(x, index.root) for x in tbs)
+
+
+def test_plugin_affected_shared_rtl(index):
+    assert affected(index, "src/common/rtl/ram.sv") == [
+        "src/a/tb/fifo/test_fifo.py",
+        "src/a/tb/mux/test_mux.py",
+    ]
+    assert affected(index, "src/a/rtl/fifo.sv") == ["src/a/tb/fifo/test_fifo.py"]
+    assert affected(index, "src/a/rtl/mux.f") == ["src/a/tb/mux/test_mux.py"]
+    assert affected(index, "src/a/tb/mux/test_mux.sv") == ["src/a/tb/mux/test_mux.py"]
+    assert affected(index, "src/a/rtl/fifo.sv", "src/common/rtl/ptr.sv") == [
+        "src/a/tb/fifo/test_fifo.py",
+        "src/common/tb/ptr/test_ptr.py",
+    ]
+
+
+def test_plugin_affected_model(index):
+    # model tests depend on every module next to them
+    assert affected(index, "src/a/tb/model.py") == [
+        "src/a/tb/test_helper.py",
+        "src/a/tb/test_model.py",
+    ]
+    assert affected(index, "src/common/tb/other.py") == ["src/common/tb/test_other.py"]
+
+    # runners only depend on their own directory
+    assert affected(index, "src/a/tb/fifo/test_fifo.py") == ["src/a/tb/fifo/test_fifo.py"]
+
+
+def test_plugin_affected_everything(index):
+    # not referenced by any testbench or .f file
+    assert affected(index, "src/a/rtl/unused.sv") is None
+    assert affected(index, "src/a/rtl/new.sv") is None
+    assert affected(index, "src/a/rtl/fifo.sv", "src/a/rtl/deleted.sv") is None
+
+    # test module that cannot be parsed
+    with open(os.path.join(index.root, "src/a/tb/mux/test_mux.py"), 'a') as f:
+        f.write("def broken(:\n")
+    index = filelist.DependencyIndex(index.root).scan(cache_file=os.path.join(index.root, "runners.json"))
+    assert affected(index, "src/a/tb/mux/test_mux.py") is None
+
+    # testbench infrastructure
+    assert plugin.affected_testbenches([os.path.join(root_dir, "taxi_tb", "sim.py")], index) is None
+    assert plugin.affected_testbenches([os.path.join(root_dir, "tox.ini")], index) is None
+
+
+class Config:
+    def __init__(self, changed):
+        self.changed = changed
+        self.deselected = []
+        self.hook = self
+
+    def getoption(self, name):
+        return {'changed': self.changed, 'changed_since': None}[name]
+
+    def pytest_deselected(self, items):
+        self.deselected.extend(items)
+
+
+class Item:
+    def __init__(self, path, nodeid):
+        self.path = path
+        self.nodeid = nodeid
+
+
+def test_plugin_select_changed(index, monkeypatch):
+    monkeypatch.setattr(filelist, "_index", index)
+
+    def items():
+        return [Item(os.path.join(index.root, x.split("::")[0]), x) for x in [
+            "src/a/tb/fifo/test_fifo.py::test_fifo",
+            "src/a/tb/mux/test_mux.py::test_mux",
+            "src/common/tb/ptr/test_ptr.py::test_ptr",
+            "src/a/tb/test_model.py::test_model",
+            "src/common/tb/test_other.py::test_other",
+        ]]
+
+    config = Config([os.path.join(index.root, "src/common/rtl/ram.sv")])
+    lst = items()
+    plugin.select_changed(config, lst)
+    assert [x.nodeid for x in lst] == [
+        "src/a/tb/fifo/test_fifo.py::test_fifo",
+        "src/a/tb/mux/test_mux.py::test_mux",
+    ]
+    assert len(config.deselected) == 3
+
+    config = Config([os.path.join(index.root, "src/a/rtl/unused.sv")])
+    lst = items()
+    plugin.select_changed(config, lst)
+    assert len(lst) == 5
+    assert not config.deselected
+
+    # no options, nothing deselected
+    config = Config([])
+    lst = items()
+    plugin.select_changed(config, lst)
+    assert len(lst) == 5
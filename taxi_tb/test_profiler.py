@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import logging
+import os
+import time
+
+import pytest
+
+import cocotb
+from cocotb.regression import RegressionManager
+from cocotb.scheduler import Scheduler
+from cocotb.task import Task
+from cocotb.triggers import RisingEdge
+
+import taxi_tb.loopback
+from taxi_tb import hooks
+from taxi_tb import profiler
+from taxi_tb import telemetry
+
+
+def busy(n):
+    x = 0
+    for k in range(n):
+        x += k
+    return x
+
+
+class Source:
+    def __init__(self, data, clk):
+        self.data = data
+        self.clk = clk
+        cocotb.start_soon(self._run())
+
+    async def _run(self):
+        k = 0
+        while True:
+            await RisingEdge(self.clk)
+            busy(1000)
+            k += 1
+            self.data.value = k
+
+
+class Sink:
+    def __init__(self, data, clk):
+        self.data = data
+        self.clk = clk
+        self.values = []
+        cocotb.start_soon(self._run())
+
+    async def _sample(self):
+        await RisingEdge(self.clk)
+        busy(5000)
+        return self.data.value
+
+    async def _run(self):
+        while True:
+            self.values.append(await self._sample())
+
+
+async def run_source_sink(sim, cycles):
+    clk = sim.signal("clk")
+    sim.clock(clk, 10, "ns")
+    data = sim.signal("data", 32)
+
+    Source(data, clk)
+    sink = Sink(data, clk)
+
+    for k in range(cycles):
+        await RisingEdge(clk)
+
+    assert sink.values[-1] > 0
+    return cycles*10
+
+
+class Manager:
+    # stands in for the cocotb RegressionManager
+    log = logging.getLogger("cocotb.regression")
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    # replace the parts of RegressionManager that need a simulator; the
+    # hooks wrap these stubs
+    monkeypatch.setattr(RegressionManager, "_start_test", lambda self: None)
+    monkeypatch.setattr(RegressionManager, "_record_result",
+        lambda self, test, outcome, wall_time_s, sim_time_ns: None)
+
+    orig = (Scheduler._react, Task._advance, RegressionManager._start_test, RegressionManager._record_result)
+
+    yield Manager()
+
+    # nothing left installed
+    assert not hooks.installed()
+    assert not hooks._listeners
+    assert (Scheduler._react, Task._advance,
+        RegressionManager._start_test, RegressionManager._record_result) == orig
+
+
+def run_test(mgr, fn, *args):
+    # one cocotb test, as the regression manager would run it
+    RegressionManager._start_test(mgr)
+    start = time.perf_counter()
+    sim_time_ns = taxi_tb.loopback.run(fn, *args)
+    RegressionManager._record_result(mgr, fn, None, time.perf_counter() - start, sim_time_ns)
+
+
+def test_profiler_prepare(tmp_path, monkeypatch):
+    monkeypatch.setenv(profiler.DIR_ENV, str(tmp_path / "profile"))
+    monkeypatch.setenv("PYTEST_CURRENT_TEST", "src/x/tb/test_x.py::test_x[1] (call)")
+    assert profiler.enabled()
+
+    kwargs = profiler.prepare(str(tmp_path / "sim_build"), {'module': "test_x"})
+    assert kwargs['module'] == "taxi_tb.profiler,test_x"
+    assert kwargs['extra_env'][profiler.PREFIX_ENV] == str(tmp_path / "profile" / "src_x_tb_test_x.py_test_x_1_")
+    assert os.path.isdir(tmp_path / "profile")
+
+
+def test_profiler(tmp_path, manager):
+    cycles = 200
+
+    tm = telemetry.Telemetry(str(tmp_path / "telemetry.jsonl"))
+    prof = profiler.Profiler(str(tmp_path / "prof"))
+    hooks.register(tm)
+    patched = (Scheduler._react, Task._advance)
+    hooks.register(prof)
+    # patched once for both
+    assert (Scheduler._react, Task._advance) == patched
+    try:
+        run_test(manager, run_source_sink, cycles)
+    finally:
+        hooks.unregister(prof)
+        hooks.unregister(tm)
+
+    # both models attributed, each resumed once per cycle
+    tasks = prof.tasks
+    for name in ["Source._run", "Sink._run"]:
+        count, t = tasks[name]
+        assert cycles <= count <= cycles+2
+        assert t > 0
+
+    # awaited coroutines are part of the stack
+    assert ("Sink._run", "Sink._sample") in prof.stacks
+    assert ("Source._run",) in prof.stacks
+
+    # five times the work per resume
+    assert tasks["Sink._run"][1] > tasks["Source._run"][1]
+
+    with open(tmp_path / "prof.run_source_sink.folded", 'r') as f:
+        folded = {}
+        for line in f:
+            stack, us = line.rsplit(" ", 1)
+            folded[stack] = int(us)
+    assert folded["run_source_sink;Source._run"] > 0
+    assert folded["run_source_sink;Sink._run;Sink._sample"] > 0
+    assert "run_source_sink;[cocotb]" in folded
+    assert "run_source_sink;[simulator]" in folded
+
+    with open(tmp_path / "prof.run_source_sink.txt", 'r') as f:
+        summary = f.read()
+    assert summary.startswith(f"{__name__}.run_source_sink: ")
+    for name in ["Source._run", "Sink._run", "[cocotb]", "[simulator]"]:
+        assert name in summary
+
+    # telemetry from the same hooks
+    recs = telemetry.load(str(tmp_path / "telemetry.jsonl"))
+    assert len(recs) == 1
+    assert cycles <= recs[0]['resumes']["Source._run"] <= cycles+2
+    assert cycles <= recs[0]['resumes']["Sink._run"] <= cycles+2
+
+    # coroutine time is part of the Python time, which is shared
+    coro_time = sum(t for c, t in tasks.values())
+    assert 0 < coro_time <= recs[0]['python_time']
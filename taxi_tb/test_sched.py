@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import threading
+
+import pytest
+
+from taxi_tb import sched
+
+
+def make_scheduler(tmp_path, monkeypatch, builds, loose_tests=0):
+    monkeypatch.setenv("SIM_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("SIM_TIMINGS", str(tmp_path / "timings"))
+
+    s = sched.Scheduler(sim_jobs=2, compile_jobs=2, log_dir=str(tmp_path / "logs"))
+
+    for k, count in enumerate(builds):
+        b = sched.Build(f"build{k}", {})
+        for n in range(count):
+            t = sched.Test(f"test_{k}_{n}", build=b, duration=1)
+            b.tests.append(t)
+            s.tests.append(t)
+        s.builds.append(b)
+
+    for n in range(loose_tests):
+        s.tests.append(sched.Test(f"test_loose_{n}", duration=1))
+
+    return s
+
+
+def run_with_timeout(s, timeout=30):
+    ret = []
+    th = threading.Thread(target=lambda: ret.append(s.run()), daemon=True)
+    th.start()
+    th.join(timeout)
+    assert not th.is_alive(), "scheduler did not finish"
+    return ret[0]
+
+
+def passing_run_test(t):
+    t.result = "passed"
+
+
+@pytest.mark.parametrize("exc", [OSError("no space left on device"), ValueError("corrupt meta")])
+def test_sched_compile_exception(tmp_path, monkeypatch, exc):
+    s = make_scheduler(tmp_path, monkeypatch, [2, 3, 1], loose_tests=2)
+
+    def compile(b):
+        if b.key == "build1":
+            raise exc
+        return None
+
+    monkeypatch.setattr(s, "_compile", compile)
+    monkeypatch.setattr(s, "_run_test", passing_run_test)
+
+    assert run_with_timeout(s) is False
+
+    assert s.builds_pending == 0
+    assert s.builds[1].error == repr(exc)
+    for b in s.builds:
+        expected = "error" if b.key == "build1" else "passed"
+        assert [t.result for t in b.tests] == [expected]*len(b.tests)
+    for t in s.tests:
+        if t.build is None:
+            assert t.result == "passed"
+
+
+def test_sched_compile_all_fail(tmp_path, monkeypatch):
+    s = make_scheduler(tmp_path, monkeypatch, [1, 1, 1, 1])
+
+    def compile(b):
+        raise OSError("cannot create temporary file")
+
+    monkeypatch.setattr(s, "_compile", compile)
+    monkeypatch.setattr(s, "_run_test", passing_run_test)
+
+    assert run_with_timeout(s) is False
+    assert all(t.result == "error" for t in s.tests)
+
+
+def test_sched_run_test_exception(tmp_path, monkeypatch):
+    s = make_scheduler(tmp_path, monkeypatch, [3], loose_tests=1)
+
+    def run_test(t):
+        if t.nodeid == "test_0_1":
+            raise OSError("cannot open log file")
+        t.result = "passed"
+
+    monkeypatch.setattr(s, "_compile", lambda b: None)
+    monkeypatch.setattr(s, "_run_test", run_test)
+
+    assert run_with_timeout(s) is False
+    assert {t.nodeid: t.result for t in s.tests} == {
+        "test_0_0": "passed",
+        "test_0_1": "error",
+        "test_0_2": "passed",
+        "test_loose_0": "passed",
+    }
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import json
+import os
+import random
+
+import pytest
+
+from taxi_tb import shard
+
+
+def cost_tables(n):
+    rng = random.Random(n)
+    return [
+        None,
+        {k: 1.0 for k in range(n)},
+        {k: rng.uniform(0.1, 10) for k in range(n)},
+        {k: 100.0 if k == 0 else 1.0 for k in range(n)},
+        # partial table, the rest get the mean
+        {k: rng.uniform(0.1, 10) for k in range(0, n, 3)},
+    ]
+
+
+def check_cover(groups, n):
+    items = sorted(k for g in groups for k in g)
+    assert items == list(range(n))
+
+
+@pytest.mark.parametrize("n", [1, 7, 64])
+@pytest.mark.parametrize("count", [1, 2, 3, 8])
+def test_shard_assign(n, count):
+    for costs in cost_tables(n):
+        groups = shard.assign(n, count, costs)
+        assert len(groups) == count
+        check_cover(groups, n)
+        assert all(g == sorted(g) for g in groups)
+        # deterministic, so every shard computes the same assignment
+        assert shard.assign(n, count, costs) == groups
+
+    assert shard.assign(n, count) == [list(range(k, n, count)) for k in range(count)]
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    monkeypatch.setenv("SIM_CACHE_DIR", str(tmp_path / "cache"))
+    for k in [shard.INDEX_ENV, shard.COUNT_ENV, shard.COSTS_ENV, shard.SNAPSHOT_ENV]:
+        monkeypatch.delenv(k, raising=False)
+    monkeypatch.setattr(shard, "_snapshot", None)
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def run_shard(monkeypatch, tmp_path, key, s, n, name="loop"):
+    # one sharded simulation, as a separate process would see it
+    monkeypatch.setattr(shard, "_snapshot", None)
+    monkeypatch.setattr(shard, "_measured", {})
+
+    work_dir = str(tmp_path / f"sim_build_{s.index}")
+    extra_env = shard.prepare(key, work_dir, s.env())
+    for k, v in extra_env.items():
+        monkeypatch.setenv(k, v)
+
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        sel = list(shard.items(range(n), name=name))
+    finally:
+        os.chdir(cwd)
+        for k in extra_env:
+            monkeypatch.delenv(k)
+
+    shard.collect(key, work_dir)
+    return sel
+
+
+def write_costs(key, name, n, costs):
+    fn = shard.cost_path()
+    os.makedirs(os.path.dirname(fn), exist_ok=True)
+    table = {}
+    if costs is not None:
+        table[key] = {name: {'n': n, 'costs': {str(k): v for k, v in costs.items()}}}
+    with open(fn, 'w') as f:
+        json.dump(table, f)
+
+
+@pytest.mark.parametrize("n", [1, 7, 64])
+@pytest.mark.parametrize("count", [1, 2, 3, 8])
+def test_shard_items(env, monkeypatch, n, count):
+    key = "build/test_mod"
+
+    # including a stale table for a different number of items
+    tables = [(n, costs) for costs in cost_tables(n)] + [(n+1, {k: 1.0 for k in range(n+1)})]
+
+    for table_n, costs in tables:
+        write_costs(key, "loop", table_n, costs)
+
+        fn = shard.freeze()
+        assert fn is not None
+        assert os.environ[shard.SNAPSHOT_ENV] == fn
+        # nested runs use the same snapshot
+        assert shard.freeze() is None
+
+        # each shard updates the cost table when it finishes; the snapshot
+        # keeps the later shards on the same assignment
+        sel = [run_shard(monkeypatch, env, key, s, n) for s in shard.shards(count)]
+        check_cover(sel, n)
+
+        with open(shard.cost_path(), 'r') as f:
+            table = json.load(f)
+        assert sorted(int(k) for k in table[key]["loop"]["costs"]) == list(range(n))
+
+        os.remove(fn)
+        monkeypatch.delenv(shard.SNAPSHOT_ENV)
+
+
+def test_shard_items_standalone(env, monkeypatch):
+    # not started by the runner, no cost reporting
+    monkeypatch.setenv(shard.COUNT_ENV, "3")
+    sel = []
+    for k in range(3):
+        monkeypatch.setenv(shard.INDEX_ENV, str(k))
+        sel.append(list(shard.items(range(10), name="loop")))
+    assert sel == [[0, 3, 6, 9], [1, 4, 7], [2, 5, 8]]
+    assert not os.path.exists(shard.COST_FILE)
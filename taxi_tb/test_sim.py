@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import json
+import os
+import time
+from xml.etree import ElementTree as ET
+
+import pytest
+
+from taxi_tb import sim
+
+
+@pytest.mark.parametrize("s, size", [
+    (4096, 4096),
+    ("1024", 1024),
+    ("1K", 1024),
+    ("2kb", 2048),
+    ("512MB", 512*1024**2),
+    (" 8m ", 8*1024**2),
+    ("1.5G", int(1.5*1024**3)),
+    ("32G", 32*1024**3),
+    ("2T", 2*1024**4),
+])
+def test_sim_parse_size(s, size):
+    assert sim.parse_size(s) == size
+
+
+def test_sim_parse_size_invalid():
+    with pytest.raises(ValueError):
+        sim.parse_size("lots")
+
+
+def test_sim_lpt_groups():
+    costs = {'a': 5, 'b': 4, 'c': 3, 'd': 3, 'e': 1}
+    assert sim.lpt_groups(costs, 2) == [(8, ['a', 'd']), (8, ['b', 'c', 'e'])]
+    assert sim.lpt_groups(costs, 1) == [(16, ['a', 'b', 'c', 'd', 'e'])]
+
+    # more groups than items leaves the extra groups empty
+    groups = sim.lpt_groups({'a': 2, 'b': 1}, 3)
+    assert groups == [(2, ['a']), (1, ['b']), (0, [])]
+
+    assert sim.lpt_groups({}, 2) == [(0, []), (0, [])]
+
+
+def write_results(fn, names):
+    root = ET.Element("testsuites", name="results")
+    suite = ET.SubElement(root, "testsuite", name="all")
+    for name in names:
+        ET.SubElement(suite, "testcase", name=name, classname="test_mod", time="1.0")
+    ET.ElementTree(root).write(fn, encoding="UTF-8", xml_declaration=True)
+
+
+def test_sim_merge_results(tmp_path):
+    files = []
+    for k, names in enumerate([["t0", "t1"], ["t2"], [], ["t3", "t4"]]):
+        fn = str(tmp_path / f"results{k}.xml")
+        write_results(fn, names)
+        files.append(fn)
+
+    out = str(tmp_path / "results.xml")
+    sim.merge_results(files, out)
+
+    root = ET.parse(out).getroot()
+    assert len(root.findall("testsuite")) == 1
+    assert [tc.get("name") for tc in root.iter("testcase")] == ["t0", "t1", "t2", "t3", "t4"]
+    assert not os.path.exists(out + ".tmp")
+
+    assert sim.results_times(out) == {f"t{k}": 1.0 for k in range(5)}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(sim, "verilator_version", lambda: "Verilator 5.030")
+    return sim.BuildCache(path=str(tmp_path / "cache"), size_limit="1G")
+
+
+@pytest.fixture
+def sources(tmp_path):
+    files = []
+    for name in ["a.sv", "b.sv"]:
+        fn = tmp_path / name
+        fn.write_text(f"module {name[0]}; endmodule\n")
+        files.append(str(fn))
+    return files
+
+
+def base_kwargs(sources):
+    return dict(
+        toplevel="a",
+        module="test_a",
+        verilog_sources=list(sources),
+        parameters={'WIDTH': 8, 'DEPTH': 16},
+        defines=["SIM"],
+        sim_build="sim_build/a",
+    )
+
+
+def test_sim_key_stable(cache, sources):
+    kwargs = base_kwargs(sources)
+    key = cache.key(kwargs)
+    assert key.startswith("a-")
+    assert cache.key(kwargs) == key
+
+    # work directory does not affect the build
+    assert cache.key(dict(kwargs, sim_build="elsewhere")) == key
+
+    # neither does the order of keyword arguments or parameters
+    reordered = dict(reversed(list(kwargs.items())))
+    reordered['parameters'] = {'DEPTH': 16, 'WIDTH': 8}
+    assert cache.key(reordered) == key
+
+    # parameters compare by string value
+    assert cache.key(dict(kwargs, parameters={'WIDTH': "8", 'DEPTH': "16"})) == key
+
+
+def test_sim_key_changes(cache, sources, monkeypatch):
+    kwargs = base_kwargs(sources)
+    key = cache.key(kwargs)
+
+    keys = {key}
+
+    def check(k):
+        assert k not in keys
+        keys.add(k)
+
+    check(cache.key(dict(kwargs, parameters={'WIDTH': 16, 'DEPTH': 16})))
+    check(cache.key(dict(kwargs, parameters={'WIDTH': 8})))
+    check(cache.key(dict(kwargs, defines=["SIM", "DEBUG"])))
+    check(cache.key(dict(kwargs, toplevel="b")))
+    check(cache.key(dict(kwargs, verilog_sources=sources[:1])))
+    check(cache.key(dict(kwargs, waves=True)))
+
+    monkeypatch.setattr(sim, "verilator_version", lambda: "Verilator 5.032")
+    check(cache.key(kwargs))
+    monkeypatch.setattr(sim, "verilator_version", lambda: "Verilator 5.030")
+    assert cache.key(kwargs) == key
+
+    # same size contents, with the timestamp moved on as an editor would
+    with open(sources[1], 'r') as f:
+        text = f.read()
+    st = os.stat(sources[1])
+    with open(sources[1], 'w') as f:
+        f.write(text.replace("b", "c"))
+    os.utime(sources[1], ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    check(cache.key(kwargs))
+
+    with open(sources[1], 'w') as f:
+        f.write(text)
+    os.utime(sources[1], ns=(st.st_atime_ns, st.st_mtime_ns + 2000))
+    assert cache.key(kwargs) == key
+
+
+def add_entry(cache, name, size, mtime):
+    d = cache.entry_dir(name)
+    os.makedirs(d)
+    fn = os.path.join(d, "meta.json")
+    with open(fn, 'w') as f:
+        json.dump({'key': name, 'toplevel': name.split('-')[0], 'size': size,
+            'compile_time': 1.0, 'peak_rss': None}, f)
+    os.utime(fn, (mtime, mtime))
+
+
+def test_sim_evict(cache):
+    now = time.time()
+    for k in range(5):
+        add_entry(cache, f"top-{k}", 100, now - 1000 + k*100)
+    cache.size_limit = 250
+
+    cache.evict()
+
+    assert sorted(m['key'] for m in cache.entries()) == ["top-3", "top-4"]
+
+    # used entries are the newest
+    cache.touch("top-3")
+    add_entry(cache, "top-5", 100, now)
+    cache.evict()
+
+    assert sorted(m['key'] for m in cache.entries()) == ["top-3", "top-5"]
+
+
+def test_sim_evict_exclude(cache):
+    now = time.time()
+    for k in range(4):
+        add_entry(cache, f"top-{k}", 100, now - 1000 + k*100)
+    cache.size_limit = 250
+
+    cache.evict(exclude="top-0")
+
+    assert sorted(m['key'] for m in cache.entries()) == ["top-0", "top-3"]
+
+
+def test_sim_evict_within_limit(cache):
+    now = time.time()
+    for k in range(3):
+        add_entry(cache, f"top-{k}", 100, now - k)
+    cache.size_limit = 300
+
+    cache.evict()
+
+    assert len(list(cache.entries())) == 3
+
+
+def test_sim_compile_slots(tmp_path):
+    slots = sim.CompileSlots(str(tmp_path / "slots"), budget="1G", unit=256*1024**2)
+    assert slots.count == 4
+
+    with slots.acquire(300*1024**2):
+        # remaining slots are still free
+        with slots.acquire(512*1024**2):
+            pass
+
+    # requests larger than the budget get the whole budget
+    with slots.acquire(8*1024**3):
+        pass
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import glob
+import json
+import logging
+import os
+import time
+
+import pytest
+
+import cocotb
+from cocotb.regression import RegressionManager
+from cocotb.scheduler import Scheduler
+from cocotb.task import Task
+from cocotb.triggers import RisingEdge
+from cocotb.utils import get_sim_time
+
+import taxi_tb.loopback
+from taxi_tb import hooks
+from taxi_tb import telemetry
+
+
+class Counter:
+    def __init__(self, clk):
+        self.clk = clk
+        self.count = 0
+        cocotb.start_soon(self._run())
+
+    async def _run(self):
+        while True:
+            await RisingEdge(self.clk)
+            self.count += 1
+
+
+async def run_counter(sim, cycles):
+    clk = sim.signal("clk")
+    sim.clock(clk, 10, "ns")
+    counter = Counter(clk)
+
+    for k in range(cycles):
+        await RisingEdge(clk)
+
+    assert counter.count >= cycles-1
+    return get_sim_time('ns')
+
+
+class Manager:
+    # stands in for the cocotb RegressionManager
+    log = logging.getLogger("cocotb.regression")
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    # replace the parts of RegressionManager that need a simulator; the
+    # hooks wrap these stubs
+    calls = []
+
+    def _start_test(self):
+        calls.append("start")
+
+    def _record_result(self, test, outcome, wall_time_s, sim_time_ns):
+        calls.append((test.__qualname__, sim_time_ns))
+
+    monkeypatch.setattr(RegressionManager, "_start_test", _start_test)
+    monkeypatch.setattr(RegressionManager, "_record_result", _record_result)
+
+    orig = (Scheduler._react, Task._advance, _start_test, _record_result)
+
+    mgr = Manager()
+    mgr.calls = calls
+    yield mgr
+
+    # nothing left installed
+    assert not hooks.installed()
+    assert not hooks._listeners
+    assert (Scheduler._react, Task._advance,
+        RegressionManager._start_test, RegressionManager._record_result) == orig
+
+
+def run_test(mgr, fn, *args):
+    # one cocotb test, as the regression manager would run it
+    RegressionManager._start_test(mgr)
+    start = time.perf_counter()
+    sim_time_ns = taxi_tb.loopback.run(fn, *args)
+    RegressionManager._record_result(mgr, fn, None, time.perf_counter() - start, sim_time_ns)
+    return sim_time_ns
+
+
+def test_telemetry(tmp_path, monkeypatch, manager):
+    out_dir = tmp_path / "telemetry"
+    work_dir = tmp_path / "sim_build"
+
+    monkeypatch.setenv(telemetry.DIR_ENV, str(out_dir))
+    monkeypatch.setenv("PYTEST_CURRENT_TEST", "src/x/tb/test_x.py::test_x[1] (call)")
+    assert telemetry.enabled()
+
+    # runner side
+    kwargs = telemetry.prepare(str(work_dir), {'module': "test_x", 'python_search': ["tb"]})
+    assert kwargs['module'] == "taxi_tb.telemetry,test_x"
+    assert kwargs['python_search'][0] == "tb"
+    fn = kwargs['extra_env'][telemetry.OUTPUT_ENV]
+
+    # simulator side, started in the work directory
+    os.makedirs(work_dir)
+    tm = telemetry.Telemetry(str(work_dir / fn))
+    hooks.register(tm)
+    assert hooks.installed()
+    try:
+        run_test(manager, run_counter, 2000)
+        run_test(manager, run_counter, 20)
+    finally:
+        hooks.unregister(tm)
+
+    # the clock starts high, so the first edge is at time 0
+    assert manager.calls == ["start", ("run_counter", 19990), "start", ("run_counter", 190)]
+
+    # runner side
+    telemetry.collect(str(work_dir), {'build': "x-1", 'compile_time': 1.5, 'compiled': False,
+        'sim_wall_time': 2.0})
+
+    files = glob.glob(str(out_dir / "*.json"))
+    assert len(files) == 1
+    with open(files[0], 'r') as f:
+        d = json.load(f)
+
+    assert d['nodeid'] == "src/x/tb/test_x.py::test_x[1]"
+    assert d['build'] == "x-1"
+    assert d['compile_time'] == 1.5
+    assert d['sim_wall_time'] == 2.0
+    assert len(d['tests']) == 2
+
+    for rec, cycles in zip(d['tests'], [2000, 20]):
+        assert rec['test'] == "run_counter"
+        assert rec['module'] == __name__
+        assert rec['sim_time_ns'] == (cycles-1)*10
+
+        wall_time = rec['wall_time']
+        assert wall_time > 0
+        assert 0 < rec['python_time'] <= wall_time
+        assert rec['simulator_time'] == pytest.approx(wall_time - rec['python_time'])
+        assert rec['sim_ns_per_s'] == pytest.approx(rec['sim_time_ns'] / wall_time)
+        assert rec['peak_rss'] is None or rec['peak_rss'] > 0
+
+        # counts start over with each test; one resume per clock cycle
+        resumes = rec['resumes']
+        assert cycles <= resumes["Counter._run"] <= cycles+1
+        assert cycles <= resumes["run_counter"] <= cycles+1
+        assert list(resumes.values()) == sorted(resumes.values(), reverse=True)
+        # clock cycles per second, from either measurement
+        assert resumes["Counter._run"] / wall_time == pytest.approx(rec['sim_ns_per_s'] / 10, rel=0.1)
+
+    assert d['tests'][0]['wall_time'] > d['tests'][1]['wall_time']
+
+
+class Failing(hooks.Listener):
+    def end_test(self, log, test, outcome, wall_time_s, sim_time_ns, python_time):
+        raise OSError("disk full")
+
+
+def test_telemetry_listener_error(tmp_path, manager):
+    failing = Failing()
+    tm = telemetry.Telemetry(str(tmp_path / "telemetry.jsonl"))
+    hooks.register(failing)
+    hooks.register(tm)
+    try:
+        run_test(manager, run_counter, 10)
+    finally:
+        hooks.unregister(failing)
+        assert hooks.installed()
+        hooks.unregister(tm)
+
+    # the result is still recorded, and the other listeners still run
+    assert manager.calls == ["start", ("run_counter", 90)]
+    recs = telemetry.load(str(tmp_path / "telemetry.jsonl"))
+    assert [r['test'] for r in recs] == ["run_counter"]
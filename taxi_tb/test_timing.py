@@ -0,0 +1,212 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import json
+import os
+
+import pytest
+
+from taxi_tb import plugin
+from taxi_tb import timing
+
+
+def test_timing_legacy_nodeid():
+    assert timing.legacy_nodeid("src/eth/tb/test_baser.py::test_baser_idle") == "tb/eth/test_baser.py::test_baser_idle"
+    assert timing.legacy_nodeid("src/axis/tb/taxi_axis_fifo/test_taxi_axis_fifo.py::test_taxi_axis_fifo[8]") == \
+        "tb/axis/taxi_axis_fifo/test_taxi_axis_fifo.py::test_taxi_axis_fifo[8]"
+    assert timing.legacy_nodeid("tb/eth/test_baser.py::test_baser_idle") is None
+    assert timing.legacy_nodeid("taxi_tb/test_timing.py::test_timing_legacy_nodeid") is None
+
+
+def test_timing_round_trip(tmp_path):
+    fn = str(tmp_path / ".test_timings")
+
+    store = timing.TimingStore(fn)
+    assert store.timings == {}
+    assert store.get("a") is None
+    assert store.duration("a") is None
+
+    store.update({
+        "a": {'compile_time': 10.0, 'sim_wall_time': 5.0, 'sim_time': 1000.0, 'tests': 2, 'build': "x-1"},
+        "b": {'compile_time': None, 'sim_wall_time': 3.0},
+    })
+
+    store = timing.TimingStore(fn)
+    assert store.get("a") == {'compile_time': 10.0, 'sim_wall_time': 5.0, 'sim_time': 1000.0,
+        'tests': 2, 'build': "x-1"}
+    assert store.duration("a") == 15.0
+    assert store.duration("a", cached=True) == 5.0
+    assert store.duration("b") == 3.0
+    assert store.compile_time("b") == 0
+
+    # updates merge with records written by other runs
+    other = timing.TimingStore(fn)
+    other.update({"c": {'compile_time': 1.0, 'sim_wall_time': 1.0}})
+    store.update({"a": {'sim_wall_time': 6.0}})
+
+    store = timing.TimingStore(fn)
+    assert sorted(store.timings) == ["a", "b", "c"]
+    assert store.get("a")['sim_wall_time'] == 6.0
+    assert store.get("a")['compile_time'] == 10.0
+    assert not os.path.exists(fn + ".tmp")
+
+
+def test_timing_legacy(tmp_path):
+    fn = str(tmp_path / ".test_timings")
+    with open(tmp_path / ".test_durations", 'w') as f:
+        json.dump({
+            "tb/eth/test_baser.py::test_baser_idle": 2.0,
+            "src/eth/tb/test_baser.py::test_baser_prbs31": 4.0,
+            "tb/axis/taxi_axis_fifo/test_taxi_axis_fifo.py::test_taxi_axis_fifo[8]": 30.0,
+        }, f)
+
+    store = timing.TimingStore(fn)
+    assert store.sim_wall_time("src/eth/tb/test_baser.py::test_baser_idle") == 2.0
+    assert store.sim_wall_time("src/eth/tb/test_baser.py::test_baser_prbs31") == 4.0
+    assert store.duration("src/axis/tb/taxi_axis_fifo/test_taxi_axis_fifo.py::test_taxi_axis_fifo[8]") == 30.0
+    assert store.duration("src/axis/tb/taxi_axis_fifo/test_taxi_axis_fifo.py::test_taxi_axis_fifo[16]") is None
+
+    # recorded timings take precedence
+    store.update({"src/eth/tb/test_baser.py::test_baser_idle": {'compile_time': 1.0, 'sim_wall_time': 0.5}})
+    assert store.duration("src/eth/tb/test_baser.py::test_baser_idle") == 1.5
+
+
+def test_timing_durations(tmp_path):
+    store = timing.TimingStore(str(tmp_path / ".test_timings"))
+    store.update({
+        "t.py::test_a[1]": {'compile_time': 0, 'sim_wall_time': 2.0},
+        "t.py::test_a[2]": {'compile_time': 0, 'sim_wall_time': 4.0},
+        "t.py::test_b": {'compile_time': 0, 'sim_wall_time': 12.0},
+    })
+
+    d = store.durations(["t.py::test_a[1]", "t.py::test_a[2]", "t.py::test_a[3]", "t.py::test_b", "t.py::test_c"])
+    assert d == {
+        "t.py::test_a[1]": 2.0,
+        "t.py::test_a[2]": 4.0,
+        # mean of the other parametrizations
+        "t.py::test_a[3]": 3.0,
+        "t.py::test_b": 12.0,
+        # overall mean
+        "t.py::test_c": 6.0,
+    }
+
+    empty = timing.TimingStore(str(tmp_path / "empty" / ".test_timings"))
+    assert empty.durations(["a", "b"]) == {"a": 1.0, "b": 1.0}
+
+
+class Item:
+    def __init__(self, nodeid):
+        self.nodeid = nodeid
+        self.path = nodeid.split("::")[0]
+
+
+class Split:
+    cached_durations = None
+
+
+class PluginManager:
+    def __init__(self, split):
+        self.split = split
+
+    def get_plugin(self, name):
+        return self.split if name == "pytestsplitplugin" else None
+
+
+class Config:
+    def __init__(self, store, split=None, no_timing_order=False):
+        self.stash = {plugin.timing_key: store}
+        self.pluginmanager = PluginManager(split)
+        self.options = {'changed': [], 'changed_since': None, 'no_timing_order': no_timing_order}
+
+    def getoption(self, name):
+        return self.options[name]
+
+
+def collection_modifyitems(config, items):
+    gen = plugin.pytest_collection_modifyitems(None, config, items)
+    next(gen)
+    with pytest.raises(StopIteration):
+        next(gen)
+
+
+nodeids = [
+    "src/a/tb/test_a.py::test_a[1]",
+    "src/a/tb/test_a.py::test_a[2]",
+    "src/b/tb/test_b.py::test_b",
+    "src/c/tb/test_c.py::test_c",
+    "src/d/tb/test_d.py::test_d",
+]
+
+
+def test_timing_order(tmp_path):
+    store = timing.TimingStore(str(tmp_path / ".test_timings"))
+    store.update({
+        "src/a/tb/test_a.py::test_a[1]": {'compile_time': 1.0, 'sim_wall_time': 1.0},
+        "src/b/tb/test_b.py::test_b": {'compile_time': 10.0, 'sim_wall_time': 20.0},
+        "src/c/tb/test_c.py::test_c": {'compile_time': 0.0, 'sim_wall_time': 2.0},
+    })
+
+    split = Split()
+    items = [Item(x) for x in nodeids]
+    collection_modifyitems(Config(store, split), items)
+
+    # longest first, test_d gets the overall mean and test_a[2] the mean of
+    # test_a, ties keep collection order
+    assert [x.nodeid for x in items] == [
+        "src/b/tb/test_b.py::test_b",
+        "src/d/tb/test_d.py::test_d",
+        "src/a/tb/test_a.py::test_a[1]",
+        "src/a/tb/test_a.py::test_a[2]",
+        "src/c/tb/test_c.py::test_c",
+    ]
+
+    assert split.cached_durations == {
+        "src/a/tb/test_a.py::test_a[1]": 2.0,
+        "src/a/tb/test_a.py::test_a[2]": 2.0,
+        "src/b/tb/test_b.py::test_b": 30.0,
+        "src/c/tb/test_c.py::test_c": 2.0,
+        "src/d/tb/test_d.py::test_d": 34.0 / 3,
+    }
+
+
+def test_timing_order_legacy(tmp_path):
+    with open(tmp_path / ".test_durations", 'w') as f:
+        json.dump({
+            "tb/c/test_c.py::test_c": 9.0,
+            "tb/d/test_d.py::test_d": 5.0,
+        }, f)
+    store = timing.TimingStore(str(tmp_path / ".test_timings"))
+
+    items = [Item(x) for x in nodeids]
+    collection_modifyitems(Config(store), items)
+
+    # the others get the mean of the legacy durations
+    assert [x.nodeid for x in items] == [
+        "src/c/tb/test_c.py::test_c",
+        "src/a/tb/test_a.py::test_a[1]",
+        "src/a/tb/test_a.py::test_a[2]",
+        "src/b/tb/test_b.py::test_b",
+        "src/d/tb/test_d.py::test_d",
+    ]
+
+
+def test_timing_order_disabled(tmp_path):
+    store = timing.TimingStore(str(tmp_path / ".test_timings"))
+    store.update({"src/d/tb/test_d.py::test_d": {'compile_time': 0, 'sim_wall_time': 100.0}})
+
+    items = [Item(x) for x in nodeids]
+    collection_modifyitems(Config(store, no_timing_order=True), items)
+    assert [x.nodeid for x in items] == nodeids
+
+    # nothing recorded, collection order
+    items = [Item(x) for x in nodeids]
+    collection_modifyitems(Config(timing.TimingStore(str(tmp_path / "empty" / ".test_timings"))), items)
+    assert [x.nodeid for x in items] == nodeids
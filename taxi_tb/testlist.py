@@ -0,0 +1,35 @@
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+# Appended to MODULE and selected with TESTCASE to list the cocotb tests
+# of the other modules, including tests generated by TestFactory, without
+# running any of them
+
+import json
+import os
+import sys
+
+import cocotb
+from cocotb.decorators import test as Test
+
+
+@cocotb.test()
+async def taxi_list_tests(dut):
+    tests = []
+    for name in os.getenv("MODULE", "").split(','):
+        name = name.strip()
+        if not name or name == __name__ or name not in sys.modules:
+            continue
+        for k, v in vars(sys.modules[name]).items():
+            if isinstance(v, Test) and not v.skip:
+                tests.append(k)
+
+    with open(os.environ["TAXI_TEST_LIST"], 'w') as f:
+        json.dump(tests, f)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# SPDX-License-Identifier: CERN-OHL-S-2.0
+"""
+
+Copyright (c) 2025 FPGA Ninja, LLC
+
+Authors:
+- Alex Forencich
+
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from xml.etree import ElementTree as ET
+
+from . import root_dir
+from .sim import file_lock
+
+
+def default_path():
+    return os.path.abspath(os.getenv("SIM_TIMINGS", os.path.join(root_dir, ".test_timings")))
+
+
+def results_summary(fn):
+    # number of cocotb tests and total simulated time from a cocotb results file
+    tests = 0
+    sim_time = 0.0
+    if not fn:
+        return None, None
+    try:
+        tree = ET.parse(fn)
+    except (OSError, ET.ParseError):
+        return None, None
+    for tc in tree.iter("testcase"):
+        tests += 1
+        sim_time += float(tc.get("sim_time_ns", 0))
+    return tests, sim_time
+
+
+def legacy_nodeid(nodeid):
+    # node IDs from before the testbenches moved under src/
+    m = re.match(r'src/(\w+)/tb/(.*)', nodeid)
+    if m:
+        return f"tb/{m.group(1)}/{m.group(2)}"
+    return None
+
+
+class TimingStore:
+    # per node ID: compile_time and sim_wall_time in seconds, sim_time in ns,
+    # tests (number of cocotb tests), build (build cache key)
+
+    def __init__(self, path=None):
+        self.path = os.path.abspath(path or default_path())
+        self.timings = {}
+        self.legacy = {}
+        self.load()
+
+    def load(self):
+        self.timings = self._read(self.path)
+
+        # fall back on pytest-split durations where there is no record
+        self.legacy = self._read(os.path.join(os.path.dirname(self.path), ".test_durations"))
+
+    @staticmethod
+    def _read(fn):
+        try:
+            with open(fn, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def update(self, records):
+        # merge with the current contents so concurrent runs do not clobber each other
+        with file_lock(self.path + ".lock"):
+            timings = self._read(self.path)
+            for nodeid, rec in records.items():
+                timings.setdefault(nodeid, {}).update(rec)
+            with open(self.path + ".tmp", 'w') as f:
+                json.dump(timings, f, sort_keys=True, indent=4)
+                f.write('\n')
+            os.replace(self.path + ".tmp", self.path)
+        self.timings = timings
+
+    def get(self, nodeid):
+        return self.timings.get(nodeid)
+
+    def compile_time(self, nodeid):
+        rec = self.timings.get(nodeid)
+        if rec:
+            return rec.get('compile_time') or 0
+        return 0
+
+    def sim_wall_time(self, nodeid):
+        rec = self.timings.get(nodeid)
+        if rec and rec.get('sim_wall_time') is not None:
+            return rec['sim_wall_time']
+        return self.legacy.get(nodeid, self.legacy.get(legacy_nodeid(nodeid)))
+
+    def duration(self, nodeid, cached=False):
+        # expected duration, including compile time unless the build is cached
+        t = self.sim_wall_time(nodeid)
+        if t is None:
+            return None
+        if not cached:
+            t += self.compile_time(nodeid)
+        return t
+
+    def durations(self, nodeids, cached=False):
+        # known durations, unknown tests get the mean of the other
+        # parametrizations of the same test, or else the overall mean
+        d = {n: self.duration(n, cached) for n in nodeids}
+        known = [v for v in d.values() if v is not None]
+        avg = sum(known) / len(known) if known else 1.0
+
+        funcs = {}
+        for n, v in d.items():
+            if v is not None:
+                funcs.setdefault(n.split('[')[0], []).append(v)
+        for k, v in funcs.items():
+            funcs[k] = sum(v) / len(v)
+
+        return {n: funcs.get(n.split('[')[0], avg) if v is None else v for n, v in d.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Testbench timing store")
+    parser.add_argument('--timings', default=None, help="Timing store (default: .test_timings)")
+    subparsers = parser.add_subparsers(dest='cmd', required=True)
+
+    p = subparsers.add_parser('show', help="List the slowest tests")
+    p.add_argument('-n', type=int, default=20, help="Number of tests to list")
+
+    p = subparsers.add_parser('export', help="Write durations in pytest-split format")
+    p.add_argument('file', nargs='?', default=os.path.join(root_dir, ".test_durations"))
+
+    args = parser.parse_args()
+
+    store = TimingStore(args.timings)
+
+    if args.cmd == 'show':
+        recs = sorted(store.timings.items(), key=lambda x: -(store.duration(x[0]) or 0))
+        print(f"{'compile':>8} {'sim wall':>9} {'sim time':>12} {'tests':>5}  node ID")
+        for nodeid, rec in recs[:args.n]:
+            print(f"{rec.get('compile_time') or 0:8.1f} {rec.get('sim_wall_time') or 0:9.1f} "
+                f"{(rec.get('sim_time') or 0)/1e3:10.1f}us {rec.get('tests') or 0:5}  {nodeid}")
+    elif args.cmd == 'export':
+        d = {n: store.duration(n) for n in store.timings}
+        with open(args.file, 'w') as f:
+            json.dump(d, f, sort_keys=True, indent=4)
+        print(f"Wrote {len(d)} durations to {args.file}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()